@@ -0,0 +1,189 @@
+import logging
+import os
+import xml.etree.ElementTree as ET
+import zlib
+from collections import deque
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+from urllib.robotparser import RobotFileParser
+
+from fetch_service import USER_AGENT, get_http_client, host_slot
+from probe_service import find_sitemap_url
+from result_cache import normalize_url
+
+logger = logging.getLogger(__name__)
+
+# Sitemap protocol limit is 50MB uncompressed; anything bigger is cut off there
+SITEMAP_MAX_BYTES = int(os.environ.get('SITEMAP_MAX_BYTES', 50 * 1024 * 1024))
+SITEMAP_TIMEOUT_SECONDS = float(os.environ.get('SITEMAP_TIMEOUT_SECONDS', 60))
+CRAWL_MAX_PAGES = int(os.environ.get('CRAWL_MAX_PAGES', 10000))
+# Upper bound on the gap between a crawl's requests, whether asked for or from Crawl-delay
+CRAWL_MAX_INTERVAL_SECONDS = float(os.environ.get('CRAWL_MAX_INTERVAL_SECONDS', 60))
+
+GZIP_MAGIC = b'\x1f\x8b'
+DECOMPRESS_CHUNK = 64 * 1024
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def _gunzip(decompressor, data: bytes):
+    """Decompress in bounded pieces so a gzip bomb can't allocate everything at once"""
+    out = decompressor.decompress(data, DECOMPRESS_CHUNK)
+    while out:
+        yield out
+        if not decompressor.unconsumed_tail:
+            break
+        out = decompressor.decompress(decompressor.unconsumed_tail, DECOMPRESS_CHUNK)
+
+
+async def iter_sitemap(url: str, min_interval: Optional[float] = None) -> AsyncIterator[Tuple[str, str]]:
+    """Stream one sitemap (plain or gzip) and yield ('url' | 'sitemap', loc) as entries close"""
+    client = get_http_client()
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    root = None
+    decompressor = None
+    first_chunk = True
+    read_bytes = 0
+
+    # The host slot only spaces out request starts: holding it while the caller consumes
+    # entries would starve that caller's own analyses of the same host
+    async with host_slot(url, min_interval, lane='batch'):
+        request = client.build_request('GET', url, headers={'User-Agent': USER_AGENT}, timeout=SITEMAP_TIMEOUT_SECONDS)
+        response = await client.send(request, stream=True, follow_redirects=True)
+
+    try:
+        response.raise_for_status()
+        # aiter_bytes undoes Content-Encoding; .xml.gz files are gzip on top of that
+        async for chunk in response.aiter_bytes():
+            if first_chunk:
+                first_chunk = False
+                if chunk.startswith(GZIP_MAGIC):
+                    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+            for data in (_gunzip(decompressor, chunk) if decompressor else (chunk,)):
+                read_bytes += len(data)
+                if read_bytes > SITEMAP_MAX_BYTES:
+                    logger.warning(f"Sitemap {url} exceeds {SITEMAP_MAX_BYTES} bytes, stopping there")
+                    return
+                parser.feed(data)
+
+                for event, elem in parser.read_events():
+                    if event == 'start':
+                        if root is None:
+                            root = elem
+                        continue
+                    kind = _local_name(elem.tag)
+                    if kind not in ('url', 'sitemap'):
+                        continue
+                    loc = next((child.text for child in elem if _local_name(child.tag) == 'loc'), None)
+                    # Drop finished entries so memory stays flat on huge sitemaps
+                    root.clear()
+                    if loc and loc.strip():
+                        yield kind, loc.strip()
+    finally:
+        await response.aclose()
+
+
+async def load_robots(root_url: str) -> RobotFileParser:
+    """Fetch and parse robots.txt with the same status handling as RobotFileParser.read()"""
+    robots = RobotFileParser(urljoin(root_url, '/robots.txt'))
+    try:
+        response = await get_http_client().get(robots.url, headers={'User-Agent': USER_AGENT},
+                                               follow_redirects=True, timeout=SITEMAP_TIMEOUT_SECONDS)
+    except Exception as e:
+        logger.warning(f"robots.txt unavailable for {root_url}: {str(e)}")
+        robots.allow_all = True
+        return robots
+
+    if response.status_code in (401, 403):
+        robots.disallow_all = True
+    elif response.status_code >= 400:
+        robots.allow_all = True
+    else:
+        robots.parse(response.text.splitlines())
+    return robots
+
+
+class SitemapCrawler:
+    """Frontier over a site's sitemaps yielding crawlable, unique page URLs.
+
+    Sitemap indexes are followed breadth-first up to `max_depth` levels; pages are
+    filtered to the site's host and robots.txt, deduped by normalized URL and
+    capped at `max_pages`.
+    """
+
+    def __init__(self, site_url: str, sitemap_url: Optional[str] = None, max_pages: int = 500,
+                 max_depth: int = 3, min_interval_seconds: Optional[float] = None):
+        self.site_url = site_url
+        self.sitemap_url = sitemap_url
+        self.max_pages = min(max_pages, CRAWL_MAX_PAGES)
+        self.max_depth = max_depth
+        self.min_interval_seconds = min_interval_seconds
+        # Gap between this crawl's requests to the site, known once robots.txt is read;
+        # applied per request (host_slot), so other analyses of the host keep the default
+        self.interval_seconds = min(min_interval_seconds or 0.0, CRAWL_MAX_INTERVAL_SECONDS)
+        self.host = urlsplit(site_url).hostname
+        self.stats: Dict[str, Any] = {
+            "sitemaps_read": 0,
+            "sitemaps_failed": 0,
+            "pages_found": 0,
+            "duplicates": 0,
+            "disallowed": 0,
+            "off_site": 0,
+        }
+
+    async def pages(self) -> AsyncIterator[str]:
+        root_url = f"{urlsplit(self.site_url).scheme}://{urlsplit(self.site_url).netloc}"
+        robots = await load_robots(root_url)
+
+        # Per-host rate: the slower of the request and the site's Crawl-delay
+        crawl_delay = robots.crawl_delay(USER_AGENT) or robots.crawl_delay('*')
+        self.interval_seconds = min(max(float(crawl_delay or 0), self.min_interval_seconds or 0), CRAWL_MAX_INTERVAL_SECONDS)
+
+        if not self.sitemap_url:
+            declared = robots.site_maps() or []
+            self.sitemap_url = declared[0] if declared else await find_sitemap_url(root_url)
+        if not self.sitemap_url:
+            raise ValueError(f"No sitemap found for {root_url}")
+
+        frontier = deque([(self.sitemap_url, 0)])
+        seen_sitemaps = {normalize_url(self.sitemap_url)}
+        seen_pages = set()
+
+        while frontier:
+            sitemap_url, depth = frontier.popleft()
+            try:
+                # aclosing: stopping at max_pages must close the response right away
+                async with aclosing(iter_sitemap(sitemap_url, self.interval_seconds)) as entries:
+                    async for kind, loc in entries:
+                        if kind == 'sitemap':
+                            key = normalize_url(loc)
+                            if depth < self.max_depth and key not in seen_sitemaps:
+                                seen_sitemaps.add(key)
+                                frontier.append((loc, depth + 1))
+                            continue
+
+                        parts = urlsplit(loc)
+                        if parts.scheme not in ('http', 'https') or parts.hostname != self.host:
+                            self.stats["off_site"] += 1
+                            continue
+                        key = normalize_url(loc)
+                        if key in seen_pages:
+                            self.stats["duplicates"] += 1
+                            continue
+                        seen_pages.add(key)
+                        if not robots.can_fetch(USER_AGENT, loc):
+                            self.stats["disallowed"] += 1
+                            continue
+
+                        self.stats["pages_found"] += 1
+                        yield loc
+                        if self.stats["pages_found"] >= self.max_pages:
+                            return
+                self.stats["sitemaps_read"] += 1
+            except Exception as e:
+                self.stats["sitemaps_failed"] += 1
+                logger.warning(f"Failed to read sitemap {sitemap_url}: {str(e)}")
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# CPU-bound work runs off the event loop: thread | process | inline
+CPU_EXECUTOR = os.environ.get('CPU_EXECUTOR', 'thread')
+CPU_WORKERS = int(os.environ.get('CPU_WORKERS', os.cpu_count() or 2))
+
+_executor: Optional[Executor] = None
+
+# Per-stage counters: calls, total/max run time and time spent queued for a worker
+_stage_stats: Dict[str, Dict[str, float]] = defaultdict(lambda: {
+    "calls": 0,
+    "errors": 0,
+    "total_run_seconds": 0.0,
+    "max_run_seconds": 0.0,
+    "total_queue_seconds": 0.0,
+})
+
+
+def start_cpu_executor() -> Optional[Executor]:
+    """Create the shared worker pool (idempotent); None when running inline"""
+    global _executor
+    if _executor is None and CPU_EXECUTOR != 'inline':
+        if CPU_EXECUTOR == 'process':
+            _executor = ProcessPoolExecutor(max_workers=CPU_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix='cpu-stage')
+        logger.info(f"CPU executor started: {CPU_EXECUTOR} x {CPU_WORKERS}")
+    return _executor
+
+
+def shutdown_cpu_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _timed_call(func: Callable, args: tuple, kwargs: dict):
+    """Runs inside the worker so run time excludes queueing"""
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+async def run_cpu(stage: str, func: Callable, *args, **kwargs) -> Any:
+    """Run a CPU-heavy function on the worker pool and record its timing under `stage`"""
+    stats = _stage_stats[stage]
+    stats["calls"] += 1
+    submitted = time.perf_counter()
+    executor = start_cpu_executor()
+
+    try:
+        if executor is None:
+            result, run_seconds = _timed_call(func, args, kwargs)
+        else:
+            loop = asyncio.get_running_loop()
+            result, run_seconds = await loop.run_in_executor(executor, _timed_call, func, args, kwargs)
+    except Exception:
+        stats["errors"] += 1
+        raise
+
+    stats["total_run_seconds"] += run_seconds
+    stats["max_run_seconds"] = max(stats["max_run_seconds"], run_seconds)
+    # perf_counter is not comparable across processes, so queue time is wall minus run time
+    stats["total_queue_seconds"] += max(time.perf_counter() - submitted - run_seconds, 0.0)
+    return result
+
+
+def get_stage_timings() -> Dict[str, Any]:
+    stages = {}
+    for stage, stats in _stage_stats.items():
+        completed = stats["calls"] - stats["errors"]
+        stages[stage] = {
+            **{key: round(value, 4) for key, value in stats.items()},
+            "avg_run_seconds": round(stats["total_run_seconds"] / completed, 4) if completed else 0,
+        }
+    return {"executor": CPU_EXECUTOR, "workers": CPU_WORKERS, "stages": stages}
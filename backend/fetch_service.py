@@ -0,0 +1,456 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+# ========== SHARED HTTP CLIENT ==========
+# One pooled client for the whole app, created at startup and closed at shutdown
+HTTP_MAX_CONNECTIONS = int(os.environ.get('HTTP_MAX_CONNECTIONS', 100))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('HTTP_MAX_KEEPALIVE_CONNECTIONS', 20))
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.environ.get('HTTP_KEEPALIVE_EXPIRY_SECONDS', 30))
+HTTP2_ENABLED = os.environ.get('HTTP2_ENABLED', 'true').lower() == 'true'
+
+_http_client: Optional[httpx.AsyncClient] = None
+_http2_active = False
+
+# Per-host counters: requests, in-flight, new vs reused connections, HTTP/2 usage, errors
+_host_metrics: Dict[str, Dict[str, int]] = defaultdict(lambda: {
+    "requests": 0,
+    "in_flight": 0,
+    "new_connections": 0,
+    "http2_responses": 0,
+    "errors": 0,
+})
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        logger.warning("h2 not installed - shared HTTP client falls back to HTTP/1.1")
+        return False
+
+
+class _MeteredTransport(httpx.AsyncBaseTransport):
+    """Transport wrapper that keeps per-host request and connection-reuse counters"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        counters = _host_metrics[request.url.host]
+        counters["requests"] += 1
+        counters["in_flight"] += 1
+
+        inner_trace = request.extensions.get('trace')
+
+        async def trace(event_name: str, info: Dict[str, Any]):
+            if event_name == 'connection.connect_tcp.complete':
+                counters["new_connections"] += 1
+            if inner_trace is not None:
+                await inner_trace(event_name, info)
+
+        # Swap the trace in for this hop only; redirects copy extensions from the request
+        original_extensions = request.extensions
+        request.extensions = {**original_extensions, 'trace': trace}
+        try:
+            response = await self._transport.handle_async_request(request)
+        except Exception:
+            counters["errors"] += 1
+            raise
+        finally:
+            counters["in_flight"] -= 1
+            request.extensions = original_extensions
+        if response.extensions.get('http_version') == b'HTTP/2':
+            counters["http2_responses"] += 1
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+def start_http_client() -> httpx.AsyncClient:
+    """Create the app-scoped pooled client (idempotent)"""
+    global _http_client, _http2_active
+    if _http_client is None or _http_client.is_closed:
+        _http2_active = HTTP2_ENABLED and _http2_available()
+        transport = httpx.AsyncHTTPTransport(
+            http2=_http2_active,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+        )
+        _http_client = httpx.AsyncClient(transport=_MeteredTransport(transport), timeout=30.0)
+    return _http_client
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Shared pooled client; created lazily when used outside the app lifecycle"""
+    return start_http_client()
+
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def get_http_pool_metrics() -> Dict[str, Any]:
+    """Per-host connection reuse and request counters of the shared client"""
+    hosts = {}
+    for host, counters in _host_metrics.items():
+        reused = max(counters["requests"] - counters["new_connections"], 0)
+        hosts[host] = {
+            **counters,
+            "reused_connections": reused,
+            "reuse_ratio": round(reused / counters["requests"], 3) if counters["requests"] else 0,
+        }
+    return {
+        "http2_enabled": _http2_active,
+        "max_connections": HTTP_MAX_CONNECTIONS,
+        "max_keepalive_connections": HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        "keepalive_expiry_seconds": HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        "validators": get_validator_metrics(),
+        "host_slots_in_use": {"interactive": host_limiter.active(), "batch": batch_host_limiter.active()},
+        "hosts": hosts,
+    }
+
+
+# ========== PER-HOST POLITENESS ==========
+# Analyses of the same site share a concurrency cap and a minimum gap between starts
+HOST_MAX_CONCURRENCY = int(os.environ.get('HOST_MAX_CONCURRENCY', 2))
+HOST_MIN_INTERVAL_SECONDS = float(os.environ.get('HOST_MIN_INTERVAL_SECONDS', 0.5))
+
+
+class HostLimiter:
+    """Caps concurrent work per host and spaces out consecutive starts.
+
+    A host's semaphore and lock exist only while something holds or waits for its
+    slot, and its next-start time only until it has passed, so the maps stay bounded.
+    """
+
+    def __init__(self, max_concurrency: int = HOST_MAX_CONCURRENCY, min_interval: float = HOST_MIN_INTERVAL_SECONDS):
+        self.max_concurrency = max_concurrency
+        self.min_interval = min_interval
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._users: Dict[str, int] = defaultdict(int)
+        self._next_start: Dict[str, float] = {}
+        self._active: Dict[str, int] = defaultdict(int)
+
+    @asynccontextmanager
+    async def slot(self, host: str, min_interval: Optional[float] = None):
+        """Hold a slot; `min_interval` widens the gap after this start only (e.g. a crawl's Crawl-delay)"""
+        if not self._users[host]:
+            self._semaphores[host] = asyncio.Semaphore(self.max_concurrency)
+            self._locks[host] = asyncio.Lock()
+        self._users[host] += 1
+        try:
+            async with self._semaphores[host]:
+                async with self._locks[host]:
+                    wait = self._next_start.get(host, 0.0) - time.monotonic()
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                    self._next_start[host] = time.monotonic() + max(min_interval or 0.0, self.min_interval)
+                self._active[host] += 1
+                try:
+                    yield
+                finally:
+                    self._active[host] -= 1
+                    if not self._active[host]:
+                        del self._active[host]
+        finally:
+            self._users[host] -= 1
+            if not self._users[host]:
+                self._release(host)
+
+    def _release(self, host: str):
+        """Forget an idle host, and any next-start times that have already passed"""
+        del self._users[host], self._semaphores[host], self._locks[host]
+        now = time.monotonic()
+        for idle in [name for name, start in self._next_start.items() if start <= now and name not in self._users]:
+            del self._next_start[idle]
+
+    def active(self) -> Dict[str, int]:
+        return dict(self._active)
+
+
+# Batch and crawl analyses have their own lane, so an interactive analysis never
+# queues behind slots a batch holds for the same site
+host_limiter = HostLimiter()
+batch_host_limiter = HostLimiter()
+
+
+def host_slot(url: str, min_interval: Optional[float] = None, lane: str = 'interactive'):
+    """Async context manager holding one of the URL's host slots in the given lane"""
+    limiter = batch_host_limiter if lane == 'batch' else host_limiter
+    return limiter.slot(httpx.URL(str(url)).host, min_interval)
+
+
+# ========== CONDITIONAL REQUESTS ==========
+# Per-URL ETag / Last-Modified validators with whatever the caller derived from the
+# last 200 (a response snapshot and parsed document, or a probe result) for reuse on 304.
+# Pages and probes have separate LRUs so small probe results never push pages out.
+VALIDATOR_CACHE_MAX_ENTRIES = int(os.environ.get('VALIDATOR_CACHE_MAX_ENTRIES', 256))
+VALIDATOR_CACHE_MAX_BYTES = int(os.environ.get('VALIDATOR_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+PROBE_VALIDATOR_MAX_ENTRIES = int(os.environ.get('PROBE_VALIDATOR_MAX_ENTRIES', 1024))
+# Rough in-memory size of a parsed DocumentIndex per byte of HTML
+PARSED_DOCUMENT_BYTES_PER_HTML_BYTE = 3
+
+
+class ValidatorCache:
+    """LRU of validators and payloads bounded by entry count and by (estimated) payload bytes.
+
+    A payload bigger than a quarter of `max_bytes` isn't kept: it would evict most
+    of the cache for one URL. Attachments are only kept while the entry stays under
+    that cap; past it the payload alone is kept and the caller rebuilds the rest.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._stats = {"conditional_requests": 0, "not_modified": 0, "evictions": 0, "too_large": 0,
+                       "attachments_skipped": 0}
+
+    def headers(self, url: str) -> Dict[str, str]:
+        """If-None-Match / If-Modified-Since for a URL we have validators for"""
+        entry = self._entries.get(url)
+        if entry is None:
+            return {}
+        self._stats["conditional_requests"] += 1
+        headers = {}
+        if entry["etag"]:
+            headers['If-None-Match'] = entry["etag"]
+        if entry["last_modified"]:
+            headers['If-Modified-Since'] = entry["last_modified"]
+        return headers
+
+    def _forget(self, url: str):
+        entry = self._entries.pop(url, None)
+        if entry is not None:
+            self._bytes -= entry["bytes"]
+
+    def _resize(self, url: str, size: int):
+        entry = self._entries[url]
+        self._bytes += size - entry["bytes"]
+        entry["bytes"] = size
+        if size > self.max_bytes // 4:
+            self._stats["too_large"] += 1
+            self._forget(url)
+            return
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._forget(next(iter(self._entries)))
+            self._stats["evictions"] += 1
+
+    def remember(self, url: str, response: httpx.Response, payload: Any, size: int):
+        """Store the validators of a 200 along with `payload` of about `size` bytes;
+        forget URLs that stopped sending validators"""
+        etag = response.headers.get('etag')
+        last_modified = response.headers.get('last-modified')
+        self._forget(url)
+        if response.status_code != 200 or not (etag or last_modified):
+            return
+        self._entries[url] = {"etag": etag, "last_modified": last_modified, "payload": payload, "bytes": 0}
+        self._resize(url, size)
+
+    def not_modified(self, url: str, response: httpx.Response) -> Optional[Any]:
+        """The payload stored with the validators when `response` is a 304 for them"""
+        entry = self._entries.get(url)
+        if response.status_code != 304 or entry is None:
+            return None
+        self._entries.move_to_end(url)
+        self._stats["not_modified"] += 1
+        return entry["payload"]
+
+    def attach(self, url: str, name: str, value: Any, size: int):
+        """Keep `value` (about `size` bytes) with a URL's payload, e.g. the parsed document"""
+        entry = self._entries.get(url)
+        if entry is None:
+            return
+        if entry["bytes"] + size > self.max_bytes // 4:
+            # A multi-MB page keeps its validators and snapshot; the document is re-parsed on replay
+            self._stats["attachments_skipped"] += 1
+            return
+        entry[name] = value
+        self._resize(url, entry["bytes"] + size)
+
+    def attached(self, url: str, name: str) -> Optional[Any]:
+        entry = self._entries.get(url)
+        return entry.get(name) if entry is not None else None
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "stored_urls": len(self._entries),
+            "stored_bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+        }
+
+
+page_validators = ValidatorCache(VALIDATOR_CACHE_MAX_ENTRIES, VALIDATOR_CACHE_MAX_BYTES)
+# Probe results are at most a few KB each
+probe_validators = ValidatorCache(PROBE_VALIDATOR_MAX_ENTRIES, PROBE_VALIDATOR_MAX_ENTRIES * 8 * 1024)
+
+
+def remember_document(url: str, document: Any, html_bytes: int):
+    """Attach a parsed document (of `html_bytes` of HTML) to the validators of a fetched page"""
+    page_validators.attach(url, "document", document, html_bytes * PARSED_DOCUMENT_BYTES_PER_HTML_BYTE)
+
+
+def stored_document(url: str) -> Optional[Any]:
+    return page_validators.attached(url, "document")
+
+
+def get_validator_metrics() -> Dict[str, Any]:
+    return {"pages": page_validators.metrics(), "probes": probe_validators.metrics()}
+
+
+def _snapshot(response: httpx.Response) -> Dict[str, Any]:
+    return {
+        "status_code": response.status_code,
+        "headers": response.headers.multi_items(),
+        "content": response.content,
+    }
+
+
+def _snapshot_bytes(snapshot: Dict[str, Any]) -> int:
+    return len(snapshot["content"]) + sum(len(name) + len(value) for name, value in snapshot["headers"])
+
+
+def _replay(snapshot: Dict[str, Any], not_modified: httpx.Response) -> httpx.Response:
+    """Rebuild the stored 200 from a 304, taking the 304's updated headers (RFC 9111 4.3.4)"""
+    headers = httpx.Headers(snapshot["headers"])
+    for name, value in not_modified.headers.items():
+        if name not in ('content-length', 'content-encoding', 'transfer-encoding'):
+            headers[name] = value
+    # The stored body is already decoded, so build without content-encoding and put it back after
+    encoding = headers.pop('content-encoding', None)
+    response = httpx.Response(
+        snapshot["status_code"],
+        headers=headers,
+        content=snapshot["content"],
+        request=not_modified.request,
+        history=not_modified.history,
+        extensions={**not_modified.extensions, 'not_modified': True},
+    )
+    if encoding:
+        response.headers['content-encoding'] = encoding
+    response.elapsed = not_modified.elapsed
+    return response
+
+
+# httpcore trace phases we time (event names look like "http11.receive_response_headers.started")
+TIMED_PHASES = ('connect_tcp', 'start_tls', 'send_request_headers', 'receive_response_headers', 'receive_response_body')
+
+
+class _PhaseRecorder:
+    """httpcore trace callback that timestamps each phase of every request hop"""
+
+    def __init__(self):
+        self.hops: List[Dict[str, float]] = []
+
+    async def __call__(self, event_name: str, info: Dict[str, Any]):
+        phase, _, state = event_name.rpartition('.')
+        phase = phase.rpartition('.')[2]
+        if phase not in TIMED_PHASES:
+            return
+        # A new hop starts with a fresh connect or request once the previous one was sent
+        if state == 'started' and phase in ('connect_tcp', 'send_request_headers') and (
+            not self.hops or 'send_request_headers.started' in self.hops[-1]
+        ):
+            self.hops.append({})
+        if not self.hops:
+            self.hops.append({})
+        self.hops[-1][f'{phase}.{state}'] = time.perf_counter()
+
+
+def _phase_seconds(hop: Dict[str, float], phase: str) -> float:
+    started = hop.get(f'{phase}.started')
+    completed = hop.get(f'{phase}.complete')
+    if started is None or completed is None:
+        return 0.0
+    return round(completed - started, 4)
+
+
+def _hop_timings(response: httpx.Response, recorder: _PhaseRecorder) -> List[Dict[str, Any]]:
+    """Status and latency of every hop of a fetch, redirects first and the final response last"""
+    responses = [*response.history, response]
+    # Phases are only attributable per hop when the trace saw exactly one request per response
+    traced = recorder.hops if len(recorder.hops) == len(responses) else [{}] * len(responses)
+    hops = []
+    for hop_response, hop in zip(responses, traced):
+        request_sent = hop.get('send_request_headers.started')
+        headers_received = hop.get('receive_response_headers.complete')
+        hops.append({
+            "url": str(hop_response.url),
+            "status_code": hop_response.status_code,
+            "elapsed_seconds": round(hop_response.elapsed.total_seconds(), 4),
+            "connect_seconds": _phase_seconds(hop, 'connect_tcp'),
+            "tls_seconds": _phase_seconds(hop, 'start_tls'),
+            "server_wait_seconds": round(headers_received - request_sent, 4) if headers_received and request_sent else None,
+        })
+    return hops
+
+
+async def fetch_page(url: str) -> Tuple[httpx.Response, Dict[str, Any]]:
+    """GET a page and record connect, TLS, TTFB and download timings of the fetch
+
+    connect_seconds covers DNS resolution and the TCP handshake together (httpcore
+    resolves inside connect_tcp); it is 0 when a pooled connection was reused.
+
+    Revalidates with stored ETag / Last-Modified; a 304 is replayed as the stored 200
+    with extensions['not_modified'] set.
+    """
+    recorder = _PhaseRecorder()
+    client = get_http_client()
+
+    started = time.perf_counter()
+    response = await client.get(
+        str(url),
+        headers={'User-Agent': USER_AGENT, **page_validators.headers(str(url))},
+        follow_redirects=True,
+        extensions={'trace': recorder},
+    )
+    total_seconds = time.perf_counter() - started
+    
+    snapshot = page_validators.not_modified(str(url), response)
+    if snapshot is not None:
+        response = _replay(snapshot, response)
+    else:
+        snapshot = _snapshot(response)
+        page_validators.remember(str(url), response, snapshot, _snapshot_bytes(snapshot))
+
+    final_hop = recorder.hops[-1] if recorder.hops else {}
+    request_sent = final_hop.get('send_request_headers.started')
+    headers_received = final_hop.get('receive_response_headers.complete')
+
+    connection_reused = bool(final_hop) and 'connect_tcp.started' not in final_hop
+    timings = {
+        "connect_seconds": _phase_seconds(final_hop, 'connect_tcp'),
+        "tls_seconds": _phase_seconds(final_hop, 'start_tls'),
+        "server_wait_seconds": round(headers_received - request_sent, 4) if headers_received and request_sent else None,
+        "ttfb_seconds": round(headers_received - started, 4) if headers_received else None,
+        "content_download_seconds": _phase_seconds(final_hop, 'receive_response_body'),
+        "redirect_seconds": round(min(final_hop.values()) - min(recorder.hops[0].values()), 4) if len(recorder.hops) > 1 else 0.0,
+        "total_seconds": round(total_seconds, 4),
+        "connection_reused": connection_reused,
+        "not_modified": bool(response.extensions.get('not_modified')),
+        "hops": _hop_timings(response, recorder),
+    }
+    return response, timings
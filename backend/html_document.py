@@ -0,0 +1,196 @@
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from bs4 import BeautifulSoup, CData, NavigableString, Tag
+
+logger = logging.getLogger(__name__)
+
+# Parser backend used when none is requested explicitly: lxml | selectolax | html.parser
+DEFAULT_PARSER = os.environ.get('HTML_PARSER', 'lxml')
+
+# Tags whose text content the analyzers actually read (anchors, headings, JSON-LD)
+TEXT_TAGS = {'title', 'a', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'script'}
+
+# Subtrees excluded from the cleaned page text
+SKIP_TEXT_TAGS = {'script', 'style', 'noscript', 'template'}
+
+
+@dataclass
+class Element:
+    """Parser-independent snapshot of a single HTML tag"""
+    name: str
+    attrs: Dict[str, str] = field(default_factory=dict)
+    text: str = ""
+    in_head: bool = False
+
+    def get(self, key: str, default=None):
+        return self.attrs.get(key, default)
+
+    @property
+    def rel(self) -> List[str]:
+        return self.attrs.get('rel', '').lower().split()
+
+
+class DocumentIndex:
+    """Precomputed view of one parsed page shared by every analyzer"""
+
+    def __init__(self, elements: List[Element], text: str):
+        self.tags: Dict[str, List[Element]] = {}
+        self.microdata_items: List[Element] = []
+        for el in elements:
+            self.tags.setdefault(el.name, []).append(el)
+            if 'itemtype' in el.attrs:
+                self.microdata_items.append(el)
+
+        # Cleaned, whitespace-normalised text stream (no script/style/noscript)
+        self.text = text
+
+        # Link / image / script / meta tables
+        self.anchors = [a for a in self.find_all('a') if 'href' in a.attrs]
+        self.images = self.find_all('img')
+        self.scripts = self.find_all('script')
+        self.external_scripts = [s for s in self.scripts if s.get('src')]
+        self.json_ld_scripts = [
+            s for s in self.scripts if s.get('type', '').strip().lower() == 'application/ld+json'
+        ]
+        self.link_tags = self.find_all('link')
+        self.canonical_links = [l for l in self.link_tags if 'canonical' in l.rel]
+        self.stylesheets = [l for l in self.link_tags if 'stylesheet' in l.rel]
+
+        self.meta_by_name: Dict[str, Element] = {}
+        self.meta_by_property: Dict[str, Element] = {}
+        for meta in self.find_all('meta'):
+            if meta.get('name') is not None:
+                self.meta_by_name.setdefault(meta.get('name'), meta)
+            if meta.get('property') is not None:
+                self.meta_by_property.setdefault(meta.get('property'), meta)
+
+        title = self.first('title')
+        self.title = title.text.strip() if title else None
+
+    def find_all(self, name: str) -> List[Element]:
+        return self.tags.get(name, [])
+
+    def first(self, name: str) -> Optional[Element]:
+        found = self.tags.get(name)
+        return found[0] if found else None
+
+    def meta_content(self, name: str = None, prop: str = None) -> Optional[str]:
+        """Content of the first <meta name=...> or <meta property=...>, None if absent"""
+        meta = self.meta_by_name.get(name) if name else self.meta_by_property.get(prop)
+        return meta.get('content', '') if meta else None
+
+
+def _normalize_attrs(attrs) -> Dict[str, str]:
+    return {
+        key: ' '.join(value) if isinstance(value, list) else (value or '')
+        for key, value in attrs.items()
+    }
+
+
+def _clean_text(parts) -> str:
+    return ' '.join(' '.join(parts).split())
+
+
+# ========== PARSER BACKENDS ==========
+def _parse_with_html_parser(html: str) -> DocumentIndex:
+    """Pure-Python BeautifulSoup backend (slowest, no native dependencies)"""
+    soup = BeautifulSoup(html, 'html.parser')
+
+    elements = []
+    text_parts = []
+    skipped = set()
+
+    for node in soup.descendants:
+        if isinstance(node, Tag):
+            el = Element(name=node.name, attrs=_normalize_attrs(node.attrs))
+            if node.name in TEXT_TAGS:
+                el.text = node.get_text()
+            if node.name == 'link':
+                el.in_head = node.find_parent('head') is not None
+            if node.name in SKIP_TEXT_TAGS:
+                skipped.update(id(s) for s in node.strings)
+            elements.append(el)
+        elif type(node) in (NavigableString, CData) and id(node) not in skipped:
+            text_parts.append(node)
+
+    return DocumentIndex(elements, _clean_text(text_parts))
+
+
+def _parse_with_lxml(html: str) -> DocumentIndex:
+    """libxml2 backend via lxml.html"""
+    import lxml.html
+    from lxml import etree
+
+    # Encode first: lxml rejects str input that carries an XML encoding declaration
+    parser = lxml.html.HTMLParser(encoding='utf-8')
+    root = lxml.html.document_fromstring(html.encode('utf-8', errors='replace'), parser=parser)
+
+    elements = []
+    for node in root.iter(etree.Element):
+        el = Element(
+            name=node.tag.lower(),
+            attrs={key.lower(): value for key, value in node.attrib.items()},
+        )
+        if el.name in TEXT_TAGS:
+            el.text = node.text_content()
+        if el.name == 'link':
+            el.in_head = any(parent.tag == 'head' for parent in node.iterancestors())
+        elements.append(el)
+
+    etree.strip_elements(root, *SKIP_TEXT_TAGS, etree.Comment, etree.ProcessingInstruction, with_tail=False)
+    return DocumentIndex(elements, _clean_text(root.itertext()))
+
+
+def _parse_with_selectolax(html: str) -> DocumentIndex:
+    """Lexbor (C) backend via selectolax"""
+    from selectolax.lexbor import LexborHTMLParser
+
+    tree = LexborHTMLParser(html)
+
+    elements = []
+    for node in tree.root.traverse(include_text=False):
+        if node.tag.startswith('_') or node.tag.startswith('-'):
+            continue  # comments, doctype and other non-element nodes
+        el = Element(
+            name=node.tag,
+            attrs={key: value or '' for key, value in node.attributes.items()},
+        )
+        if el.name in TEXT_TAGS:
+            el.text = node.text(deep=True)
+        if el.name == 'link':
+            parent = node.parent
+            while parent is not None and parent.tag != 'head':
+                parent = parent.parent
+            el.in_head = parent is not None
+        elements.append(el)
+
+    tree.strip_tags(list(SKIP_TEXT_TAGS))
+    return DocumentIndex(elements, _clean_text([tree.root.text(separator=' ')]))
+
+
+PARSER_BACKENDS: Dict[str, Callable[[str], DocumentIndex]] = {
+    'html.parser': _parse_with_html_parser,
+    'lxml': _parse_with_lxml,
+    'selectolax': _parse_with_selectolax,
+}
+
+
+def parse_document(html: str, parser: Optional[str] = None) -> DocumentIndex:
+    """Parse HTML once with the configured backend and build the shared document index"""
+    parser = parser or DEFAULT_PARSER
+    backend = PARSER_BACKENDS.get(parser)
+    if backend is None:
+        logger.warning(f"Unknown HTML parser '{parser}' - falling back to html.parser")
+        backend = _parse_with_html_parser
+
+    if not html or not html.strip():
+        return DocumentIndex([], "")
+
+    try:
+        return backend(html)
+    except ImportError as e:
+        logger.warning(f"HTML parser '{parser}' unavailable ({str(e)}) - falling back to html.parser")
+        return _parse_with_html_parser(html)
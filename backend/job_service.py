@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are already waiting"""
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class JobQueue:
+    """Mongo-backed job queue drained by a bounded pool of asyncio workers"""
+
+    def __init__(self, collection, runner: Callable[[Dict[str, Any], Callable[[str], Awaitable[None]]], Awaitable[Dict[str, Any]]],
+                 workers: int = 4, max_pending: int = 100, max_attempts: int = 3, lease_seconds: int = 60):
+        self.collection = collection
+        self.runner = runner
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._tasks = []
+        self._changed: Dict[str, asyncio.Event] = {}
+
+    async def start(self):
+        await self._recover()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._sweeper()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _lease_until(self) -> str:
+        return (datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)).isoformat()
+
+    async def _recover(self):
+        """Re-enqueue jobs left queued or abandoned mid-run by a previous process"""
+        await self._reclaim_expired()
+        async for job in self.collection.find({"status": "queued"}, {"_id": 0, "id": 1}).sort("created_at", 1):
+            self._queue.put_nowait(job["id"])
+        if self._queue.qsize():
+            logger.info(f"Recovered {self._queue.qsize()} analysis jobs")
+
+    async def _reclaim_expired(self) -> int:
+        """Take back running jobs whose owner stopped renewing the lease (a killed
+        worker or process); requeue them, or fail them once out of attempts"""
+        expired = {"status": "running", "lease_until": {"$not": {"$gte": _now()}}}
+        reclaimed = 0
+        async for job in self.collection.find(expired, {"_id": 0, "id": 1, "attempts": 1}):
+            retry = job.get("attempts", 0) < self.max_attempts
+            update = {"status": "queued"} if retry else {"status": "failed", "error": "Worker lost while running the job"}
+            # Conditional on the lease still being expired, so a renewing owner keeps its job
+            claimed = await self.collection.find_one_and_update(
+                {"id": job["id"], **expired},
+                {"$set": {**update, "lease_owner": None, "updated_at": _now()}},
+            )
+            if claimed is None:
+                continue
+            reclaimed += 1
+            self._notify(job["id"])
+            if retry:
+                self._queue.put_nowait(job["id"])
+        if reclaimed:
+            logger.warning(f"Reclaimed {reclaimed} analysis jobs with expired leases")
+        return reclaimed
+
+    async def _sweeper(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 2)
+            try:
+                await self._reclaim_expired()
+            except Exception as e:
+                logger.error(f"Job lease sweep failed: {str(e)}")
+
+    def _new_job(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        now = _now()
+        return {
+            "id": str(uuid.uuid4()),
+            **payload,
+            "status": "queued",
+            "stage": "queued",
+            "stages": [{"stage": "queued", "at": now}],
+            "attempts": 0,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+
+    async def submit(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return (await self.submit_many([payload]))[0]
+
+    async def submit_many(self, payloads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Queue several jobs at once; all or none are accepted"""
+        if self._queue.qsize() + len(payloads) > self.max_pending:
+            raise JobQueueFull(f"{self._queue.qsize()} jobs already waiting")
+
+        jobs = [self._new_job(payload) for payload in payloads]
+        await self.collection.insert_many([dict(job) for job in jobs])
+        for job in jobs:
+            self._queue.put_nowait(job["id"])
+        return jobs
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = await self.collection.find_one({"id": job_id}, {"_id": 0})
+        if job and job["status"] == "queued":
+            job["queue_depth"] = self._queue.qsize()
+        return job
+
+    def _notify(self, job_id: str):
+        event = self._changed.pop(job_id, None)
+        if event:
+            event.set()
+
+    async def _update(self, job_id: str, update: Dict[str, Any], owner: Optional[str] = None):
+        """Apply `update`; with an `owner`, only while that claim still holds the lease"""
+        update.setdefault("$set", {})["updated_at"] = _now()
+        query = {"id": job_id} if owner is None else {"id": job_id, "lease_owner": owner}
+        await self.collection.update_one(query, update)
+        self._notify(job_id)
+
+    def _progress_callback(self, job_id: str, owner: str):
+        async def progress(stage: str):
+            await self._update(job_id, {
+                "$set": {"stage": stage},
+                "$push": {"stages": {"stage": stage, "at": _now()}},
+            }, owner)
+        return progress
+
+    async def _heartbeat(self, job_id: str, owner: str):
+        """Renew the lease while the job runs (without touching updated_at, which drives the event stream)"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self.collection.update_one(
+                    {"id": job_id, "lease_owner": owner},
+                    {"$set": {"lease_until": self._lease_until()}},
+                )
+            except Exception as e:
+                logger.warning(f"Lease renewal failed for job {job_id}: {str(e)}")
+
+    async def _worker(self, worker_no: int):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                logger.error(f"Job worker {worker_no} crashed on {job_id}: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        # Atomic claim: a job recovered by two processes still only runs once.
+        # The claim holds a lease that the heartbeat renews; if this worker dies,
+        # any process's sweeper requeues the job once the lease runs out.
+        owner = str(uuid.uuid4())
+        job = await self.collection.find_one_and_update(
+            {"id": job_id, "status": "queued"},
+            {"$set": {"status": "running", "lease_owner": owner, "lease_until": self._lease_until(), "updated_at": _now()},
+             "$inc": {"attempts": 1}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER,
+        )
+        if job is None:
+            return
+
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, owner))
+        try:
+            result = await self.runner(job, self._progress_callback(job_id, owner))
+        except asyncio.CancelledError:
+            # Shutting down: leave the job for the next process to pick up
+            await self._update(job_id, {"$set": {"status": "queued", "lease_owner": None}}, owner)
+            raise
+        except Exception as e:
+            detail = getattr(e, "detail", None) or str(e)
+            retry = job["attempts"] < self.max_attempts and getattr(e, "status_code", 500) >= 500
+            logger.error(f"Analysis job {job_id} failed (attempt {job['attempts']}): {detail}")
+            await self._update(job_id, {"$set": {"status": "queued" if retry else "failed", "error": detail,
+                                                 "lease_owner": None}}, owner)
+            if retry:
+                self._queue.put_nowait(job_id)
+            return
+        finally:
+            heartbeat.cancel()
+
+        await self._update(job_id, {"$set": {"status": "completed", "stage": "completed", "result": result,
+                                             "lease_owner": None}}, owner)
+
+    async def wait_for_change(self, job_id: str, timeout: float):
+        """Block until the job is updated in this process or the timeout passes"""
+        event = self._changed.setdefault(job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"workers": self.workers, "queued": self._queue.qsize(), "max_pending": self.max_pending}
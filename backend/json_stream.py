@@ -0,0 +1,113 @@
+import json
+from typing import Any, List, Optional, Tuple
+
+
+class JSONSectionStream:
+    """Incremental scanner over a streamed JSON object.
+
+    feed() returns (key, index, value) for every top-level member that finished
+    in the new chunk (index None), and for every finished item of a top-level
+    array (index = position), so sections can be shown before the object closes.
+    """
+
+    def __init__(self):
+        self._buf = ''
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect_key = True
+        self._key_start: Optional[int] = None
+        self._key: Optional[str] = None
+        self._value_start: Optional[int] = None
+        self._value_is_array = False
+        self._item_start: Optional[int] = None
+        self._item_index = 0
+
+    def feed(self, chunk: str) -> List[Tuple[str, Optional[int], Any]]:
+        self._buf += chunk
+        done: List[Tuple[str, Optional[int], Any]] = []
+
+        while self._pos < len(self._buf):
+            i = self._pos
+            c = self._buf[i]
+            self._pos += 1
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._expect_key and self._key_start is not None:
+                        self._key = self._load(self._key_start, i + 1)
+                        self._key_start = None
+                continue
+
+            if c.isspace():
+                continue
+
+            if self._depth == 1:
+                if self._expect_key:
+                    if c == '"':
+                        self._key_start = i
+                    elif c == ':':
+                        self._expect_key = False
+                        self._value_start = None
+                    elif c == '}':
+                        self._depth = 0
+                    if c == '"':
+                        self._in_string = True
+                    continue
+                if c == ',' or c == '}':
+                    # End of a scalar member (containers are emitted when they close)
+                    if self._value_start is not None:
+                        self._emit(done, self._value_start, i, None)
+                    self._expect_key = True
+                    self._value_start = None
+                    if c == '}':
+                        self._depth = 0
+                    continue
+                if self._value_start is None:
+                    self._value_start = i
+                    self._value_is_array = c == '['
+                    self._item_start = None
+                    self._item_index = 0
+
+            elif self._depth == 2 and self._value_is_array:
+                if c == ',' or c == ']':
+                    # End of a scalar item
+                    if self._item_start is not None:
+                        self._emit(done, self._item_start, i, self._item_index)
+                        self._item_index += 1
+                        self._item_start = None
+                elif self._item_start is None:
+                    self._item_start = i
+
+            if c == '"':
+                self._in_string = True
+            elif c in '{[':
+                self._depth += 1
+            elif c in '}]':
+                self._depth -= 1
+                if self._depth == 2 and self._value_is_array and self._item_start is not None:
+                    self._emit(done, self._item_start, i + 1, self._item_index)
+                    self._item_index += 1
+                    self._item_start = None
+                elif self._depth == 1 and self._value_start is not None:
+                    self._emit(done, self._value_start, i + 1, None)
+                    self._value_start = None
+
+        return done
+
+    def _load(self, start: int, end: int) -> Any:
+        try:
+            return json.loads(self._buf[start:end])
+        except ValueError:
+            return None
+
+    def _emit(self, done: list, start: int, end: int, index: Optional[int]):
+        value = self._load(start, end)
+        if self._key is not None and (value is not None or self._buf[start:end].strip() == 'null'):
+            done.append((self._key, index, value))
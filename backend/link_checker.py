@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Optional
+from urllib.parse import urljoin
+
+import httpx
+
+from fetch_service import USER_AGENT, HostLimiter, get_http_client
+
+logger = logging.getLogger(__name__)
+
+LINK_CHECK_CONCURRENCY = int(os.environ.get('LINK_CHECK_CONCURRENCY', 50))
+LINK_CHECK_PER_HOST = int(os.environ.get('LINK_CHECK_PER_HOST', 8))
+LINK_CHECK_HOST_MIN_INTERVAL_SECONDS = float(os.environ.get('LINK_CHECK_HOST_MIN_INTERVAL_SECONDS', 0.02))
+LINK_CHECK_TIMEOUT_SECONDS = float(os.environ.get('LINK_CHECK_TIMEOUT_SECONDS', 5))
+LINK_CHECK_CACHE_TTL_SECONDS = int(os.environ.get('LINK_CHECK_CACHE_TTL_SECONDS', 3600))
+LINK_CHECK_CACHE_MAX_ENTRIES = int(os.environ.get('LINK_CHECK_CACHE_MAX_ENTRIES', 50000))
+LINK_CHECK_BUDGET_SECONDS = float(os.environ.get('LINK_CHECK_BUDGET_SECONDS', 15))
+LINK_CHECK_MAX_LINKS = int(os.environ.get('LINK_CHECK_MAX_LINKS', 500))
+LINK_CHECK_MAX_REDIRECTS = 5
+# Failures may be transient, so they are re-checked sooner
+LINK_CHECK_ERROR_TTL_SECONDS = 60
+# The server asked us to back off: the link's state is unknown, not broken
+LINK_CHECK_RETRY_LATER_STATUSES = {429, 503}
+# Longest Retry-After we honour before probing the host again
+LINK_CHECK_MAX_RETRY_AFTER_SECONDS = float(os.environ.get('LINK_CHECK_MAX_RETRY_AFTER_SECONDS', 300))
+
+_global_slots: Optional[asyncio.Semaphore] = None
+# host -> time.monotonic() until which it asked us not to probe (Retry-After)
+_retry_until: Dict[str, float] = {}
+# Separate from the analyses' host limiter: link probes are many small requests with their own cap and spacing
+_host_limiter = HostLimiter(LINK_CHECK_PER_HOST, LINK_CHECK_HOST_MIN_INTERVAL_SECONDS)
+
+# url -> (expires, result); in-flight checks are shared so concurrent pages never probe twice
+_results: "OrderedDict[str, tuple]" = OrderedDict()
+_in_flight: Dict[str, asyncio.Task] = {}
+
+
+async def _request(client: httpx.AsyncClient, method: str, url: str) -> httpx.Response:
+    if method == 'HEAD':
+        return await client.head(url, headers={'User-Agent': USER_AGENT}, follow_redirects=False,
+                                 timeout=LINK_CHECK_TIMEOUT_SECONDS)
+    # GET fallback: only the status and headers are needed, never the body
+    request = client.build_request('GET', url, headers={'User-Agent': USER_AGENT}, timeout=LINK_CHECK_TIMEOUT_SECONDS)
+    response = await client.send(request, stream=True, follow_redirects=False)
+    await response.aclose()
+    return response
+
+
+async def _follow(client: httpx.AsyncClient, method: str, url: str) -> Dict[str, Any]:
+    """Follow redirects by hand so every hop's status is recorded"""
+    chain = []
+    current = url
+    for _ in range(LINK_CHECK_MAX_REDIRECTS + 1):
+        response = await _request(client, method, current)
+        location = response.headers.get('location')
+        if not response.is_redirect or not location:
+            return {"status_code": response.status_code, "final_url": current, "redirect_chain": chain,
+                    "retry_after": _retry_after(response)}
+        chain.append({"url": current, "status_code": response.status_code})
+        current = urljoin(current, location)
+    return {"status_code": None, "final_url": current, "redirect_chain": chain, "error": "Too many redirects"}
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    """Seconds the server asked us to wait (Retry-After as seconds or an HTTP date), capped"""
+    value = response.headers.get('retry-after')
+    if response.status_code not in LINK_CHECK_RETRY_LATER_STATUSES or not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), LINK_CHECK_MAX_RETRY_AFTER_SECONDS)
+
+
+def _backing_off(host: str) -> bool:
+    return _retry_until.get(host, 0.0) > time.monotonic()
+
+
+def _back_off(host: str, seconds: float):
+    """Stop probing `host` for `seconds`; a later 429 never pushes an active back-off further out"""
+    now = time.monotonic()
+    for expired in [name for name, until in _retry_until.items() if until <= now]:
+        del _retry_until[expired]
+    _retry_until.setdefault(host, now + seconds)
+
+
+async def _follow_counted(client: httpx.AsyncClient, method: str, url: str) -> Dict[str, Any]:
+    """_follow holding one of the LINK_CHECK_CONCURRENCY slots, only for the requests themselves"""
+    global _global_slots
+    if _global_slots is None:
+        _global_slots = asyncio.Semaphore(LINK_CHECK_CONCURRENCY)
+    async with _global_slots:
+        return await _follow(client, method, url)
+
+
+async def _probe(client: httpx.AsyncClient, url: str, min_interval: Optional[float]) -> Optional[Dict[str, Any]]:
+    """HEAD the URL under its host's slot (GET to confirm a failure); None while the host is backing off.
+
+    Links queued for a busy or rate-limiting host wait on that host's slot, not on the
+    global cap, so they can't hold up other hosts' checks.
+    """
+    host = httpx.URL(url).host
+    if _backing_off(host):
+        return None
+    async with _host_limiter.slot(host, min_interval):
+        if _backing_off(host):
+            return None  # Queued behind the reply that started the back-off
+        outcome = {**await _follow_counted(client, 'HEAD', url), "method": "HEAD"}
+        # Many servers reject or mishandle HEAD; confirm failures with a GET, unless the
+        # server is already rate-limiting us (a GET would only double the load)
+        if outcome["status_code"] is None or (
+            outcome["status_code"] >= 400 and outcome["status_code"] not in LINK_CHECK_RETRY_LATER_STATUSES
+        ):
+            outcome = {**await _follow_counted(client, 'GET', url), "method": "GET"}
+        if outcome.get("retry_after"):
+            _back_off(host, outcome["retry_after"])
+        return outcome
+
+
+async def _check(url: str, min_interval: Optional[float] = None) -> Dict[str, Any]:
+    client = get_http_client()
+    started = time.perf_counter()
+    result: Dict[str, Any] = {"url": url, "method": "HEAD", "error": None}
+    backing_off = False
+    try:
+        outcome = await _probe(client, url, min_interval)
+        if outcome is None:
+            backing_off = True
+            result.update(method=None, status_code=None)
+        else:
+            result.update(outcome)
+    except httpx.TimeoutException:
+        result.update(status_code=None, error="timeout")
+    except Exception as e:
+        result.update(status_code=None, error=str(e) or type(e).__name__)
+
+    if backing_off:
+        result.update(ok=None, unchecked=True, error="retry later (host backing off)")
+    elif result["status_code"] in LINK_CHECK_RETRY_LATER_STATUSES:
+        result.update(ok=None, unchecked=True, error=f"retry later ({result['status_code']})")
+    else:
+        result["ok"] = result["status_code"] is not None and result["status_code"] < 400
+    result["elapsed_seconds"] = round(time.perf_counter() - started, 4)
+    return result
+
+
+def _store(url: str, task: asyncio.Task):
+    _in_flight.pop(url, None)
+    if not task.cancelled():
+        result = task.result()
+        settled = result["status_code"] is not None and not result.get("unchecked")
+        ttl = LINK_CHECK_CACHE_TTL_SECONDS if settled else LINK_CHECK_ERROR_TTL_SECONDS
+        _results[url] = (time.time() + ttl, result)
+        _results.move_to_end(url)
+        while len(_results) > LINK_CHECK_CACHE_MAX_ENTRIES:
+            _results.popitem(last=False)
+
+
+async def _check_cached(url: str, min_interval: Optional[float] = None) -> Dict[str, Any]:
+    entry = _results.get(url)
+    if entry is not None and entry[0] > time.time():
+        _results.move_to_end(url)
+        return {**entry[1], "cached": True}
+
+    task = _in_flight.get(url)
+    shared = task is not None
+    if task is None:
+        # Its own task: a page that gives up (stage timeout) doesn't cancel the check for others
+        task = _in_flight[url] = asyncio.create_task(_check(url, min_interval))
+        task.add_done_callback(lambda done: _store(url, done))
+    return {**await asyncio.shield(task), "cached": shared}
+
+
+async def check_links(urls: List[str], budget: float = LINK_CHECK_BUDGET_SECONDS,
+                      min_interval: Optional[float] = None) -> Dict[str, Any]:
+    """Check the first LINK_CHECK_MAX_LINKS unique http(s) URLs concurrently within `budget` seconds.
+
+    Probes to one host are capped and spaced like page fetches; `min_interval` widens
+    the gap (a crawl's Crawl-delay).
+
+    URLs whose check hasn't finished when the budget runs out, or whose server replied
+    429/503, are reported with `"unchecked": True` and `ok` None: nothing is known about them yet.
+    """
+    started = time.perf_counter()
+    unique = list(dict.fromkeys(url for url in urls if url.startswith(('http://', 'https://'))))
+    skipped = max(len(unique) - LINK_CHECK_MAX_LINKS, 0)
+    unique = unique[:LINK_CHECK_MAX_LINKS]
+
+    tasks = {url: asyncio.create_task(_check_cached(url, min_interval)) for url in unique}
+    if tasks:
+        await asyncio.wait(tasks.values(), timeout=budget)
+
+    results = {}
+    for url, task in tasks.items():
+        if task.done():
+            results[url] = task.result()
+        else:
+            # The shared check keeps running and will be cached for the next page
+            task.cancel()
+            results[url] = {"url": url, "status_code": None, "ok": None, "error": None, "unchecked": True, "cached": False}
+
+    unchecked = sum(1 for result in results.values() if result.get("unchecked"))
+    return {
+        "results": results,
+        "checked": len(results) - unchecked,
+        "unchecked": unchecked,
+        "skipped": skipped,
+        "timeouts": sum(1 for result in results.values() if result.get("error") == "timeout"),
+        "cached": sum(1 for result in results.values() if result.get("cached")),
+        "seconds": round(time.perf_counter() - started, 4),
+    }
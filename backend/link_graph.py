@@ -0,0 +1,294 @@
+import asyncio
+import logging
+import os
+import time
+from array import array
+from collections import OrderedDict, defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Tuple
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from executor_service import run_cpu
+from result_cache import normalize_url
+
+logger = logging.getLogger(__name__)
+
+LINK_GRAPH_MAX_SITES = int(os.environ.get('LINK_GRAPH_MAX_SITES', 20))
+# While a crawl keeps adding pages, a site's metrics are recomputed at most this often
+LINK_GRAPH_RECOMPUTE_SECONDS = float(os.environ.get('LINK_GRAPH_RECOMPUTE_SECONDS', 60))
+PAGERANK_DAMPING = 0.85
+PAGERANK_ITERATIONS = 50
+PAGERANK_TOLERANCE = 1e-6
+
+
+def site_of(url: str) -> str:
+    return (urlsplit(url).hostname or '').lower()
+
+
+class LinkGraph:
+    """Internal link graph of one site with interned URL and anchor-text ids.
+
+    Out-edges are kept per source page so a re-analyzed page replaces its edges in
+    place; metrics run over a CSR snapshot rebuilt only after the graph changed.
+    """
+
+    def __init__(self, site: str):
+        self.site = site
+        self.urls: List[str] = []
+        self.url_ids: Dict[str, int] = {}
+        self.anchors: List[str] = []
+        self.anchor_ids: Dict[str, int] = {}
+        self.out_edges: Dict[int, Tuple[array, array]] = {}  # source id -> (target ids, anchor ids)
+        self.version = 0
+
+    def _intern(self, value: str, ids: Dict[str, int], values: List[str]) -> int:
+        existing = ids.get(value)
+        if existing is None:
+            existing = ids[value] = len(values)
+            values.append(value)
+        return existing
+
+    def set_page_links(self, url: str, links: List[Tuple[str, str]]):
+        """Replace the out-links (target URL, anchor text) of an analyzed page; URLs come normalized"""
+        source = self._intern(url, self.url_ids, self.urls)
+        targets, anchors = array('l'), array('l')
+        for target_url, anchor_text in links:
+            target = self._intern(target_url, self.url_ids, self.urls)
+            if target == source:
+                continue  # Self-links carry no structure
+            targets.append(target)
+            anchors.append(self._intern(anchor_text, self.anchor_ids, self.anchors))
+        self.out_edges[source] = (targets, anchors)
+        self.version += 1
+
+    def csr(self) -> Tuple[array, array, array]:
+        """(offsets, targets, anchors): edges of node i are targets[offsets[i]:offsets[i + 1]]"""
+        offsets, targets, anchors = array('l', [0]), array('l'), array('l')
+        for node in range(len(self.urls)):
+            node_targets, node_anchors = self.out_edges.get(node, (array('l'), array('l')))
+            targets.extend(node_targets)
+            anchors.extend(node_anchors)
+            offsets.append(len(targets))
+        return offsets, targets, anchors
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Immutable copy for compute_link_metrics, so analyses can keep updating the graph"""
+        offsets, targets, anchors = self.csr()
+        return {
+            "site": self.site,
+            "version": self.version,
+            "urls": list(self.urls),
+            "anchors": list(self.anchors),
+            "analyzed": set(self.out_edges),
+            "offsets": offsets,
+            "targets": targets,
+            "edge_anchors": anchors,
+        }
+
+
+def _as_index(values) -> np.ndarray:
+    return np.asarray(values, dtype=np.int64)
+
+
+def _click_depth(offsets: np.ndarray, targets: np.ndarray, n: int, home) -> np.ndarray:
+    """BFS from the homepage over followed internal links, one whole frontier per step"""
+    depth = np.full(n, -1, dtype=np.int64)
+    if home is None:
+        return depth
+    depth[home] = 0
+    frontier = np.array([home], dtype=np.int64)
+    level = 0
+    while frontier.size:
+        starts, counts = offsets[frontier], offsets[frontier + 1] - offsets[frontier]
+        # Edge positions of every frontier node: starts[i] .. starts[i] + counts[i] - 1
+        before = np.cumsum(counts) - counts
+        positions = np.arange(counts.sum()) - np.repeat(before, counts) + np.repeat(starts, counts)
+        reached = targets[positions]
+        frontier = np.unique(reached[depth[reached] < 0])
+        level += 1
+        depth[frontier] = level
+    return depth
+
+
+def _pagerank(offsets: np.ndarray, targets: np.ndarray, n: int) -> np.ndarray:
+    """Power iteration over the CSR edges; dangling pages spread their rank evenly"""
+    if not n:
+        return np.zeros(0)
+    out_degree = np.diff(offsets)
+    dangling = out_degree == 0
+    sources = np.repeat(np.arange(n), out_degree)
+    rank = np.full(n, 1.0 / n)
+    for _ in range(PAGERANK_ITERATIONS):
+        share = np.where(dangling, 0.0, rank / np.maximum(out_degree, 1))
+        incoming = np.bincount(targets, weights=share[sources], minlength=n)
+        base = (1 - PAGERANK_DAMPING) / n + PAGERANK_DAMPING * rank[dangling].sum() / n
+        new_rank = base + PAGERANK_DAMPING * incoming
+        delta = np.abs(new_rank - rank).sum()
+        rank = new_rank
+        if delta < PAGERANK_TOLERANCE:
+            break
+    return rank
+
+
+def _top_inbound_anchors(targets: np.ndarray, anchors: np.ndarray, anchor_count: int,
+                         top_n: int) -> Dict[int, List[Tuple[int, int]]]:
+    """target -> [(anchor id, count)] for its top_n anchor texts, most used first"""
+    if not targets.size:
+        return {}
+    pairs, counts = np.unique(targets * anchor_count + anchors, return_counts=True)
+    pair_targets, pair_anchors = pairs // anchor_count, pairs % anchor_count
+    # Pairs come sorted by (target, anchor); a stable sort by (target, -count) keeps ties in anchor order
+    most = int(counts.max())
+    order = np.argsort(pair_targets * (most + 1) + (most - counts), kind='stable')
+    pair_targets, pair_anchors, counts = pair_targets[order], pair_anchors[order], counts[order]
+    group_start = np.flatnonzero(np.r_[True, pair_targets[1:] != pair_targets[:-1]])
+    rank_in_group = np.arange(pair_targets.size) - np.repeat(group_start, np.diff(np.r_[group_start, pair_targets.size]))
+    keep = rank_in_group < top_n
+    top: Dict[int, List[Tuple[int, int]]] = {}
+    for target, anchor, count in zip(pair_targets[keep].tolist(), pair_anchors[keep].tolist(), counts[keep].tolist()):
+        top.setdefault(target, []).append((anchor, count))
+    return top
+
+
+def compute_link_metrics(snapshot: Dict[str, Any], top_n: int = 10) -> Dict[str, Any]:
+    """Orphans, click depth, PageRank and inbound anchor text of a graph snapshot (CPU-bound,
+    vectorized over the CSR arrays so 100k-page sites stay in the seconds range)"""
+    site, urls, anchor_texts = snapshot["site"], snapshot["urls"], snapshot["anchors"]
+    offsets, targets = _as_index(snapshot["offsets"]), _as_index(snapshot["targets"])
+    anchors = _as_index(snapshot["edge_anchors"])
+    analyzed = _as_index(sorted(snapshot["analyzed"]))
+    url_ids = {url: node for node, url in enumerate(urls)}
+    n = len(urls)
+
+    in_degree = np.bincount(targets, minlength=n)
+    home = next((url_ids[url] for url in (f"https://{site}/", f"http://{site}/") if url in url_ids), None)
+    depth = _click_depth(offsets, targets, n, home)
+    rank = _pagerank(offsets, targets, n)
+    inbound_anchors = _top_inbound_anchors(targets, anchors, max(len(anchor_texts), 1), top_n)
+
+    orphans = analyzed[(in_degree[analyzed] == 0) & (analyzed != (-1 if home is None else home))]
+    levels, level_counts = np.unique(depth[depth >= 0], return_counts=True)
+    depth_list, rank_list, in_degree_list = depth.tolist(), rank.tolist(), in_degree.tolist()
+
+    return {
+        "site": site,
+        "version": snapshot["version"],
+        "pages_analyzed": int(analyzed.size),
+        "urls_known": n,
+        "edges": int(targets.size),
+        "orphan_count": int(orphans.size),
+        "orphan_pages": sorted(urls[node] for node in orphans.tolist()),
+        "click_depth": {
+            "home_found": home is not None,
+            "max_depth": int(levels[-1]) if levels.size else None,
+            "distribution": dict(zip(levels.tolist(), level_counts.tolist())),
+            "unreachable_analyzed_pages": int((depth[analyzed] < 0).sum()),
+        },
+        "depth_by_url": {url: (level if level >= 0 else None) for url, level in zip(urls, depth_list)},
+        "pagerank_by_url": dict(zip(urls, rank_list)),
+        "top_pagerank": [
+            {"url": urls[node], "pagerank": round(rank_list[node], 6), "inbound_links": in_degree_list[node]}
+            for node in np.argsort(-rank, kind='stable')[:top_n].tolist()
+        ],
+        "inbound_anchors_by_url": {
+            urls[node]: [{"anchor_text": anchor_texts[anchor], "count": count} for anchor, count in top]
+            for node, top in inbound_anchors.items()
+        },
+        "inbound_links_by_url": dict(zip(urls, in_degree_list)),
+    }
+
+
+class LinkGraphStore:
+    """Per-site link graphs persisted as one edge-list document per analyzed page
+
+    A site's lock exists only while something holds or waits for it, so the lock map
+    stays bounded like the graph LRU.
+    """
+
+    def __init__(self, collection, max_sites: int = LINK_GRAPH_MAX_SITES):
+        self.collection = collection
+        self.max_sites = max_sites
+        self._graphs: "OrderedDict[str, LinkGraph]" = OrderedDict()
+        self._metrics: Dict[str, Tuple[float, Dict[str, Any]]] = {}  # site -> (computed at, metrics)
+        self._computing: Dict[str, asyncio.Task] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._lock_users: Dict[str, int] = defaultdict(int)
+
+    async def start(self):
+        await self.collection.create_index([("site", 1), ("url", 1)], unique=True)
+
+    @asynccontextmanager
+    async def _site_lock(self, site: str):
+        if not self._lock_users[site]:
+            self._locks[site] = asyncio.Lock()
+        self._lock_users[site] += 1
+        try:
+            async with self._locks[site]:
+                yield
+        finally:
+            self._lock_users[site] -= 1
+            if not self._lock_users[site]:
+                del self._lock_users[site], self._locks[site]
+
+    async def _graph(self, site: str) -> LinkGraph:
+        """The in-memory graph for a site, loaded from Mongo on first use (LRU over sites)"""
+        async with self._site_lock(site):
+            graph = self._graphs.get(site)
+            if graph is None:
+                graph = LinkGraph(site)
+                async for page in self.collection.find({"site": site}, {"_id": 0, "url": 1, "links": 1}):
+                    graph.set_page_links(page["url"], [tuple(link) for link in page["links"]])
+                self._graphs[site] = graph
+                while len(self._graphs) > self.max_sites:
+                    evicted, _ = self._graphs.popitem(last=False)
+                    self._metrics.pop(evicted, None)
+            self._graphs.move_to_end(site)
+            return graph
+
+    async def record_page(self, url: str, links: List[Tuple[str, str]]):
+        """Persist a page's followed internal links and apply them to the cached graph"""
+        site = site_of(url)
+        url = normalize_url(url)
+        links = [
+            (normalize_url(target), anchor.strip().lower())
+            for target, anchor in links if site_of(target) == site
+        ]
+        # Under the site's lock, so a graph being loaded by _graph() can't miss or reorder this write
+        async with self._site_lock(site):
+            await self.collection.update_one(
+                {"site": site, "url": url},
+                {"$set": {"links": [list(link) for link in links], "updated_at": datetime.now(timezone.utc).isoformat()}},
+                upsert=True,
+            )
+            graph = self._graphs.get(site)
+            if graph is not None:
+                graph.set_page_links(url, links)
+
+    async def metrics(self, site: str) -> Dict[str, Any]:
+        """Site metrics, recomputed on the CPU executor when the graph changed, but at most once
+        per LINK_GRAPH_RECOMPUTE_SECONDS; `stale` marks metrics older than the latest pages"""
+        graph = await self._graph(site)
+        entry = self._metrics.get(site)
+        if entry is not None and (
+            entry[1]["version"] == graph.version or time.monotonic() - entry[0] < LINK_GRAPH_RECOMPUTE_SECONDS
+        ):
+            metrics = entry[1]
+        else:
+            metrics = await self._compute(site, graph)
+        return {**metrics, "stale": metrics["version"] != graph.version}
+
+    async def _compute(self, site: str, graph: LinkGraph) -> Dict[str, Any]:
+        """One computation per site at a time; concurrent callers share it"""
+        task = self._computing.get(site)
+        if task is None:
+            task = self._computing[site] = asyncio.create_task(
+                run_cpu('link_graph', compute_link_metrics, graph.snapshot())
+            )
+            task.add_done_callback(lambda done: self._computing.pop(site, None))
+        metrics = await asyncio.shield(task)
+        if site in self._graphs:
+            self._metrics[site] = (time.monotonic(), metrics)
+        return metrics
@@ -0,0 +1,312 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+import openai
+from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+# ========== LLM GATEWAY ==========
+# One pooled OpenAI client for the app; every completion goes through a scheduler that
+# keeps the org's request and token rate limits and serves interactive work first
+OPENAI_BASE_URL = os.environ.get('OPENAI_BASE_URL') or None
+OPENAI_MAX_CONCURRENCY = int(os.environ.get('OPENAI_MAX_CONCURRENCY', 8))
+OPENAI_REQUESTS_PER_MINUTE = float(os.environ.get('OPENAI_REQUESTS_PER_MINUTE', 500))
+OPENAI_TOKENS_PER_MINUTE = float(os.environ.get('OPENAI_TOKENS_PER_MINUTE', 200000))
+OPENAI_MAX_RETRIES = int(os.environ.get('OPENAI_MAX_RETRIES', 4))
+OPENAI_TIMEOUT_SECONDS = float(os.environ.get('OPENAI_TIMEOUT_SECONDS', 120))
+
+RETRY_BASE_SECONDS = 0.5
+RETRY_MAX_SECONDS = 20
+# Reserved for the reply when the caller sets no max_tokens; corrected from usage afterwards
+DEFAULT_COMPLETION_TOKENS = 1500
+CHARS_PER_TOKEN = 4
+
+PRIORITIES = ('interactive', 'batch')
+
+
+class TokenBucket:
+    """Refills `rate_per_minute` units per minute up to one minute's worth.
+
+    The level may go negative when actual usage exceeds the estimate that was
+    taken; later requests then wait until the debt is refilled.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60
+        self.capacity = rate_per_minute
+        self.level = rate_per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds until `amount` is available (amounts above capacity only need a full bucket)"""
+        self._refill()
+        missing = min(amount, self.capacity) - self.level
+        return max(missing / self.rate, 0.0) if self.rate else 0.0
+
+    def take(self, amount: float):
+        self._refill()
+        self.level -= amount
+
+    def drain(self):
+        """Empty the bucket, e.g. after the server answered 429"""
+        self._refill()
+        self.level = min(self.level, 0.0)
+
+
+def estimate_tokens(completion_args: Dict[str, Any]) -> int:
+    """Rough prompt + completion size used to reserve token budget before sending"""
+    prompt_chars = sum(len(str(message.get('content') or '')) for message in completion_args.get('messages', []))
+    completion = completion_args.get('max_tokens') or completion_args.get('max_completion_tokens') or DEFAULT_COMPLETION_TOKENS
+    return prompt_chars // CHARS_PER_TOKEN + completion
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get('retry-after-ms')) / 1000
+    except (TypeError, ValueError):
+        pass
+    try:
+        return float(response.headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError)):
+        return True  # APITimeoutError is an APIConnectionError
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+class LLMGateway:
+    """Schedules chat completions over one client within concurrency, request and token limits.
+
+    Waiting calls sit in a lane per priority; a lane is only served when every
+    lane before it in PRIORITIES is empty. A 429 drains both buckets and pauses
+    dispatch for the server's Retry-After so queued calls don't pile onto it.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = OPENAI_BASE_URL,
+                 max_concurrency: int = OPENAI_MAX_CONCURRENCY,
+                 requests_per_minute: float = OPENAI_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = OPENAI_TOKENS_PER_MINUTE,
+                 max_retries: int = OPENAI_MAX_RETRIES,
+                 http_client: Optional[httpx.AsyncClient] = None):
+        # The SDK's own retries are off: uncoordinated retries are what we're replacing
+        self.client = AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0, timeout=OPENAI_TIMEOUT_SECONDS,
+                                  http_client=http_client)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._lanes: Dict[str, deque] = {priority: deque() for priority in PRIORITIES}
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._stats = {
+            priority: {"granted": 0, "wait_seconds_total": 0.0, "max_wait_seconds": 0.0}
+            for priority in PRIORITIES
+        }
+        self._counters = {"completions": 0, "retries": 0, "rate_limited": 0, "failures": 0, "tokens_used": 0}
+
+    # ---------- scheduling ----------
+
+    def _dispatch(self):
+        """Grant waiting calls while a slot and budget are free; otherwise re-arm the timer"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._in_flight < self.max_concurrency:
+            lane = next((lane for lane in self._lanes.values() if lane), None)
+            if lane is None:
+                return
+            future, tokens, queued_at, priority = lane[0]
+            if future.done():  # Caller gave up while queued
+                lane.popleft()
+                continue
+
+            delay = max(self._paused_until - time.monotonic(), self.requests.delay(1), self.tokens.delay(tokens))
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+
+            lane.popleft()
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self._in_flight += 1
+            waited = time.monotonic() - queued_at
+            stats = self._stats[priority]
+            stats["granted"] += 1
+            stats["wait_seconds_total"] += waited
+            stats["max_wait_seconds"] = max(stats["max_wait_seconds"], waited)
+            future.set_result(None)
+
+    async def _acquire(self, priority: str, tokens: int, retry: bool = False):
+        if priority not in self._lanes:
+            raise ValueError(f"Unknown priority '{priority}', expected one of {PRIORITIES}")
+        future = asyncio.get_running_loop().create_future()
+        entry = (future, tokens, time.monotonic(), priority)
+        # A retry keeps its place at the head of the lane instead of queueing behind newer calls
+        if retry:
+            self._lanes[priority].appendleft(entry)
+        else:
+            self._lanes[priority].append(entry)
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release()  # Granted in the same tick we were cancelled
+            raise
+
+    def _release(self):
+        self._in_flight -= 1
+        self._dispatch()
+
+    def _settle(self, estimated: int, usage: Any):
+        """Charge the token bucket the difference between estimated and actual usage"""
+        if usage is None:
+            return
+        used = getattr(usage, 'total_tokens', None) or 0
+        self._counters["tokens_used"] += used
+        if used:
+            self.tokens.take(used - estimated)
+
+    def _backoff(self, error: Exception, attempt: int) -> float:
+        """Retry-After when the server sent one, else exponential backoff with full jitter"""
+        server_delay = _retry_after(error)
+        if isinstance(error, openai.RateLimitError):
+            self._counters["rate_limited"] += 1
+            self.requests.drain()
+            self.tokens.drain()
+            pause = server_delay if server_delay is not None else RETRY_BASE_SECONDS * 2 ** attempt
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+        if server_delay is not None:
+            return min(server_delay, RETRY_MAX_SECONDS)
+        return random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt))
+
+    async def _create(self, priority: str, completion_args: Dict[str, Any], tokens: int):
+        """Acquire a slot and start the request, retrying 429 / 5xx / connection errors.
+
+        The slot is still held when this returns; the caller releases it.
+        """
+        attempt = 0
+        while True:
+            await self._acquire(priority, tokens, retry=attempt > 0)
+            try:
+                return await self.client.chat.completions.create(**completion_args)
+            except Exception as e:
+                self._release()
+                if not _retryable(e) or attempt >= self.max_retries:
+                    self._counters["failures"] += 1
+                    raise
+                delay = self._backoff(e, attempt)
+                attempt += 1
+                self._counters["retries"] += 1
+                logger.warning(f"OpenAI call failed ({type(e).__name__}), retry {attempt} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+            except BaseException:
+                self._release()
+                raise
+
+    # ---------- public API ----------
+
+    async def complete(self, completion_args: Dict[str, Any], priority: str = 'interactive'):
+        """One chat completion, scheduled and retried by the gateway"""
+        tokens = estimate_tokens(completion_args)
+        response = await self._create(priority, completion_args, tokens)
+        try:
+            self._settle(tokens, response.usage)
+            self._counters["completions"] += 1
+            return response
+        finally:
+            self._release()
+
+    async def stream(self, completion_args: Dict[str, Any], priority: str = 'interactive') -> AsyncIterator[Any]:
+        """Chunks of a streamed chat completion; the slot is held until the stream ends.
+
+        Only starting the stream is retried: once chunks were handed out, a
+        failure is raised to the caller.
+        """
+        tokens = estimate_tokens(completion_args)
+        args = {**completion_args, "stream": True, "stream_options": {"include_usage": True}}
+        stream = await self._create(priority, args, tokens)
+        usage = None
+        try:
+            async for chunk in stream:
+                if getattr(chunk, 'usage', None) is not None:
+                    usage = chunk.usage
+                yield chunk
+            self._counters["completions"] += 1
+        except Exception:
+            self._counters["failures"] += 1
+            raise
+        finally:
+            await stream.close()
+            self._settle(tokens, usage)
+            self._release()
+
+    def metrics(self) -> Dict[str, Any]:
+        self.requests._refill()
+        self.tokens._refill()
+        return {
+            **self._counters,
+            "in_flight": self._in_flight,
+            "max_concurrency": self.max_concurrency,
+            "paused_seconds": round(max(self._paused_until - time.monotonic(), 0.0), 3),
+            "request_budget": round(self.requests.level, 2),
+            "token_budget": round(self.tokens.level, 2),
+            "lanes": {
+                priority: {
+                    "queued": sum(1 for future, *_ in lane if not future.done()),
+                    "granted": self._stats[priority]["granted"],
+                    "avg_wait_seconds": round(
+                        self._stats[priority]["wait_seconds_total"] / self._stats[priority]["granted"], 4
+                    ) if self._stats[priority]["granted"] else 0.0,
+                    "max_wait_seconds": round(self._stats[priority]["max_wait_seconds"], 4),
+                }
+                for priority, lane in self._lanes.items()
+            },
+        }
+
+    async def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        await self.client.close()
+
+
+_gateway: Optional[LLMGateway] = None
+
+
+def get_llm_gateway() -> LLMGateway:
+    """App-scoped gateway; created lazily on first use so a missing key fails per request"""
+    global _gateway
+    if _gateway is None:
+        _gateway = LLMGateway(api_key=os.environ.get('OPENAI_API_KEY'))
+    return _gateway
+
+
+async def close_llm_gateway():
+    global _gateway
+    if _gateway is not None:
+        await _gateway.close()
+        _gateway = None
+
+
+def get_llm_metrics() -> Dict[str, Any]:
+    return _gateway.metrics() if _gateway is not None else {"started": False}
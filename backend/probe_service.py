@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import os
+from typing import Any, Dict, Optional
+from urllib.parse import urljoin
+
+import httpx
+
+from fetch_service import get_http_client, probe_validators
+
+logger = logging.getLogger(__name__)
+
+# Per-request timeout and overall wall-clock budget for all crawlability probes
+PROBE_TIMEOUT_SECONDS = float(os.environ.get('PROBE_TIMEOUT_SECONDS', 10))
+PROBE_BUDGET_SECONDS = float(os.environ.get('PROBE_BUDGET_SECONDS', 15))
+
+# Only the head of each probe body is needed (robots preview, XML sniffing)
+PROBE_MAX_BYTES = 4096
+
+# Sitemap candidates in order of preference
+SITEMAP_PATHS = [
+    "/sitemap.xml",
+    "/sitemap_index.xml",
+    "/sitemap-index.xml",
+    "/sitemap1.xml",
+    "/wp-sitemap.xml",  # WordPress
+    "/post-sitemap.xml"
+]
+
+
+async def _fetch_probe(client: httpx.AsyncClient, url: str) -> Optional[Dict[str, Any]]:
+    """GET a probe URL and read at most PROBE_MAX_BYTES of the body, None on failure
+
+    Revalidated with stored validators; a 304 returns the previous probe result.
+    """
+    try:
+        async with client.stream('GET', url, headers=probe_validators.headers(url), follow_redirects=False,
+                                 timeout=PROBE_TIMEOUT_SECONDS) as response:
+            previous = probe_validators.not_modified(url, response)
+            if previous is not None:
+                return previous
+            body = b''
+            async for chunk in response.aiter_bytes():
+                body += chunk
+                if len(body) >= PROBE_MAX_BYTES:
+                    break
+            probe = {
+                "url": url,
+                "status_code": response.status_code,
+                "content_type": response.headers.get('content-type', '').lower(),
+                "text": body[:PROBE_MAX_BYTES].decode(response.encoding or 'utf-8', errors='replace'),
+            }
+            probe_validators.remember(url, response, probe, len(probe["text"]) + len(url))
+            return probe
+    except Exception as e:
+        logger.debug(f"Probe failed for {url}: {str(e)}")
+        return None
+
+
+def _is_sitemap(probe: Optional[Dict[str, Any]]) -> bool:
+    return bool(probe) and probe["status_code"] == 200 and (
+        'xml' in probe["content_type"] or '<?xml' in probe["text"][:100]
+    )
+
+
+async def _probe_sitemaps(client: httpx.AsyncClient, root: str) -> Optional[str]:
+    """Probe every sitemap candidate at once; return the preferred confirmed URL"""
+    tasks = [asyncio.create_task(_fetch_probe(client, urljoin(root, path))) for path in SITEMAP_PATHS]
+    try:
+        pending = set(tasks)
+        while pending:
+            _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            # Settle as soon as every higher-preference candidate has failed
+            for task in tasks:
+                if not task.done():
+                    break
+                if _is_sitemap(task.result()):
+                    return task.result()["url"]
+        return None
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def find_sitemap_url(root: str) -> Optional[str]:
+    """The preferred sitemap candidate that actually serves XML, if any"""
+    return await _probe_sitemaps(get_http_client(), root)
+
+
+async def run_crawlability_probes(root: str) -> Dict[str, Any]:
+    """Fetch robots.txt, sitemap candidates and llm.txt concurrently within PROBE_BUDGET_SECONDS"""
+    robots_url = urljoin(root, "/robots.txt")
+    llm_txt_url = urljoin(root, "/llm.txt")
+
+    client = get_http_client()
+    robots_task = asyncio.create_task(_fetch_probe(client, robots_url))
+    sitemap_task = asyncio.create_task(_probe_sitemaps(client, root))
+    llm_task = asyncio.create_task(_fetch_probe(client, llm_txt_url))
+    tasks = [robots_task, sitemap_task, llm_task]
+
+    _, pending = await asyncio.wait(tasks, timeout=PROBE_BUDGET_SECONDS)
+    for task in pending:
+        logger.warning(f"Crawlability probe for {root} exceeded {PROBE_BUDGET_SECONDS}s budget")
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+    def result(task):
+        return task.result() if task.done() and not task.cancelled() else None
+
+    robots = result(robots_task)
+    llm_txt = result(llm_task)
+    sitemap_url = result(sitemap_task)
+
+    robots_found = bool(robots) and robots["status_code"] == 200
+    return {
+        "robots_txt_found": robots_found,
+        "robots_txt_url": robots_url,
+        "robots_txt_preview": robots["text"][:500] if robots_found else None,
+        "sitemap_found": sitemap_url is not None,
+        "sitemap_url": sitemap_url or urljoin(root, "/sitemap.xml"),
+        "llm_txt_found": bool(llm_txt) and llm_txt["status_code"] == 200 and len(llm_txt["text"].strip()) > 0,
+        "llm_txt_url": llm_txt_url,
+    }
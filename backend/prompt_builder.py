@@ -0,0 +1,216 @@
+import hashlib
+import json
+import logging
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+AI_MODEL = "gpt-4o-mini"
+CHARS_PER_TOKEN = 4
+
+_encoders: Dict[str, Any] = {}
+
+# ========== PAYLOAD SCHEMA ==========
+# (output section, output key, source) - a source is a dotted path into scraped_data
+# or a callable on it. Values that are missing, None or empty are left out.
+Source = Union[str, Callable[[Dict[str, Any]], Any]]
+
+
+def _get(data: Dict[str, Any], path: str) -> Any:
+    for key in path.split('.'):
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
+
+
+def _top_keywords(data: Dict[str, Any]) -> List[List[Any]]:
+    return [
+        [kw.get('keyword'), kw.get('density_percent'), kw.get('count'), bool(kw.get('in_title'))]
+        for kw in (_get(data, 'keyword_density_analysis.top_keywords') or [])[:5]
+    ]
+
+
+def _top_phrases(data: Dict[str, Any]) -> List[List[Any]]:
+    return [[phrase.get('phrase'), phrase.get('count')]
+            for phrase in (_get(data, 'keyword_density_analysis.top_phrases') or [])[:5]]
+
+
+PROMPT_FIELDS: List[Tuple[str, str, Source]] = [
+    ("title", "text", "title"),
+    ("meta_description", "text", "meta_description"),
+    ("headings", "h1", "h1_tags"),
+    ("headings", "h2_samples", lambda data: (data.get('h2_tags') or [])[:5]),
+    ("content", "word_count", "word_count"),
+    ("content", "readability", "readability_analysis.readability_grade"),
+    ("keywords", "top[keyword,density_percent,count,in_title]", _top_keywords),
+    ("keywords", "top_phrases[phrase,count]", _top_phrases),
+    ("keywords", "meta_keywords", "meta_keywords"),
+    ("schema", "types", "schema_analysis.schema_types"),
+    ("links", "internal_ratio_percent", "linking_analysis.internal_ratio"),
+    ("social", "og_title", "og_title"),
+]
+
+
+def _present(value: Any) -> bool:
+    return value is not None and value != '' and value != [] and value != {}
+
+
+def build_payload(url: str, scraped_data: Dict[str, Any], issues: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Page context for the prose as nested sections (only fields that are present) plus the found issues"""
+    payload: Dict[str, Any] = {"url": url}
+    for section, key, source in PROMPT_FIELDS:
+        try:
+            value = source(scraped_data) if callable(source) else _get(scraped_data, source)
+        except Exception as e:
+            logger.debug(f"Prompt field {section}.{key} skipped: {str(e)}")
+            continue
+        if _present(value):
+            payload.setdefault(section, {})[key] = value
+    if issues:
+        payload["issues[id,priority,category,issue]"] = [
+            [issue["id"], issue["priority"], issue["category"], issue["issue"]] for issue in issues
+        ]
+    return payload
+
+
+# ========== SECTIONS ==========
+# Each prose section is its own request over just the payload keys it reads, so
+# sections run in parallel and a section whose slice is unchanged can be reused.
+# The preamble is static, so it forms a stable prefix the API can cache across calls.
+
+SYSTEM_PREAMBLE = """You are a senior SEO consultant writing one section of a client-ready audit. Respond with valid JSON only: an object with the single output key below.
+
+DATA is JSON about the page. Any `issues` were found and prioritised by automated checks and are final: don't add, drop or re-rank them, and quote their numbers exactly. Be specific to this page; never give generic advice."""
+
+# section: (payload keys it reads, output key description)
+PROMPT_SECTIONS: Dict[str, Tuple[Tuple[str, ...], str]] = {
+    "examples": (
+        ("title", "meta_description", "headings", "content", "keywords", "issues"),
+        "examples: {issue id: ready-to-use fix for that issue on this page (rewritten title or meta text, heading, "
+        "alt text, code snippet...)} for every issue where a concrete example helps",
+    ),
+    "keyword_strategy": (
+        ("title", "meta_description", "headings", "keywords"),
+        "keyword_strategy: {primary_keyword, long_tail_keywords: [3 strings], "
+        "keyword_intent: {keyword: informational|commercial|transactional|navigational}}",
+    ),
+    "competitor_analysis": (
+        ("url", "title", "content", "keywords", "schema"),
+        "competitor_analysis: {assumed_competitors: [3 domains], content_gaps: [specific gaps], "
+        "opportunities: [specific opportunities with numbers]}",
+    ),
+    "content_recommendations": (
+        ("title", "headings", "content", "keywords"),
+        "content_recommendations: [{page_type: Blog Post|Landing Page|Product Page|Service Page|Homepage, "
+        "topic (with target word count), target_keywords: [primary, secondary, LSI], "
+        "structure: {h1: [1 ready-to-use H1], h2: [3], h3: [2]}}]",
+    ),
+    "action_plan_30_days": (
+        ("title", "issues"),
+        "action_plan_30_days: exactly 4 items, Week 1 to Week 4, working through the issues by priority: "
+        "[{week, priority: High|Medium|Low, action (exact steps), expected_impact (measurable)}]",
+    ),
+}
+
+
+def slice_payload(payload: Dict[str, Any], inputs: Tuple[str, ...]) -> Dict[str, Any]:
+    """The payload keys a section reads (a key like `issues[id,...]` matches `issues`)"""
+    return {key: value for key, value in payload.items() if key.split('[', 1)[0] in inputs}
+
+
+# ========== TOKEN REPORT ==========
+
+def _encoder(model: str):
+    if model not in _encoders:
+        try:
+            import tiktoken
+            try:
+                _encoders[model] = tiktoken.encoding_for_model(model)
+            except KeyError:
+                _encoders[model] = tiktoken.get_encoding('o200k_base')
+        except ImportError:
+            logger.info("tiktoken not installed - prompt token counts are estimated from length")
+            _encoders[model] = None
+        except Exception as e:
+            # The first lookup downloads the BPE file; without network (or a
+            # seeded TIKTOKEN_CACHE_DIR) fall back to the estimate for good
+            logger.warning(f"tiktoken encoding unavailable, prompt token counts are estimated: {str(e)}")
+            _encoders[model] = None
+    return _encoders[model]
+
+
+def count_tokens(text: str, model: str = AI_MODEL) -> int:
+    encoder = _encoder(model)
+    if encoder is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoder.encode(text))
+
+
+def _compact(value: Any) -> str:
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+
+def token_report(messages: List[Dict[str, str]], payload: Dict[str, Any], model: str = AI_MODEL) -> Dict[str, Any]:
+    """Prompt tokens in total, per message role and per payload section"""
+    return {
+        "model": model,
+        "tokenizer": "tiktoken" if _encoder(model) is not None else "estimate",
+        "total_tokens": sum(count_tokens(message["content"], model) for message in messages),
+        "by_role": {message["role"]: count_tokens(message["content"], model) for message in messages},
+        "by_section": {section: count_tokens(_compact(value), model) for section, value in payload.items()},
+    }
+
+
+_prompt_stats = {"prompts": 0, "total_tokens": 0, "max_tokens": 0, "last": None}
+
+
+def build_section_messages(section: str, payload: Dict[str, Any],
+                           model: str = AI_MODEL) -> Tuple[List[Dict[str, str]], Dict[str, Any]]:
+    """Chat messages for one prose section over its slice of `payload`, and their token report"""
+    inputs, output = PROMPT_SECTIONS[section]
+    data = slice_payload(payload, inputs)
+    messages = [
+        {"role": "system", "content": f"{SYSTEM_PREAMBLE}\n\nOutput key:\n- {output}"},
+        {"role": "user", "content": f"DATA:{_compact(data)}"},
+    ]
+    report = token_report(messages, data, model)
+
+    _prompt_stats["prompts"] += 1
+    _prompt_stats["total_tokens"] += report["total_tokens"]
+    _prompt_stats["max_tokens"] = max(_prompt_stats["max_tokens"], report["total_tokens"])
+    _prompt_stats["last"] = {"section": section, **report}
+    return messages, report
+
+
+def build_analysis_messages(url: str, scraped_data: Dict[str, Any], issues: List[Dict[str, Any]],
+                            model: str = AI_MODEL) -> Dict[str, Tuple[List[Dict[str, str]], Dict[str, Any]]]:
+    """Messages and token report for every prose section, by section name"""
+    payload = build_payload(url, scraped_data, issues)
+    return {section: build_section_messages(section, payload, model) for section in PROMPT_SECTIONS}
+
+
+def section_cache_key(section: str, completion_args: Dict[str, Any]) -> str:
+    """Cache key of a section request: any change to its model, settings, instructions or data slice misses"""
+    request = {key: value for key, value in completion_args.items() if key not in ('stream', 'stream_options')}
+    return f"{section}#{hashlib.sha256(_compact(request).encode()).hexdigest()}"
+
+
+def section_namespace(section: str, completion_args: Dict[str, Any], data: Dict[str, Any]) -> str:
+    """Requests whose replies may stand in for each other when their data is similar:
+    the same section, model, settings and instructions, about the same issue ids"""
+    request = {key: value for key, value in completion_args.items() if key not in ('messages', 'stream', 'stream_options')}
+    system = [message["content"] for message in completion_args["messages"] if message["role"] == "system"]
+    issue_ids = [row[0] for key, rows in data.items() if key.split('[', 1)[0] == 'issues' for row in rows]
+    basis = {"request": request, "system": system, "issues": issue_ids}
+    return f"{section}#{hashlib.sha256(_compact(basis).encode()).hexdigest()}"
+
+
+def get_prompt_metrics() -> Dict[str, Any]:
+    prompts = _prompt_stats["prompts"]
+    return {
+        "prompts": prompts,
+        "avg_tokens": round(_prompt_stats["total_tokens"] / prompts, 1) if prompts else 0,
+        "max_tokens": _prompt_stats["max_tokens"],
+        "last": _prompt_stats["last"],
+    }
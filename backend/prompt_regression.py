@@ -0,0 +1,134 @@
+"""Regression harness for the SEO rules and the audit prompt.
+
+Offline (default), each fixture in prompt_fixtures/ is checked for:
+- the rule engine reporting the expected issue categories and none of the
+  excluded ones, with a score in the fixture's range
+- issues quoting the exact measured numbers
+- section prompts that together are smaller than the fixture's
+  baseline_prompt_tokens (the original single prompt)
+The offline checks also run in the test suite (tests/test_prompt_regression.py).
+
+With --live, every section prompt of each fixture is also sent through the LLM
+gateway. Each reply must be valid JSON with its section key; examples may only
+use known issue ids and the action plan must have 4 weeks.
+
+    python prompt_regression.py [--live] [--fixtures DIR]
+"""
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+from prompt_builder import AI_MODEL, build_analysis_messages
+from seo_rules import compute_score, evaluate_rules
+
+FIXTURES_DIR = Path(__file__).parent / 'prompt_fixtures'
+PROSE_KEYS = ('examples', 'keyword_strategy', 'competitor_analysis', 'content_recommendations', 'action_plan_30_days')
+
+
+def load_fixtures(directory: Path) -> List[Dict[str, Any]]:
+    return [json.loads(path.read_text()) for path in sorted(directory.glob('*.json'))]
+
+
+def prompt_tokens(sections: Dict[str, Any]) -> int:
+    return sum(report['total_tokens'] for _, report in sections.values())
+
+
+def check_offline(fixture: Dict[str, Any]) -> List[str]:
+    """Problems with the issues, score and prompt for a fixture (empty when it passes)"""
+    data = fixture['scraped_data']
+    issues = evaluate_rules(fixture['url'], data)
+    score = compute_score(issues)
+    total_tokens = prompt_tokens(build_analysis_messages(fixture['url'], data, issues))
+    problems = []
+
+    categories = {issue['category'] for issue in issues}
+    expect = fixture['expect']
+    problems += [f"missing issue '{category}'" for category in expect['issue_categories'] if category not in categories]
+    problems += [f"unexpected issue '{category}'" for category in expect['no_issue_categories'] if category in categories]
+    low, high = expect['seo_score_range']
+    if not low <= score <= high:
+        problems.append(f"seo_score {score} outside {low}-{high}")
+
+    facts = {
+        'title_length': len(data.get('title') or ''),
+        'meta_length': len(data.get('meta_description') or ''),
+        'image_alt': data.get('images_without_alt'),
+        'word_count': data.get('word_count'),
+    }
+    for issue in issues:
+        expected = facts.get(issue['id'])
+        if expected is not None and str(expected) not in issue['issue']:
+            problems.append(f"{issue['id']} issue doesn't quote {expected}: {issue['issue']}")
+
+    baseline = fixture.get('baseline_prompt_tokens')
+    if baseline and total_tokens >= baseline:
+        problems.append(f"section prompts have {total_tokens} tokens, baseline {baseline}")
+    return problems
+
+
+async def check_live(fixture: Dict[str, Any]) -> List[str]:
+    """Problems with the model's replies to a fixture's section prompts"""
+    from llm_gateway import get_llm_gateway
+
+    issues = evaluate_rules(fixture['url'], fixture['scraped_data'])
+    sections = build_analysis_messages(fixture['url'], fixture['scraped_data'], issues)
+    responses = await asyncio.gather(*(
+        get_llm_gateway().complete(
+            dict(model=AI_MODEL, messages=messages, temperature=0.7, response_format={"type": "json_object"})
+        )
+        for messages, _ in sections.values()
+    ))
+
+    reply: Dict[str, Any] = {}
+    problems = []
+    for section, response in zip(sections, responses):
+        try:
+            reply.update(json.loads(response.choices[0].message.content))
+        except json.JSONDecodeError as e:
+            problems.append(f"{section} reply is not JSON: {str(e)}")
+
+    problems += [f"reply lacks '{key}'" for key in PROSE_KEYS if key not in reply]
+    known = {issue['id'] for issue in issues}
+    problems += [f"example for unknown issue '{key}'" for key in (reply.get('examples') or {}) if key not in known]
+    if len(reply.get('action_plan_30_days') or []) != 4:
+        problems.append(f"action plan has {len(reply.get('action_plan_30_days') or [])} weeks, expected 4")
+    return problems
+
+
+async def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--live', action='store_true', help='also run every fixture through the model')
+    parser.add_argument('--fixtures', type=Path, default=FIXTURES_DIR)
+    args = parser.parse_args(argv)
+
+    failed = 0
+    for fixture in load_fixtures(args.fixtures):
+        issues = evaluate_rules(fixture['url'], fixture['scraped_data'])
+        sections = build_analysis_messages(fixture['url'], fixture['scraped_data'], issues)
+        total_tokens = prompt_tokens(sections)
+        tokenizer = next(iter(sections.values()))[1]['tokenizer']
+        baseline = fixture.get('baseline_prompt_tokens')
+        saved = f" ({100 - total_tokens * 100 // baseline}% below baseline {baseline})" if baseline else ''
+        print(f"{fixture['name']}: score {compute_score(issues)}, {len(issues)} issues, "
+              f"{total_tokens} prompt tokens in {len(sections)} sections [{tokenizer}]{saved}")
+
+        problems = check_offline(fixture)
+        if args.live:
+            problems += await check_live(fixture)
+        for problem in problems:
+            print(f"  FAIL {problem}")
+        failed += bool(problems)
+
+    if args.live:
+        from llm_gateway import close_llm_gateway
+        await close_llm_gateway()
+
+    print(f"{failed} fixture(s) failed" if failed else "all fixtures passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(sys.argv[1:])))
@@ -0,0 +1,111 @@
+import copy
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_TTL_SECONDS = int(os.environ.get('RESULT_CACHE_TTL_SECONDS', 24 * 3600))
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', 256))
+# Prose sections are keyed by their prompt, so they can be kept for longer than page results
+AI_SECTION_CACHE_TTL_SECONDS = int(os.environ.get('AI_SECTION_CACHE_TTL_SECONDS', 7 * 24 * 3600))
+AI_SECTION_CACHE_MAX_ENTRIES = int(os.environ.get('AI_SECTION_CACHE_MAX_ENTRIES', 2048))
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form for cache keys: lowercase scheme/host, no default port or fragment, sorted query"""
+    parts = urlsplit(str(url).strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    path = parts.path or '/'
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, path, query, ''))
+
+
+def content_cache_key(url: str, body: bytes) -> str:
+    return f"{normalize_url(url)}#{hashlib.sha256(body).hexdigest()}"
+
+
+class ResultCache:
+    """In-process LRU in front of a Mongo collection; both tiers expire entries after the TTL"""
+
+    def __init__(self, collection, ttl_seconds: int = RESULT_CACHE_TTL_SECONDS, max_entries: int = RESULT_CACHE_MAX_ENTRIES):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._stats = {"memory_hits": 0, "mongo_hits": 0, "misses": 0, "evictions": 0}
+
+    async def start(self):
+        """Create the lookup index and the TTL index that lets Mongo drop expired entries"""
+        try:
+            await self.collection.create_index("key", unique=True)
+            await self.collection.create_index("expires_at", expireAfterSeconds=0)
+        except Exception as e:
+            logger.warning(f"Result cache indexes not created: {str(e)}")
+
+    def _remember(self, key: str, value: Dict[str, Any], expires: float):
+        self._entries[key] = (expires, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, value = entry
+            if expires > time.time():
+                self._entries.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return copy.deepcopy(value)
+            del self._entries[key]
+
+        try:
+            stored = await self.collection.find_one(
+                {"key": key, "expires_at": {"$gt": datetime.now(timezone.utc)}}, {"_id": 0}
+            )
+        except Exception as e:
+            logger.warning(f"Result cache lookup failed: {str(e)}")
+            stored = None
+
+        if stored is None:
+            self._stats["misses"] += 1
+            return None
+
+        expires_at = stored["expires_at"]
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        self._remember(key, stored["value"], expires_at.timestamp())
+        self._stats["mongo_hits"] += 1
+        return copy.deepcopy(stored["value"])
+
+    async def set(self, key: str, value: Dict[str, Any]):
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.ttl_seconds)
+        self._remember(key, copy.deepcopy(value), expires_at.timestamp())
+        try:
+            # expires_at stays a real date (not isoformat) so the TTL index applies
+            await self.collection.update_one(
+                {"key": key},
+                {"$set": {"value": value, "expires_at": expires_at, "created_at": datetime.now(timezone.utc).isoformat()}},
+                upsert=True,
+            )
+        except Exception as e:
+            logger.warning(f"Result cache write failed: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "memory_entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+        }
@@ -1,57 +1,441 @@
-import base64
 import io
+import os
+import time
 import asyncio
+from contextlib import asynccontextmanager
 
-async def capture_responsive_screenshots(url):
-    """Mobile, tablet, desktop screenshots"""
-    try:
+from screenshot_store import save_screenshot
+from executor_service import run_cpu
+
+# Browser pool sizing: browsers x contexts is the number of concurrent captures
+BROWSER_POOL_SIZE = int(os.environ.get('BROWSER_POOL_SIZE', 1))
+BROWSER_CONTEXTS_PER_BROWSER = int(os.environ.get('BROWSER_CONTEXTS_PER_BROWSER', 3))
+# Relaunch a browser after it has served this many pages to contain memory leaks
+BROWSER_RECYCLE_AFTER_PAGES = int(os.environ.get('BROWSER_RECYCLE_AFTER_PAGES', 300))
+# How long a capture waits for a free context before giving up
+BROWSER_ACQUIRE_TIMEOUT_SECONDS = float(os.environ.get('BROWSER_ACQUIRE_TIMEOUT_SECONDS', 30))
+
+
+class BrowserPoolBusy(Exception):
+    """Raised when no browser context frees up within the acquire timeout"""
+
+
+class _PooledBrowser:
+    def __init__(self, browser):
+        self.browser = browser
+        self.pages_served = 0
+        self.active_contexts = 0
+        self.draining = False
+
+    @property
+    def healthy(self):
+        return self.browser.is_connected() and not self.draining
+
+
+class BrowserPool:
+    """Long-lived Chromium instances handing out isolated contexts"""
+
+    def __init__(self, size=BROWSER_POOL_SIZE, contexts_per_browser=BROWSER_CONTEXTS_PER_BROWSER,
+                 recycle_after_pages=BROWSER_RECYCLE_AFTER_PAGES,
+                 acquire_timeout=BROWSER_ACQUIRE_TIMEOUT_SECONDS):
+        self.size = size
+        self.contexts_per_browser = contexts_per_browser
+        self.recycle_after_pages = recycle_after_pages
+        self.acquire_timeout = acquire_timeout
+        self._playwright = None
+        self._browsers = []
+        self._slots = asyncio.Semaphore(size * contexts_per_browser)
+        self._lock = asyncio.Lock()
+        self._waiting = 0
+        self._recycled = 0
+        self._rejected = 0
+
+    async def start(self):
         from playwright.async_api import async_playwright
-        from PIL import Image
-    except ImportError:
-        print("Playwright not installed - skipping screenshots")
-        return {}
 
-    screenshots = {}
-    devices = {
-        'mobile': {'width': 375, 'height': 667, 'name': 'iPhone SE'},
-        'tablet': {'width': 768, 'height': 1024, 'name': 'iPad'},
-        'desktop': {'width': 1440, 'height': 900, 'name': 'Desktop'}
+        self._playwright = await async_playwright().start()
+        self._browsers = [_PooledBrowser(await self._launch()) for _ in range(self.size)]
+
+    async def close(self):
+        for pooled in self._browsers:
+            try:
+                await pooled.browser.close()
+            except Exception as e:
+                print(f"Error closing browser: {str(e)}")
+        self._browsers = []
+        if self._playwright:
+            await self._playwright.stop()
+            self._playwright = None
+
+    async def _launch(self):
+        return await self._playwright.chromium.launch(headless=True)
+
+    async def _checkout(self):
+        """Pick the least-loaded healthy browser, relaunching dead or drained ones"""
+        async with self._lock:
+            for idx, pooled in enumerate(self._browsers):
+                if not pooled.browser.is_connected() or (pooled.draining and pooled.active_contexts == 0):
+                    await self._replace(idx)
+            candidates = [p for p in self._browsers if p.healthy]
+            if not candidates:
+                # Every browser is draining with captures in flight - add capacity for this one
+                idx = min(range(len(self._browsers)), key=lambda i: self._browsers[i].active_contexts)
+                await self._replace(idx)
+                candidates = [self._browsers[idx]]
+            pooled = min(candidates, key=lambda p: p.active_contexts)
+            pooled.active_contexts += 1
+            return pooled
+
+    async def _replace(self, idx):
+        old = self._browsers[idx]
+        if old.active_contexts == 0:
+            try:
+                await old.browser.close()
+            except Exception:
+                pass
+        self._browsers[idx] = _PooledBrowser(await self._launch())
+        self._recycled += 1
+
+    async def _checkin(self, pooled):
+        async with self._lock:
+            pooled.active_contexts -= 1
+            if pooled.pages_served >= self.recycle_after_pages:
+                pooled.draining = True
+            if pooled.draining and pooled.active_contexts == 0 and pooled in self._browsers:
+                await self._replace(self._browsers.index(pooled))
+            elif pooled.active_contexts == 0 and pooled not in self._browsers:
+                # Replaced while still busy; close it now that the last capture finished
+                try:
+                    await pooled.browser.close()
+                except Exception:
+                    pass
+
+    @asynccontextmanager
+    async def context(self, **context_options):
+        """Borrow an isolated browser context; waits (with a timeout) when the pool is full"""
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self._rejected += 1
+            raise BrowserPoolBusy(f"No browser context free after {self.acquire_timeout}s")
+        finally:
+            self._waiting -= 1
+
+        try:
+            pooled = await self._checkout()
+            try:
+                context = await pooled.browser.new_context(**context_options)
+
+                def count_page(_):
+                    pooled.pages_served += 1
+
+                context.on("page", count_page)
+                try:
+                    yield context
+                finally:
+                    await context.close()
+            finally:
+                await self._checkin(pooled)
+        finally:
+            self._slots.release()
+
+    def health(self):
+        return {
+            "browsers": [
+                {
+                    "connected": p.browser.is_connected(),
+                    "draining": p.draining,
+                    "active_contexts": p.active_contexts,
+                    "pages_served": p.pages_served,
+                }
+                for p in self._browsers
+            ],
+            "capacity": self.size * self.contexts_per_browser,
+            "waiting": self._waiting,
+            "recycled": self._recycled,
+            "rejected": self._rejected,
+        }
+
+
+_browser_pool = None
+_browser_pool_failed = False
+
+
+async def start_browser_pool():
+    """Launch the shared browser pool at app startup; screenshots are skipped if it fails"""
+    global _browser_pool, _browser_pool_failed
+    if _browser_pool is None and not _browser_pool_failed:
+        pool = BrowserPool()
+        try:
+            await pool.start()
+        except Exception as e:
+            print(f"Browser pool unavailable - skipping screenshots: {str(e)}")
+            _browser_pool_failed = True
+            await pool.close()
+            return None
+        _browser_pool = pool
+    return _browser_pool
+
+
+async def close_browser_pool():
+    global _browser_pool
+    if _browser_pool is not None:
+        await _browser_pool.close()
+        _browser_pool = None
+
+
+def get_browser_pool_health():
+    return _browser_pool.health() if _browser_pool else {"browsers": [], "started": False}
+
+
+# Viewport capture strategy: parallel | resize | sequential
+SCREENSHOT_MODE = os.environ.get('SCREENSHOT_MODE', 'parallel')
+# Batch workers capture side by side, so each takes one context instead of one per device
+BATCH_SCREENSHOT_MODE = os.environ.get('BATCH_SCREENSHOT_MODE', 'resize')
+
+# Per-capture time budget; when it runs out a best-effort screenshot is taken
+SCREENSHOT_BUDGET_SECONDS = float(os.environ.get('SCREENSHOT_BUDGET_SECONDS', 15))
+# Layout counts as settled once nothing has changed for this long
+SCREENSHOT_QUIET_MS = int(os.environ.get('SCREENSHOT_QUIET_MS', 500))
+
+# Resolves once document size, element count and image loading stop changing for quietMs
+LAYOUT_STABILITY_JS = """
+({ quietMs, timeoutMs }) => new Promise(resolve => {
+    const start = performance.now();
+    let last = null;
+    let stableSince = start;
+    const snapshot = () => {
+        const root = document.documentElement;
+        const images = Array.from(document.images);
+        return [
+            root.scrollWidth,
+            root.scrollHeight,
+            document.body ? document.body.getElementsByTagName('*').length : 0,
+            images.filter(img => img.complete).length,
+            images.length,
+        ].join(':');
+    };
+    const tick = () => {
+        const now = performance.now();
+        const current = snapshot();
+        if (current !== last) {
+            last = current;
+            stableSince = now;
+        }
+        if (now - stableSince >= quietMs) return resolve(true);
+        if (now - start >= timeoutMs) return resolve(false);
+        setTimeout(tick, 50);
+    };
+    const fontsReady = document.fonts ? document.fonts.ready : Promise.resolve();
+    Promise.race([fontsReady, new Promise(r => setTimeout(r, timeoutMs))]).then(tick, tick);
+})
+"""
+
+DEVICES = {
+    'mobile': {'width': 375, 'height': 667, 'name': 'iPhone SE'},
+    'tablet': {'width': 768, 'height': 1024, 'name': 'iPad'},
+    'desktop': {'width': 1440, 'height': 900, 'name': 'Desktop'}
+}
+
+
+async def _wait_for_stable_layout(page, deadline):
+    """True if the layout went quiet before the deadline, False on best effort"""
+    remaining_ms = int((deadline - time.perf_counter()) * 1000)
+    if remaining_ms <= 0:
+        return False
+    try:
+        return bool(await page.evaluate(
+            LAYOUT_STABILITY_JS, {'quietMs': SCREENSHOT_QUIET_MS, 'timeoutMs': remaining_ms}
+        ))
+    except Exception as e:
+        print(f"Layout stability check failed: {str(e)}")
+        return False
+
+
+async def _load_and_settle(page, url, budget=SCREENSHOT_BUDGET_SECONDS):
+    """Navigate, then wait for load and a stable layout within the capture budget"""
+    # No networkidle: long-polling and beacon-heavy pages never go idle
+    from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+    deadline = time.perf_counter() + budget
+
+    def remaining_ms():
+        return max(int((deadline - time.perf_counter()) * 1000), 1)
+
+    try:
+        await page.goto(url, wait_until='domcontentloaded', timeout=remaining_ms())
+    except PlaywrightTimeoutError:
+        print(f"DOMContentLoaded not reached within {budget}s for {url} - best-effort capture")
+        return False
+
+    try:
+        await page.wait_for_load_state('load', timeout=remaining_ms())
+    except PlaywrightTimeoutError:
+        pass
+
+    return await _wait_for_stable_layout(page, deadline)
+
+
+def _compress_png(screenshot_bytes):
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(screenshot_bytes))
+    output = io.BytesIO()
+    img.save(output, format='PNG', optimize=True, quality=85)
+    return output.getvalue()
+
+
+async def _encode_screenshot(screenshot_bytes, config, started):
+    """Compress and store a screenshot; the report only keeps a reference to the blob"""
+    image_id = await save_screenshot(await run_cpu('screenshot_encode', _compress_png, screenshot_bytes))
+
+    return {
+        'image_id': image_id,
+        'image_url': f"/api/screenshots/{image_id}",
+        'device': config['name'],
+        'width': config['width'],
+        'height': config['height'],
+        'capture_seconds': round(time.perf_counter() - started, 2)
     }
 
+
+async def _capture_device(context, url, config):
+    """Load the page in a fresh tab at one viewport and screenshot it"""
+    started = time.perf_counter()
+    page = await context.new_page()
     try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
+        await page.set_viewport_size({'width': config['width'], 'height': config['height']})
+        settled = await _load_and_settle(page, url)
+        screenshot_bytes = await page.screenshot(full_page=False)
+        return {**await _encode_screenshot(screenshot_bytes, config, started), 'best_effort': not settled}
+    finally:
+        await page.close()
 
-            for device_type, config in devices.items():
-                try:
-                    page = await browser.new_page(
-                        viewport={'width': config['width'], 'height': config['height']}
-                    )
-                    await page.goto(url, wait_until='networkidle', timeout=30000)
-                    await page.wait_for_timeout(2000)
-                    screenshot_bytes = await page.screenshot(full_page=False)
 
-                    img = Image.open(io.BytesIO(screenshot_bytes))
-                    output = io.BytesIO()
-                    img.save(output, format='PNG', optimize=True, quality=85)
-                    compressed_bytes = output.getvalue()
+async def _capture_sequential(pool, url):
+    """One context, one page load per device, one device after another"""
+    screenshots = {}
+    async with pool.context() as context:
+        for device_type, config in DEVICES.items():
+            try:
+                screenshots[device_type] = await _capture_device(context, url, config)
+            except Exception as e:
+                print(f"Error capturing {device_type}: {str(e)}")
+    return screenshots
 
+
+async def _capture_parallel(pool, url):
+    """Every device renders at the same time in its own browser context"""
+    async def capture(device_type, config):
+        try:
+            async with pool.context(viewport={'width': config['width'], 'height': config['height']}) as context:
+                return device_type, await _capture_device(context, url, config)
+        except Exception as e:
+            print(f"Error capturing {device_type}: {str(e)}")
+            return device_type, None
+
+    results = await asyncio.gather(*(capture(d, c) for d, c in DEVICES.items()))
+    return {device_type: shot for device_type, shot in results if shot}
+
+
+async def _capture_resize(pool, url):
+    """Load the page once, then resize the viewport between screenshots"""
+    screenshots = {}
+    async with pool.context() as context:
+        page = await context.new_page()
+        try:
+            largest = max(DEVICES.values(), key=lambda c: c['width'])
+            await page.set_viewport_size({'width': largest['width'], 'height': largest['height']})
+            await _load_and_settle(page, url)
+
+            for device_type, config in DEVICES.items():
+                try:
+                    started = time.perf_counter()
+                    await page.set_viewport_size({'width': config['width'], 'height': config['height']})
+                    # Let media queries and resize handlers reflow before the shot
+                    settled = await _wait_for_stable_layout(page, time.perf_counter() + SCREENSHOT_BUDGET_SECONDS / 3)
+                    screenshot_bytes = await page.screenshot(full_page=False)
                     screenshots[device_type] = {
-                        'image': base64.b64encode(compressed_bytes).decode(),
-                        'device': config['name'],
-                        'width': config['width'],
-                        'height': config['height']
+                        **await _encode_screenshot(screenshot_bytes, config, started),
+                        'best_effort': not settled,
                     }
-                    await page.close()
-
                 except Exception as e:
                     print(f"Error capturing {device_type}: {str(e)}")
-                    continue
+        finally:
+            await page.close()
+    return screenshots
+
+
+CAPTURE_MODES = {
+    'parallel': _capture_parallel,
+    'resize': _capture_resize,
+    'sequential': _capture_sequential,
+}
+
+
+async def capture_responsive_screenshots(url, mode=None):
+    """Mobile, tablet, desktop screenshots, or {'skipped': reason} when none could be taken"""
+    try:
+        import playwright.async_api  # noqa: F401
+        import PIL  # noqa: F401
+    except ImportError:
+        print("Playwright not installed - skipping screenshots")
+        return {'skipped': "Playwright not installed"}
+
+    pool = await start_browser_pool()
+    if pool is None:
+        return {'skipped': "Browser pool unavailable"}
 
-            await browser.close()
+    mode = mode or SCREENSHOT_MODE
+    capture = CAPTURE_MODES.get(mode)
+    if capture is None:
+        print(f"Unknown screenshot mode '{mode}' - using parallel")
+        capture = _capture_parallel
 
+    try:
+        screenshots = await capture(pool, url)
     except Exception as e:
         print(f"Playwright error: {str(e)}")
-        return {}
+        return {'skipped': str(e)}
+    return screenshots or {'skipped': "No viewport could be captured"}
 
-    return screenshots
+
+async def benchmark_capture_modes(url, runs=3):
+    """Time every capture mode against one URL; returns median seconds per mode"""
+    results = {}
+    for mode in CAPTURE_MODES:
+        durations = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            shots = await capture_responsive_screenshots(url, mode=mode)
+            durations.append(time.perf_counter() - started)
+        durations.sort()
+        results[mode] = {
+            'median_seconds': round(durations[len(durations) // 2], 2),
+            'min_seconds': round(durations[0], 2),
+            'devices_captured': 0 if 'skipped' in shots else len(shots),
+        }
+    return results
+
+
+async def _benchmark_main(url, runs):
+    try:
+        results = await benchmark_capture_modes(url, runs)
+    finally:
+        await close_browser_pool()
+    for mode, result in results.items():
+        print(f"{mode}: median {result['median_seconds']}s, min {result['min_seconds']}s, "
+              f"{result['devices_captured']} devices")
+    return 0 if results and all(result['devices_captured'] for result in results.values()) else 1
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Time every viewport capture mode against one URL")
+    parser.add_argument('url')
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(_benchmark_main(args.url, args.runs)))
@@ -0,0 +1,145 @@
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+import time
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from typing import Set
+
+from pymongo.errors import DuplicateKeyError
+
+# Where screenshot blobs live: disk | gridfs
+SCREENSHOT_STORE = os.environ.get('SCREENSHOT_STORE', 'disk')
+SCREENSHOT_STORE_DIR = Path(os.environ.get('SCREENSHOT_STORE_DIR', Path(__file__).parent / 'screenshots'))
+GRIDFS_BUCKET_NAME = 'screenshots'
+# Unreferenced blobs are deleted once they were last saved this long ago (covers analyses still running)
+SCREENSHOT_SWEEP_GRACE_SECONDS = int(os.environ.get('SCREENSHOT_SWEEP_GRACE_SECONDS', 3600))
+
+CHUNK_SIZE = 64 * 1024
+DIGEST_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+_gridfs_bucket = None
+_gridfs_files = None
+
+
+def init_screenshot_store(db):
+    """Bind the GridFS bucket when SCREENSHOT_STORE=gridfs (no-op for disk)"""
+    global _gridfs_bucket, _gridfs_files
+    if SCREENSHOT_STORE == 'gridfs':
+        from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+        _gridfs_bucket = AsyncIOMotorGridFSBucket(db, bucket_name=GRIDFS_BUCKET_NAME)
+        _gridfs_files = db[f"{GRIDFS_BUCKET_NAME}.files"]
+
+
+def is_valid_digest(digest: str) -> bool:
+    return bool(DIGEST_PATTERN.match(digest))
+
+
+def _blob_path(digest: str) -> Path:
+    return SCREENSHOT_STORE_DIR / digest[:2] / f"{digest}.png"
+
+
+def _write_blob(path: Path, data: bytes):
+    if path.exists():
+        os.utime(path)  # Same content already stored; mark it as in use again for the sweep
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as tmp:
+        tmp.write(data)
+    os.replace(tmp_path, path)
+
+
+async def save_screenshot(data: bytes) -> str:
+    """Store PNG bytes under their SHA-256 digest and return the digest"""
+    digest = hashlib.sha256(data).hexdigest()
+
+    if _gridfs_bucket is not None:
+        saved_at = datetime.now(timezone.utc)
+        refreshed = await _gridfs_files.update_one({"_id": digest}, {"$set": {"metadata.saved_at": saved_at}})
+        if not refreshed.matched_count:
+            try:
+                await _gridfs_bucket.upload_from_stream_with_id(
+                    digest, f"{digest}.png", data, metadata={"content_type": "image/png", "saved_at": saved_at}
+                )
+            except DuplicateKeyError:
+                pass  # Stored concurrently by another capture of the same content
+    else:
+        await asyncio.to_thread(_write_blob, _blob_path(digest), data)
+
+    return digest
+
+
+async def open_screenshot(digest: str):
+    """Async iterator over a stored blob's bytes, or None if it does not exist"""
+    if _gridfs_bucket is not None:
+        from gridfs.errors import NoFile
+
+        try:
+            stream = await _gridfs_bucket.open_download_stream(digest)
+        except NoFile:
+            return None
+
+        async def gridfs_chunks():
+            while True:
+                chunk = await stream.readchunk()
+                if not chunk:
+                    break
+                yield chunk
+
+        return gridfs_chunks()
+
+    path = _blob_path(digest)
+    if not path.exists():
+        return None
+
+    async def file_chunks():
+        with open(path, 'rb') as blob:
+            while True:
+                chunk = await asyncio.to_thread(blob.read, CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+    return file_chunks()
+
+
+def _sweep_disk(referenced: Set[str], cutoff: float) -> int:
+    deleted = 0
+    for path in SCREENSHOT_STORE_DIR.glob('*/*'):
+        if path.stem in referenced or path.suffix not in ('.png', '.tmp'):
+            continue
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+                deleted += 1
+        except FileNotFoundError:
+            pass
+    return deleted
+
+
+async def sweep_screenshots(referenced: Set[str], grace_seconds: float = SCREENSHOT_SWEEP_GRACE_SECONDS) -> int:
+    """Delete blobs that no report references and that were last saved over `grace_seconds` ago;
+    returns how many were deleted"""
+    if _gridfs_bucket is None:
+        return await asyncio.to_thread(_sweep_disk, referenced, time.time() - grace_seconds)
+
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=grace_seconds)
+    stale = {"$or": [
+        {"metadata.saved_at": {"$lt": cutoff}},
+        {"metadata.saved_at": {"$exists": False}, "uploadDate": {"$lt": cutoff}},
+    ]}
+    from gridfs.errors import NoFile
+
+    deleted = 0
+    async for blob in _gridfs_files.find(stale, {"_id": 1}):
+        if blob["_id"] in referenced:
+            continue
+        try:
+            await _gridfs_bucket.delete(blob["_id"])
+            deleted += 1
+        except NoFile:
+            pass  # Swept by another process
+    return deleted
@@ -0,0 +1,395 @@
+import asyncio
+import difflib
+import hashlib
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ========== SEMANTIC LLM CACHE ==========
+# Templated pages (products that differ only in name and price) produce near-identical
+# prompts. Each reply is indexed by a SimHash and a MinHash of its prompt data; a later
+# request whose data is close enough reuses the reply, with the differing names and
+# numbers substituted (a number only where the reply uses it as the page text does).
+# Everything is computed and kept in-process.
+SEMANTIC_CACHE_ENABLED = os.environ.get('SEMANTIC_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# Candidates are found by SimHash: at most this many of the 64 bits may differ
+SEMANTIC_CACHE_MAX_DISTANCE = int(os.environ.get('SEMANTIC_CACHE_MAX_DISTANCE', 12))
+# ...and accepted when the MinHash estimate of their feature overlap (Jaccard) is at least this.
+# Section slices are small, so a new product name alone costs templated pages 0.2-0.35.
+SEMANTIC_CACHE_MIN_SIMILARITY = float(os.environ.get('SEMANTIC_CACHE_MIN_SIMILARITY', 0.6))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get('SEMANTIC_CACHE_MAX_ENTRIES', 5000))
+SEMANTIC_CACHE_TTL_SECONDS = int(os.environ.get('SEMANTIC_CACHE_TTL_SECONDS', 7 * 24 * 3600))
+# A reply needing more word (not number) substitutions than this is too far from its page to adapt
+SEMANTIC_CACHE_MAX_SUBSTITUTIONS = int(os.environ.get('SEMANTIC_CACHE_MAX_SUBSTITUTIONS', 6))
+
+SIMHASH_BITS = 64
+MINHASH_PERMUTATIONS = 64
+_MERSENNE_PRIME = (1 << 61) - 1
+_MASK = (1 << SIMHASH_BITS) - 1
+# Fixed seeds, so fingerprints are stable across processes
+_PERMUTATIONS = [
+    (int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), 'big') % _MERSENNE_PRIME | 1,
+     int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), 'big') % _MERSENNE_PRIME)
+    for i in range(MINHASH_PERMUTATIONS)
+]
+
+_WORD = re.compile(r"[^\W_]+(?:[.,'][^\W_]+)*|[$€£¥]\s?\d[\d.,]*")
+_NUMBER = re.compile(r"^[$€£¥]?\s?\d[\d.,]*$")
+# Shorter texts (e.g. "1", "72") can't be replaced without rewriting unrelated text
+_MIN_SUBSTITUTION_CHARS = 3
+
+
+# ========== FINGERPRINTS ==========
+
+def _leaves(value: Any, path: str = '') -> List[Tuple[str, Any]]:
+    """(path, scalar) pairs of a JSON-like value; list positions are kept in the path"""
+    if isinstance(value, dict):
+        return [leaf for key, item in value.items() for leaf in _leaves(item, f"{path}.{key}")]
+    if isinstance(value, (list, tuple)):
+        return [leaf for index, item in enumerate(value) for leaf in _leaves(item, f"{path}[{index}]")]
+    return [(path, value)]
+
+
+def features(data: Dict[str, Any]) -> List[str]:
+    """Normalized features of prompt data: the lowercase words of each field, numbers as '#'.
+
+    Prices, counts and lengths are masked so pages of one template fingerprint alike;
+    the numbers themselves are restored when a reply is adapted. Word order is left
+    to the adaptation step, which needs both slices to have the same shape.
+    """
+    result = []
+    for path, value in _leaves(data):
+        field_name = re.sub(r"\[\d+\]", "[]", path)
+        if value is None or isinstance(value, bool):
+            result.append(f"{field_name}={value}")
+            continue
+        words = ['#' if _NUMBER.match(word) else word.lower() for word in _WORD.findall(str(value))]
+        result += [f"{field_name}:{word}" for word in words]
+    return result
+
+
+def _hash64(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), 'big')
+
+
+def simhash(hashes: List[int]) -> int:
+    """64-bit SimHash: each bit is the majority vote of that bit over the feature hashes"""
+    votes = [0] * SIMHASH_BITS
+    for value in hashes:
+        for bit in range(SIMHASH_BITS):
+            votes[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit, vote in enumerate(votes) if vote > 0)
+
+
+def minhash(hashes: List[int]) -> Tuple[int, ...]:
+    """MinHash signature of the feature set under MINHASH_PERMUTATIONS fixed hash permutations"""
+    unique = set(hashes) or {0}
+    return tuple(min((a * value + b) % _MERSENNE_PRIME for value in unique) for a, b in _PERMUTATIONS)
+
+
+def hamming(first: int, second: int) -> int:
+    return bin(first ^ second).count('1')
+
+
+def jaccard(first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+    return sum(1 for a, b in zip(first, second) if a == b) / len(first)
+
+
+# ========== ADAPTATION ==========
+
+def _spans(source: str, target: str) -> Optional[List[Tuple[str, str]]]:
+    """Differing word runs of two versions of a field, e.g. ('Walnut', 'Oak') or ('$499', '$549').
+
+    None when the difference isn't a set of like-for-like replacements (words were
+    only added or removed, or a run is too long to be a name or a number).
+    """
+    source_words, target_words = _WORD.findall(source), _WORD.findall(target)
+    if source_words == target_words:
+        return []  # Only spacing or punctuation differs
+    matcher = difflib.SequenceMatcher(a=source_words, b=target_words, autojunk=False)
+    spans = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        if tag != 'replace' or i2 - i1 > 4 or j2 - j1 > 4:
+            return None
+        spans.append((' '.join(source_words[i1:i2]), ' '.join(target_words[j1:j2])))
+    return spans
+
+
+def substitutions(source: Dict[str, Any], target: Dict[str, Any]) -> Optional[Dict[str, str]]:
+    """Source text -> target text for every field that differs between two prompt data slices.
+
+    None when any difference can't be carried over by substitution: the slices have
+    different shapes, a field changed by more than replacements, a differing text is
+    too short to replace safely (e.g. 'Model 1' vs 'Model 7') or maps to two targets.
+    The reply would then describe the other page, so it mustn't be reused.
+    """
+    source_leaves, target_leaves = dict(_leaves(source)), dict(_leaves(target))
+    if source_leaves.keys() != target_leaves.keys():
+        return None
+
+    pairs: Dict[str, str] = {}
+    for path, source_value in source_leaves.items():
+        target_value = target_leaves[path]
+        if source_value == target_value:
+            continue
+        if isinstance(source_value, str) and isinstance(target_value, str):
+            spans = _spans(source_value, target_value)
+        elif isinstance(source_value, (int, float)) and not isinstance(source_value, bool):
+            spans = [(str(source_value), str(target_value))]
+        else:
+            spans = None
+        if spans is None:
+            return None
+        for old, new in spans:
+            # Case is matched per occurrence when adapting, so 'Oak' and 'oak' are one substitution
+            if len(old) < _MIN_SUBSTITUTION_CHARS or pairs.setdefault(old.lower(), new).lower() != new.lower():
+                return None
+    return pairs
+
+
+def text_substitutions(pairs: Dict[str, str]) -> int:
+    """How many substitutions change words rather than numbers"""
+    return sum(1 for old in pairs if not _NUMBER.match(old))
+
+
+def _match_case(found: str, replacement: str) -> str:
+    if found.islower():
+        return replacement.lower()
+    if found.isupper() and len(found) > 1:
+        return replacement.upper()
+    if found[:1].isupper():
+        return replacement[:1].upper() + replacement[1:]
+    return replacement
+
+
+def _number_contexts(source: Dict[str, Any], pairs: Dict[str, str]) -> Dict[str, set]:
+    """The (lowercase) words next to each substituted number in the source's own text"""
+    contexts: Dict[str, set] = {old: set() for old in pairs if _NUMBER.match(old)}
+    for _, value in _leaves(source):
+        if not isinstance(value, str):
+            continue
+        words = _WORD.findall(value)
+        for index, word in enumerate(words):
+            if word.lower() in contexts:
+                neighbours = words[max(index - 1, 0):index] + words[index + 1:index + 2]
+                contexts[word.lower()].update(other.lower() for other in neighbours if not _NUMBER.match(other))
+    return contexts
+
+
+class _Unanchored(Exception):
+    """A substituted number occurs in the reply without the words around it in the source"""
+
+
+def adapt(value: Any, pairs: Dict[str, str], source: Dict[str, Any]) -> Optional[Any]:
+    """`value` with every whole-word occurrence of a source text (any case) replaced, in strings and keys.
+
+    A number is replaced only where a word next to it also sits next to it in `source`
+    ('120 cm' for a page saying '120 cm wide'). Any other occurrence may be the model's
+    own figure ('150-160 characters' when the word count was 160), so the reply is
+    not adapted at all: None.
+    """
+    if not pairs:
+        return value
+    pattern = re.compile(
+        r"(?<!\w)(" + '|'.join(re.escape(old) for old in sorted(pairs, key=len, reverse=True)) + r")(?!\w)",
+        re.IGNORECASE,
+    )
+    contexts = _number_contexts(source, pairs)
+
+    def replace(match: "re.Match") -> str:
+        old = match.group(0).lower()
+        if old in contexts:
+            before = _WORD.findall(match.string[:match.start()])[-1:]
+            after = _WORD.findall(match.string[match.end():])[:1]
+            if not any(word.lower() in contexts[old] for word in before + after):
+                raise _Unanchored(old)
+        return _match_case(match.group(0), pairs[old])
+
+    def substitute(item: Any) -> Any:
+        if isinstance(item, str):
+            return pattern.sub(replace, item)
+        if isinstance(item, dict):
+            return {substitute(key): substitute(child) for key, child in item.items()}
+        if isinstance(item, list):
+            return [substitute(child) for child in item]
+        return item
+
+    try:
+        return substitute(value)
+    except _Unanchored:
+        return None
+
+
+# ========== CACHE ==========
+
+@dataclass
+class _Entry:
+    namespace: str
+    data: Dict[str, Any]
+    simhash: int
+    minhash: Tuple[int, ...]
+    expires: float = 0.0
+    value: Any = None
+    # Set while the reply is still being generated; near-duplicate requests wait on it
+    pending: Optional[asyncio.Future] = field(default=None, repr=False)
+
+
+class SemanticCache:
+    """Near-duplicate reply cache, LRU-evicted and expiring after `ttl_seconds`.
+
+    Entries are grouped by a caller-chosen namespace (requests that could share a
+    reply at all) and found through SimHash band buckets: with `max_distance + 1`
+    bands, any two hashes within `max_distance` bits share at least one band.
+    """
+
+    def __init__(self, max_distance: int = SEMANTIC_CACHE_MAX_DISTANCE,
+                 min_similarity: float = SEMANTIC_CACHE_MIN_SIMILARITY,
+                 max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+                 ttl_seconds: int = SEMANTIC_CACHE_TTL_SECONDS,
+                 max_substitutions: int = SEMANTIC_CACHE_MAX_SUBSTITUTIONS):
+        self.max_distance = max_distance
+        self.min_similarity = min_similarity
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_substitutions = max_substitutions
+        self.bands = min(max_distance + 1, SIMHASH_BITS)
+        self._band_bits = -(-SIMHASH_BITS // self.bands)
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._buckets: Dict[Tuple[str, int, int], set] = {}
+        self._next_id = 0
+        self._stats = {"hits": 0, "waited": 0, "misses": 0, "rejected": 0, "stored": 0, "evictions": 0}
+
+    def _band_keys(self, namespace: str, fingerprint: int) -> List[Tuple[str, int, int]]:
+        width = (1 << self._band_bits) - 1
+        return [(namespace, band, fingerprint >> band * self._band_bits & width) for band in range(self.bands)]
+
+    def _fingerprint(self, namespace: str, data: Dict[str, Any]) -> _Entry:
+        hashes = [_hash64(feature) for feature in features(data)]
+        return _Entry(namespace, data, simhash(hashes) & _MASK, minhash(hashes))
+
+    def _drop(self, entry_id: int):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        for key in self._band_keys(entry.namespace, entry.simhash):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def _candidates(self, probe: _Entry) -> List[Tuple[float, int, int]]:
+        """(similarity, distance, id) of entries close to `probe`, best first"""
+        now = time.time()
+        ids = set()
+        for key in self._band_keys(probe.namespace, probe.simhash):
+            ids |= self._buckets.get(key, set())
+
+        found = []
+        for entry_id in ids:
+            entry = self._entries.get(entry_id)
+            if entry is None:
+                continue
+            if entry.pending is None and entry.expires <= now:
+                self._drop(entry_id)
+                continue
+            distance = hamming(entry.simhash, probe.simhash)
+            if distance > self.max_distance:
+                continue
+            similarity = jaccard(entry.minhash, probe.minhash)
+            if similarity < self.min_similarity:
+                self._stats["rejected"] += 1
+                continue
+            found.append((similarity, -distance, entry_id))
+        return sorted(found, reverse=True)
+
+    def _adapted(self, entry: _Entry, probe: _Entry) -> Optional[Any]:
+        pairs = substitutions(entry.data, probe.data)
+        value = None
+        if pairs is not None and text_substitutions(pairs) <= self.max_substitutions:
+            value = adapt(entry.value, pairs, entry.data)
+        if value is None:
+            self._stats["rejected"] += 1
+        return value
+
+    async def lookup(self, namespace: str, data: Dict[str, Any]) -> Optional[Tuple[Any, Dict[str, Any]]]:
+        """An adapted reply to a near-duplicate of `data` and how close it was, or None.
+
+        If the closest near-duplicate is still being generated, waits for it.
+        """
+        probe = self._fingerprint(namespace, data)
+        for similarity, negative_distance, entry_id in self._candidates(probe):
+            entry = self._entries.get(entry_id)
+            if entry is None:
+                continue  # Dropped while an earlier candidate was awaited
+            waited = entry.pending is not None
+            if waited:
+                try:
+                    await asyncio.shield(entry.pending)
+                except Exception:
+                    continue  # That request failed; try the next candidate
+                if entry.value is None:
+                    continue
+            value = self._adapted(entry, probe)
+            if value is None:
+                continue
+            if entry_id in self._entries:
+                self._entries.move_to_end(entry_id)
+            self._stats["waited" if waited else "hits"] += 1
+            return value, {"similarity": round(similarity, 3), "distance": -negative_distance, "waited": waited}
+        self._stats["misses"] += 1
+        return None
+
+    def begin(self, namespace: str, data: Dict[str, Any]) -> int:
+        """Announce a reply for `data` that is about to be generated; returns the id for `finish`"""
+        entry = self._fingerprint(namespace, data)
+        entry.pending = asyncio.get_running_loop().create_future()
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = entry
+        for key in self._band_keys(namespace, entry.simhash):
+            self._buckets.setdefault(key, set()).add(entry_id)
+        return entry_id
+
+    def finish(self, entry_id: int, value: Any = None):
+        """Store the reply for a `begin` (or, with no value, withdraw it) and release any waiters"""
+        entry = self._entries.get(entry_id)
+        if entry is None:
+            return
+        pending, entry.pending = entry.pending, None
+        if value is None:
+            self._drop(entry_id)
+            pending.set_exception(LookupError("no reply"))
+            pending.exception()  # Retrieved, so an unawaited failure isn't logged
+            return
+
+        entry.value = value
+        entry.expires = time.time() + self.ttl_seconds
+        self._entries.move_to_end(entry_id)
+        self._stats["stored"] += 1
+        pending.set_result(None)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            if self._entries[oldest].pending is not None:
+                break  # Only in-flight entries are left
+            self._drop(oldest)
+            self._stats["evictions"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "enabled": SEMANTIC_CACHE_ENABLED,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "max_distance": self.max_distance,
+            "min_similarity": self.min_similarity,
+            "ttl_seconds": self.ttl_seconds,
+        }
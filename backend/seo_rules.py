@@ -0,0 +1,330 @@
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+# ========== DETERMINISTIC SEO RULES ==========
+# Issues, priorities and the score come from the analyzers' measurements; the LLM
+# only adds ready-to-use examples and the prose sections on top
+
+PRIORITY_ORDER = ("High", "Medium", "Low")
+PRIORITY_PENALTY = {"High": 10, "Medium": 5, "Low": 2}
+# Most a single category can take off the score, so one weak area can't zero it
+CATEGORY_PENALTY_CAP = 20
+
+# Optimal lengths in characters; check_onpage_seo labels the same bands "Optimal"
+TITLE_OPTIMAL_LENGTH = (50, 60)
+META_DESCRIPTION_OPTIMAL_LENGTH = (150, 160)
+
+
+def _band(value: float, ok: Tuple[float, float], medium: List[Tuple[float, float]]) -> str:
+    if ok[0] <= value <= ok[1]:
+        return "ok"
+    if any(low <= value <= high for low, high in medium):
+        return "medium"
+    return "high"
+
+
+def title_status(length: int) -> str:
+    return _band(length, TITLE_OPTIMAL_LENGTH, [(45, 49), (61, 70)])
+
+
+def meta_status(length: int) -> str:
+    return _band(length, META_DESCRIPTION_OPTIMAL_LENGTH, [(120, 149), (161, 180)])
+
+
+def heading_status(h1_count: int, h2_count: int) -> str:
+    if h1_count == 1 and 3 <= h2_count <= 6:
+        return "ok"
+    return "medium" if h1_count == 1 else "high"
+
+
+def image_status(missing_alt: int) -> str:
+    return _band(missing_alt, (0, 0), [(1, 3)])
+
+
+def content_status(word_count: int) -> str:
+    return _band(word_count, (1000, 2500), [(500, 999), (2501, 3000)])
+
+
+def _section(data: Dict[str, Any], key: str) -> Dict[str, Any]:
+    """An analyzer's output, or {} when it is missing or its stage failed"""
+    section = data.get(key) or {}
+    return {} if section.get('error') else section
+
+
+def _issue(rule_id: str, priority: str, category: str, issue: str, current: str, target: str,
+           impact: str, example: Optional[str] = None) -> Dict[str, Any]:
+    return {
+        "id": rule_id,
+        "priority": priority,
+        "category": category,
+        "issue": issue,
+        "current": current,
+        "target": target,
+        "impact": impact,
+        "example": example,
+    }
+
+
+def _plain(message: str) -> str:
+    """An analyzer message without its leading status emoji"""
+    return message.lstrip('⚠️❌✅ \ufe0f')
+
+
+def _range(band: Tuple[int, int]) -> str:
+    return f"{band[0]}-{band[1]}"
+
+
+def _priority(status: str) -> str:
+    return "High" if status == "high" else "Medium"
+
+
+# ---------- on-page (check_onpage_seo) ----------
+
+def _onpage_rules(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    onpage = _section(data, 'onpage')
+    issues = []
+
+    title_length = onpage.get('title_length', len(data.get('title') or ''))
+    status = title_status(title_length)
+    if not title_length:
+        issues.append(_issue("title_missing", "High", "Title Tag", "Page has no title tag",
+                             "No <title>", f"{_range(TITLE_OPTIMAL_LENGTH)} character title with the primary keyword",
+                             "Titles are the main SERP headline: +20-30% CTR once set"))
+    elif status != "ok":
+        issues.append(_issue("title_length", _priority(status), "Title Tag",
+                             f"Title is {title_length} characters "
+                             f"({'too long' if title_length > TITLE_OPTIMAL_LENGTH[1] else 'too short'})",
+                             f"{title_length} characters", f"{_range(TITLE_OPTIMAL_LENGTH)} characters",
+                             "Full, untruncated title in results: +10-20% CTR"))
+
+    meta_length = onpage.get('meta_length', len(data.get('meta_description') or ''))
+    status = meta_status(meta_length)
+    if not meta_length:
+        issues.append(_issue("meta_missing", "High", "Meta Description", "Page has no meta description",
+                             "No meta description", f"{_range(META_DESCRIPTION_OPTIMAL_LENGTH)} characters with a call to action",
+                             "Controlled snippet instead of scraped text: +5-15% CTR"))
+    elif status != "ok":
+        issues.append(_issue("meta_length", _priority(status), "Meta Description",
+                             f"Meta description is {meta_length} characters "
+                             f"({'too long' if meta_length > META_DESCRIPTION_OPTIMAL_LENGTH[1] else 'too short'})",
+                             f"{meta_length} characters", f"{_range(META_DESCRIPTION_OPTIMAL_LENGTH)} characters",
+                             "Complete snippet in results: +5-10% CTR"))
+
+    h1_count = onpage.get('h1_count', len(data.get('h1_tags') or []))
+    h2_count = onpage.get('h2_count', len(data.get('h2_tags') or []))
+    status = heading_status(h1_count, h2_count)
+    if status != "ok":
+        if h1_count != 1:
+            problem = "no H1 heading" if h1_count == 0 else f"{h1_count} H1 headings"
+        else:
+            problem = f"{h2_count} H2 heading{'' if h2_count == 1 else 's'}"
+        issues.append(_issue("headings", _priority(status), "Headings", f"Page has {problem}",
+                             f"{h1_count} H1, {h2_count} H2", "Exactly 1 H1 and 3-6 H2",
+                             "Clearer topic structure for crawlers and featured snippets"))
+
+    missing_alt = onpage.get('images_without_alt', data.get('images_without_alt') or 0)
+    total_images = onpage.get('total_images', data.get('total_images') or 0)
+    status = image_status(missing_alt)
+    if status != "ok":
+        issues.append(_issue("image_alt", _priority(status), "Images",
+                             f"{missing_alt} of {total_images} images have no alt text",
+                             f"{missing_alt} images without alt", "0 images without alt",
+                             "Image search traffic and accessibility compliance"))
+
+    word_count = onpage.get('word_count', data.get('word_count') or 0)
+    status = content_status(word_count)
+    if status != "ok":
+        issues.append(_issue("word_count", _priority(status), "Content",
+                             f"Page has {word_count} words ({'thin content' if word_count < 1000 else 'very long'})",
+                             f"{word_count} words", "1000-2500 words",
+                             "Better topical coverage: rankings for more long-tail queries"))
+
+    flesch = _section(data, 'readability_analysis').get('flesch_reading_ease')
+    if isinstance(flesch, (int, float)) and flesch < 60:
+        issues.append(_issue("readability", "Low", "Content", f"Text is hard to read (Flesch {flesch})",
+                             f"Flesch reading ease {flesch}", "60-70",
+                             "Lower bounce rate and longer time on page"))
+    return issues
+
+
+# ---------- technical (check_technical_seo) ----------
+
+def _technical_rules(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    technical = _section(data, 'technical_seo')
+    if not technical:
+        return []
+    url = data.get('url') or ''
+    issues = []
+
+    if technical.get('noindex'):
+        issues.append(_issue("noindex", "High", "Technical SEO", "Page is blocked from indexing (noindex)",
+                             f"Meta robots: {technical.get('robots_directive') or 'noindex'}", "index, follow",
+                             "Page can appear in search results at all",
+                             '<meta name="robots" content="index, follow">'))
+    if not technical.get('ssl_enabled'):
+        issues.append(_issue("https", "High", "Security", "Page is served over HTTP",
+                             "HTTP only", "HTTPS with a 301 from HTTP",
+                             "HTTPS is a ranking signal and removes 'Not secure' warnings"))
+
+    canonical_issues = technical.get('canonical_issues') or []
+    if canonical_issues:
+        status = technical.get('canonical_status')
+        issues.append(_issue("canonical", "High" if status == "Error" else "Medium", "Canonical",
+                             "; ".join(_plain(message) for message in canonical_issues),
+                             f"Canonical: {technical.get('canonical_url') or 'not set'} ({status})",
+                             "One self-referencing HTTPS canonical without parameters",
+                             "Ranking signals consolidated on one URL",
+                             f'<link rel="canonical" href="{url}">' if url else None))
+
+    if not technical.get('sitemap_found'):
+        issues.append(_issue("sitemap", "Medium", "Technical SEO", "No XML sitemap found",
+                             "No sitemap.xml", "sitemap.xml listed in robots.txt",
+                             "Faster discovery and indexing of new pages"))
+    if not technical.get('robots_txt_found'):
+        issues.append(_issue("robots_txt", "Low", "Technical SEO", "No robots.txt found",
+                             "No robots.txt", "robots.txt with a Sitemap line",
+                             "Crawl control and sitemap discovery",
+                             f"Sitemap: {urlsplit(url).scheme}://{urlsplit(url).netloc}/sitemap.xml" if url else None))
+    return issues
+
+
+# ---------- structured data (validate_schema_markup) ----------
+
+def _schema_rules(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    schema = _section(data, 'schema_analysis')
+    if not schema:
+        return []
+    if not schema.get('has_schema'):
+        return [_issue("schema_missing", "Medium", "Structured Data", "No structured data found",
+                       "0 schema items", "JSON-LD for the page type (Article, Product, LocalBusiness...)",
+                       "Eligibility for rich results: +10-15% CTR")]
+    validation_issues = schema.get('validation_issues') or []
+    if validation_issues:
+        return [_issue("schema_invalid", "Medium", "Structured Data",
+                       f"{len(validation_issues)} structured data errors: " + "; ".join(validation_issues[:5]),
+                       f"{len(validation_issues)} validation errors in {', '.join(schema.get('schema_types') or [])}",
+                       "0 validation errors", "Rich results stay eligible")]
+    return []
+
+
+# ---------- internal linking (analyze_internal_links) ----------
+
+def _linking_rules(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    links = _section(data, 'linking_analysis')
+    if not links:
+        return []
+    issues = []
+
+    broken = links.get('broken_count') or 0
+    if broken:
+        issues.append(_issue("broken_links", "High", "Internal Linking", f"{broken} broken links on the page",
+                             f"{broken} links returning 4xx/5xx or unreachable", "0 broken links",
+                             "No crawl budget or link equity lost to dead ends"))
+    internal = links.get('internal_count') or 0
+    if internal < 3:
+        issues.append(_issue("few_internal_links", "Medium", "Internal Linking", f"Only {internal} internal links",
+                             f"{internal} internal links", "At least 3 contextual internal links",
+                             "Better crawl paths and PageRank flow to key pages"))
+    ratio = links.get('internal_ratio') or 0
+    if links.get('total_links') and ratio < 70:
+        issues.append(_issue("internal_ratio", "Low", "Internal Linking", f"Internal links are {ratio}% of all links",
+                             f"{ratio}% internal", "70-80% internal",
+                             "More link equity kept on the site"))
+    nofollow = links.get('nofollow_internal_count') or 0
+    if nofollow:
+        issues.append(_issue("nofollow_internal", "Medium", "Internal Linking", f"{nofollow} internal links are nofollow",
+                             f"{nofollow} nofollow internal links", "0 nofollow internal links",
+                             "Internal pages receive the link equity you intend"))
+    empty = links.get('empty_anchor_count') or 0
+    if empty:
+        issues.append(_issue("empty_anchors", "Low", "Internal Linking", f"{empty} links have empty anchor text",
+                             f"{empty} empty anchors", "Descriptive anchor text on every link",
+                             "Anchor text tells search engines what the target is about"))
+    return issues
+
+
+# ---------- performance (analyze_page_speed, analyze_http_response) ----------
+
+def _performance_rules(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    speed = _section(data, 'page_speed_analysis')
+    http = _section(data, 'http_response_analysis')
+    issues = []
+
+    if speed:
+        load = speed.get('total_load_time_seconds') or 0
+        if load >= 2:
+            issues.append(_issue("load_time", "High" if load >= 3 else "Medium", "Performance",
+                                 f"Page takes {load}s to load", f"{load}s", "Under 2s",
+                                 "Every second saved lifts conversions by up to 7%"))
+        size = speed.get('page_size_mb') or 0
+        if size >= 3:
+            issues.append(_issue("page_size", "Medium", "Performance", f"Page weighs {size}MB",
+                                 f"{size}MB", "Under 1MB (3MB at most)", "Faster loads on mobile connections"))
+        if speed.get('compression_enabled') is False:
+            issues.append(_issue("compression", "Medium", "Performance", "Text compression is not enabled",
+                                 "No gzip/brotli", "Brotli or gzip on HTML, CSS and JS",
+                                 "60-80% smaller text transfers"))
+        if speed.get('caching_enabled') is False:
+            issues.append(_issue("caching", "Low", "Performance", "Browser caching is not configured",
+                                 "No Cache-Control / Expires", "Cache-Control max-age on static assets",
+                                 "Instant repeat visits", "Cache-Control: public, max-age=31536000, immutable"))
+        blocking = speed.get('render_blocking_scripts') or 0
+        if blocking > 3:
+            issues.append(_issue("render_blocking", "Low", "Performance", f"{blocking} render-blocking scripts",
+                                 f"{blocking} blocking scripts", "0-3 (async/defer the rest)",
+                                 "Faster first paint", '<script src="..." defer></script>'))
+
+    redirects = http.get('redirect_count') or 0
+    if redirects > 1:
+        issues.append(_issue("redirect_chain", "Medium", "Performance",
+                             f"Redirect chain of {redirects} hops ({http.get('redirect_seconds')}s)",
+                             f"{redirects} redirects", "At most 1 redirect",
+                             "Lower latency and no link equity lost across hops"))
+    if http and str(http.get('final_url') or data.get('url') or '').startswith('https://') \
+            and not (http.get('hsts') or {}).get('present'):
+        issues.append(_issue("hsts", "Low", "Security", "No Strict-Transport-Security header",
+                             "No HSTS", "HSTS with max-age of at least 1 year",
+                             "Browsers never fall back to HTTP",
+                             "Strict-Transport-Security: max-age=31536000; includeSubDomains"))
+    return issues
+
+
+RULES: List[Callable[[Dict[str, Any]], List[Dict[str, Any]]]] = [
+    _onpage_rules, _technical_rules, _schema_rules, _linking_rules, _performance_rules,
+]
+
+
+def evaluate_rules(url: str, scraped_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Every issue the rules find, highest priority first (order within a priority is stable)"""
+    data = {**scraped_data, "url": url}
+    issues = [issue for rule in RULES for issue in rule(data)]
+    return sorted(issues, key=lambda issue: PRIORITY_ORDER.index(issue["priority"]))
+
+
+def compute_score(issues: List[Dict[str, Any]]) -> int:
+    """100 minus priority penalties, each category capped at CATEGORY_PENALTY_CAP"""
+    by_category: Dict[str, int] = defaultdict(int)
+    for issue in issues:
+        by_category[issue["category"]] += PRIORITY_PENALTY[issue["priority"]]
+    return max(0, 100 - sum(min(penalty, CATEGORY_PENALTY_CAP) for penalty in by_category.values()))
+
+
+def summarize(score: int, issues: List[Dict[str, Any]]) -> str:
+    """Two-sentence executive summary naming the most urgent findings"""
+    if not issues:
+        return f"SEO score {score}/100 with no issues found by the automated checks."
+    counts = {priority: sum(1 for issue in issues if issue["priority"] == priority) for priority in PRIORITY_ORDER}
+    breakdown = ", ".join(f"{count} {priority.lower()}" for priority, count in counts.items() if count)
+    top = "; ".join(issue["issue"] for issue in issues[:3])
+    return f"SEO score {score}/100 with {len(issues)} issues ({breakdown} priority). Fix first: {top}."
+
+
+def format_recommendation(issue: Dict[str, Any], example: Optional[str] = None) -> str:
+    """CURRENT / TARGET / EXAMPLE / IMPACT lines as the report renders them"""
+    lines = [f"CURRENT: {issue['current']}", f"TARGET: {issue['target']}"]
+    example = example or issue.get("example")
+    if example:
+        lines.append(f"EXAMPLE: {example}")
+    lines.append(f"IMPACT: {issue['impact']}")
+    return "\n".join(lines)
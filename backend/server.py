@@ -1,20 +1,42 @@
-from fastapi import FastAPI, APIRouter, HTTPException
-from screenshot_service import capture_responsive_screenshots
+from fastapi import FastAPI, APIRouter, HTTPException, Request, UploadFile, File, Form
+from fastapi.responses import Response, StreamingResponse
+from screenshot_service import capture_responsive_screenshots, start_browser_pool, close_browser_pool, get_browser_pool_health, BATCH_SCREENSHOT_MODE
+from probe_service import run_crawlability_probes
+from screenshot_store import init_screenshot_store, is_valid_digest, open_screenshot, sweep_screenshots
+from executor_service import run_cpu, start_cpu_executor, shutdown_cpu_executor, get_stage_timings
+from fetch_service import fetch_page, start_http_client, close_http_client, get_http_pool_metrics, remember_document, stored_document, host_slot
+from job_service import JobQueue, JobQueueFull, TERMINAL_STATUSES
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, HttpUrl
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, ConfigDict, HttpUrl, TypeAdapter, ValidationError
+from typing import List, Optional, Dict, Any, Set, Tuple
 import uuid
 from datetime import datetime, timezone
 import httpx
-from bs4 import BeautifulSoup
-from openai import AsyncOpenAI
+from html_document import DocumentIndex, parse_document
+from json_stream import JSONSectionStream
+from stage_graph import Stage, run_stage_graph
+from result_cache import ResultCache, content_cache_key, normalize_url, AI_SECTION_CACHE_TTL_SECONDS, AI_SECTION_CACHE_MAX_ENTRIES
+from crawl_service import CRAWL_MAX_INTERVAL_SECONDS, SitemapCrawler
+from link_graph import LinkGraphStore
+from link_checker import LINK_CHECK_BUDGET_SECONDS, check_links
+from llm_gateway import get_llm_gateway, close_llm_gateway, get_llm_metrics
+from prompt_builder import (AI_MODEL, PROMPT_SECTIONS, build_payload, build_section_messages, slice_payload,
+                            section_cache_key, section_namespace, get_prompt_metrics)
+from semantic_cache import SemanticCache, SEMANTIC_CACHE_ENABLED
+from seo_rules import (evaluate_rules, compute_score, summarize, format_recommendation, meta_status, title_status,
+                       META_DESCRIPTION_OPTIMAL_LENGTH, TITLE_OPTIMAL_LENGTH)
+import asyncio
+from contextlib import aclosing
+import csv
+import io
 import json
 import re
+import time
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -23,6 +45,11 @@ load_dotenv(ROOT_DIR / '.env')
 mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
+init_screenshot_store(db)
+result_cache = ResultCache(db.analysis_cache)
+ai_section_cache = ResultCache(db.ai_section_cache, AI_SECTION_CACHE_TTL_SECONDS, AI_SECTION_CACHE_MAX_ENTRIES)
+semantic_ai_cache = SemanticCache()
+link_graph = LinkGraphStore(db.link_graph)
 
 # Create the main app without a prefix
 app = FastAPI()
@@ -44,6 +71,7 @@ class StatusCheckCreate(BaseModel):
 
 
 class SEOIssue(BaseModel):
+    id: Optional[str] = None  # seo_rules rule id
     priority: str  # High, Medium, Low
     category: str
     issue: str
@@ -72,6 +100,7 @@ class SEOReport(BaseModel):
     user_name: Optional[str] = None
     user_email: Optional[str] = None
     user_phone: Optional[str] = None
+    batch_id: Optional[str] = None
     
     # Website Overview
     title: Optional[str] = None
@@ -107,10 +136,12 @@ class SEOReport(BaseModel):
     # Overall Score
     seo_score: Optional[int] = None
     analysis_summary: Optional[str] = None
+    ai_error: Optional[str] = None  # Set when the prose sections could not be generated
     
     readability_analysis: Optional[Dict[str, Any]] = {}
     keyword_density_analysis: Optional[Dict[str, Any]] = {}
     page_speed_analysis: Optional[Dict[str, Any]] = {}
+    http_response_analysis: Optional[Dict[str, Any]] = {}
    
     responsive_preview: Optional[Dict[str, Any]] = {}
     
@@ -128,6 +159,54 @@ class UserDetails(BaseModel):
 class SEOAnalysisRequestWithUser(BaseModel):
     url: HttpUrl
     user_details: UserDetails
+    force_refresh: bool = False  # Skip the cached report even if the page is unchanged
+
+class SEOBatchRequest(BaseModel):
+    urls: List[str]
+    user_details: UserDetails
+    force_refresh: bool = False
+
+class SEOCrawlRequest(BaseModel):
+    url: HttpUrl
+    user_details: UserDetails
+    sitemap_url: Optional[HttpUrl] = None  # Default: robots.txt Sitemap: line, then the usual locations
+    max_pages: int = Field(default=500, ge=1)
+    max_depth: int = Field(default=3, ge=0)  # Levels of sitemap indexes to follow
+    min_interval_seconds: Optional[float] = Field(default=None, ge=0, le=CRAWL_MAX_INTERVAL_SECONDS)  # Gap between requests to the site
+    force_refresh: bool = False
+
+class AnalysisBatchResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    
+    id: str
+    status: str  # running, completed
+    source: str = "list"  # list, csv, sitemap
+    total: int
+    duplicates: int = 0
+    rejected_urls: List[str] = []
+    sitemap_url: Optional[str] = None
+    crawl_status: Optional[str] = None  # discovering, completed, failed, interrupted
+    crawl_stats: Dict[str, Any] = {}
+    crawl_error: Optional[str] = None
+    counts: Dict[str, int] = {}  # job status -> number of URLs
+    stats: Dict[str, Any] = {}
+    created_at: str
+    updated_at: str
+
+class AnalysisJobResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    
+    id: str
+    url: str
+    status: str  # queued, running, completed, failed
+    stage: str
+    stages: List[Dict[str, str]] = []
+    attempts: int = 0
+    queue_depth: Optional[int] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: str
+    updated_at: str
 
 class SEOReportResponse(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -138,6 +217,7 @@ class SEOReportResponse(BaseModel):
     user_name: Optional[str] = None
     user_email: Optional[str] = None
     user_phone: Optional[str] = None
+    batch_id: Optional[str] = None
     
     title: Optional[str] = None
     meta_description: Optional[str] = None
@@ -168,9 +248,11 @@ class SEOReportResponse(BaseModel):
     action_plan_30_days: List[Dict[str, str]] = []
     seo_score: Optional[int] = None
     analysis_summary: Optional[str] = None
+    ai_error: Optional[str] = None  # Set when the prose sections could not be generated
     readability_analysis: Optional[Dict[str, Any]] = {}
     keyword_density_analysis: Optional[Dict[str, Any]] = {}
     page_speed_analysis: Optional[Dict[str, Any]] = {}
+    http_response_analysis: Optional[Dict[str, Any]] = {}
     
     responsive_preview: Optional[Dict[str, Any]] = {}
 
@@ -183,7 +265,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # ========== Helper functions ==========
-def check_technical_seo(soup, final_url):
+async def check_technical_seo(doc: DocumentIndex, final_url):
     """Enhanced Technical SEO checks with detailed canonical analysis"""
     from urllib.parse import urlparse, urljoin
     
@@ -191,7 +273,7 @@ def check_technical_seo(soup, final_url):
     root = f"{parsed.scheme}://{parsed.netloc}"
     
     # ========== CANONICAL TAG ANALYSIS (ENHANCED) ==========
-    canonical_tags = soup.find_all("link", rel=lambda v: v and "canonical" in str(v).lower())
+    canonical_tags = doc.canonical_links
     
     canonical_issues = []
     canonical_status = "Not Set"
@@ -240,67 +322,16 @@ def check_technical_seo(soup, final_url):
                 canonical_issues.append(f"⚠️ Cross-domain canonical: {canonical_parsed.netloc}")
                 canonical_status = "Cross-domain"
     
-    # ========== ROBOTS.TXT & SITEMAP ==========
-    robots_url = urljoin(root, "/robots.txt")
-    robots_exists = False
-    robots_content = None
-    try:
-        import httpx
-        with httpx.Client(timeout=10) as client:
-            robots_resp = client.get(robots_url)
-            robots_exists = robots_resp.status_code == 200
-            if robots_exists:
-                robots_content = robots_resp.text[:500]  # First 500 chars
-    except:
-        robots_exists = False
-    
-    # ========== ENHANCED SITEMAP DETECTION ==========
-    sitemap_urls = [
-        "/sitemap.xml",
-        "/sitemap_index.xml",
-        "/sitemap-index.xml",
-        "/sitemap1.xml",
-        "/wp-sitemap.xml",  # WordPress
-        "/post-sitemap.xml"
-    ]
-    
-    sitemap_exists = False
-    sitemap_url = urljoin(root, "/sitemap.xml")
-    
-    try:
-        import httpx
-        with httpx.Client(timeout=10) as client:
-            for path in sitemap_urls:
-                test_url = urljoin(root, path)
-                try:
-                    response = client.get(test_url)
-                    if response.status_code == 200 and ('xml' in response.headers.get('content-type', '').lower() or '<?xml' in response.text[:100]):
-                        sitemap_exists = True
-                        sitemap_url = test_url
-                        break
-                except:
-                    continue
-    except:
-        sitemap_exists = False
-
-    # ========== LLM.TXT DETECTION ==========
-    llm_txt_found = False
-    llm_txt_url = urljoin(root, "/llm.txt")
-    
-    try:
-        with httpx.Client(timeout=10) as client:
-            llm_resp = client.get(llm_txt_url)
-            if llm_resp.status_code == 200 and len(llm_resp.text.strip()) > 0:
-                llm_txt_found = True
-    except:
-        llm_txt_found = False
+    # ========== ROBOTS.TXT, SITEMAP & LLM.TXT ==========
+    # All crawlability probes run concurrently under one time budget
+    probes = await run_crawlability_probes(root)
     
     # ========== META ROBOTS / NOINDEX ==========
-    noindex_meta = soup.find("meta", attrs={"name": "robots"})
+    robots_meta = doc.meta_content(name="robots")
     noindex = False
     robots_directive = "Not Set"
-    if noindex_meta:
-        content = (noindex_meta.get("content") or "").lower()
+    if robots_meta is not None:
+        content = robots_meta.lower()
         robots_directive = content
         noindex = "noindex" in content
     
@@ -315,100 +346,82 @@ def check_technical_seo(soup, final_url):
         "canonical_count": len(canonical_tags),
         
         # Technical Checks
-        "robots_txt_found": robots_exists,
-        "robots_txt_url": robots_url,
-        "robots_txt_preview": robots_content,
-        "sitemap_found": sitemap_exists,
-        "sitemap_url": sitemap_url,
+        "robots_txt_found": probes["robots_txt_found"],
+        "robots_txt_url": probes["robots_txt_url"],
+        "robots_txt_preview": probes["robots_txt_preview"],
+        "sitemap_found": probes["sitemap_found"],
+        "sitemap_url": probes["sitemap_url"],
         "noindex": noindex,
         "robots_directive": robots_directive,
         "ssl_enabled": ssl_enabled,
-        "llm_txt_found": llm_txt_found,
-        "llm_txt_url": llm_txt_url,
+        "llm_txt_found": probes["llm_txt_found"],
+        "llm_txt_url": probes["llm_txt_url"],
     }
 
 
 
-def check_onpage_seo(soup):
+def _length_label(length: int, status: str, optimal: Tuple[int, int]) -> str:
+    """Report label for a length, from the same band the SEO rules use"""
+    if status == "ok":
+        return "Optimal"
+    return "Too Long" if length > optimal[1] else "Too Short"
+
+
+def check_onpage_seo(doc: DocumentIndex):
     """On-page checks: title, meta, headings, images, word count"""
     # Title
-    title = soup.title.string.strip() if soup.title and soup.title.string else ""
+    title = doc.title or ""
     title_len = len(title)
-    title_status = "Optimal" if 50 <= title_len <= 60 else ("Too Long" if title_len > 60 else "Too Short")
+    title_label = _length_label(title_len, title_status(title_len), TITLE_OPTIMAL_LENGTH)
     
     # Meta description
-    meta_desc_tag = soup.find("meta", attrs={"name": "description"})
-    meta_desc = meta_desc_tag.get("content", "").strip() if meta_desc_tag else ""
+    meta_desc = (doc.meta_content(name="description") or "").strip()
     meta_len = len(meta_desc)
-    meta_status = "Optimal" if 120 <= meta_len <= 160 else ("Too Long" if meta_len > 160 else "Too Short")
+    meta_label = _length_label(meta_len, meta_status(meta_len), META_DESCRIPTION_OPTIMAL_LENGTH)
     
     # Headings
-    h1_count = len(soup.find_all("h1"))
-    h2_count = len(soup.find_all("h2"))
-    h3_count = len(soup.find_all("h3"))
-    h4_count = len(soup.find_all("h4"))
-    h5_count = len(soup.find_all("h5"))
-    h6_count = len(soup.find_all("h6"))
+    h1_count = len(doc.find_all("h1"))
+    h2_count = len(doc.find_all("h2"))
+    h3_count = len(doc.find_all("h3"))
+    h4_count = len(doc.find_all("h4"))
+    h5_count = len(doc.find_all("h5"))
+    h6_count = len(doc.find_all("h6"))
     
     
     # Images + Alt
-    images = soup.find_all("img")
+    images = doc.images
     total_imgs = len(images)
-    imgs_without_alt = sum(1 for img in images if not img.get("alt"))
+    imgs_without_alt = sum(1 for img in images if not (img.get("alt") or "").strip())
     
-    # Word count
-    text_soup = BeautifulSoup(str(soup), "html.parser")
-    for script in text_soup(["script", "style", "noscript"]):
-        script.decompose()
-    text = text_soup.get_text(separator=" ")
-    words = [w for w in text.split() if w.strip()]
-    word_count = len(words)
+    # Word count (same tokenization as extract_page_content, so issues quote the reported count)
+    word_count = len(re.findall(r'\w+', doc.text))
     
     return {
         "title": title,
         "title_length": title_len,
-        "title_status": title_status,
+        "title_status": title_label,
         "meta_description": meta_desc,
         "meta_length": meta_len,
-        "meta_status": meta_status,
+        "meta_status": meta_label,
         "h1_count": h1_count,
         "h2_count": h2_count,
         "h3_count": h3_count,
+        "h4_count": h4_count,
+        "h5_count": h5_count,
+        "h6_count": h6_count,
         "total_images": total_imgs,
         "images_without_alt": imgs_without_alt,
         "word_count": word_count,
     }
 
 
-def check_performance(response_obj):
-    """Performance: page size, resource counts"""
-    size_bytes = len(response_obj.content)
-    size_mb = round(size_bytes / (1024 * 1024), 2)
-    
-    soup = BeautifulSoup(response_obj.text, "html.parser")
-    scripts = soup.find_all("script", src=True)
-    links_css = soup.find_all("link", rel=lambda v: v and "stylesheet" in v.lower())
-    imgs = soup.find_all("img")
-    
-    return {
-        "page_size_mb": size_mb,
-        "page_size_status": "Good" if size_mb < 5 else "Large",
-        "total_resources": 1 + len(scripts) + len(links_css) + len(imgs),
-        "js_count": len(scripts),
-        "css_count": len(links_css),
-        "image_count": len(imgs),
-    }
-  
-  
 def calculate_readability(text: str) -> Dict[str, Any]:
     """Calculate multiple readability metrics"""
     try:
 
         import textstat
-        from bs4 import BeautifulSoup
         
-        clean_text = BeautifulSoup(text, 'html.parser').get_text()
-        clean_text = ' '.join(clean_text.split())
+        clean_text = ' '.join(text.split())
         flesch_score = textstat.flesch_reading_ease(clean_text)
         
         return {
@@ -421,7 +434,8 @@ def calculate_readability(text: str) -> Dict[str, Any]:
         }
     except Exception as e:
         logger.error(f"Readability error: {str(e)}")
-        return {"flesch_reading_ease": 0, "readability_grade": "Unable to calculate", "difficulty_level": "error"}
+        # `error` keeps the rules from reading the placeholder score as a real one
+        return {"error": str(e), "flesch_reading_ease": 0, "readability_grade": "Unable to calculate", "difficulty_level": "error"}
 
 def get_readability_grade(score: float) -> str:
     if score >= 90: return "Very Easy (5th grade)"
@@ -451,8 +465,7 @@ def analyze_keyword_density(text: str, title: str = "", meta_desc: str = "", top
             nltk.download('stopwords', quiet=True)
             stop_words = set(stopwords.words('english'))
         
-        from bs4 import BeautifulSoup
-        clean_text = BeautifulSoup(text, 'html.parser').get_text().lower()
+        clean_text = text.lower()
         clean_text = re.sub(r'[^\w\s]', ' ', clean_text)
         words = [w for w in clean_text.split() if len(w) >= 3]
         filtered_words = [w for w in words if w not in stop_words and w.isalpha()]
@@ -527,44 +540,31 @@ def generate_keyword_recommendations(keywords: list, diversity: float, stuffing_
         recommendations.append("✅ Keyword usage looks good")
     return recommendations
     
-async def analyze_page_speed(url: str, response_obj: httpx.Response, soup: BeautifulSoup) -> Dict[str, Any]:
+async def analyze_page_speed(url: str, response_obj: httpx.Response, doc: DocumentIndex, fetch_timings: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """Comprehensive page load speed and performance analysis"""
-    import time
-    from datetime import datetime
-    
     try:
         # ========== TIMING BREAKDOWN ==========
-        # Measure actual response time
-        start_time = time.time()
-        
-        async with httpx.AsyncClient(follow_redirects=True, timeout=30.0) as client:
-            timing_start = time.time()
-            
-            # DNS + Connection + Response time
-            response = await client.get(
-                str(url),
-                headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-            )
-            
-            total_load_time = time.time() - timing_start
+        # Measured phases from the original fetch - the page is never downloaded twice
+        fetch_timings = fetch_timings or {}
+        total_load_time = fetch_timings.get('total_seconds', response_obj.elapsed.total_seconds())
         
         # ========== RESOURCE ANALYSIS ==========
         # Count different resource types
-        scripts = soup.find_all('script')
-        external_scripts = [s for s in scripts if s.get('src')]
-        inline_scripts = [s for s in scripts if not s.get('src') and s.string]
+        scripts = doc.scripts
+        external_scripts = doc.external_scripts
+        inline_scripts = [s for s in scripts if not s.get('src') and s.text]
         
-        stylesheets = soup.find_all('link', rel=lambda v: v and 'stylesheet' in str(v).lower())
-        inline_styles = soup.find_all('style')
+        stylesheets = doc.stylesheets
+        inline_styles = doc.find_all('style')
         
-        images = soup.find_all('img')
+        images = doc.images
         
         # Fonts
-        font_links = soup.find_all('link', href=lambda v: v and ('font' in str(v).lower() or 'woff' in str(v).lower()))
+        font_links = [l for l in doc.link_tags if 'font' in l.get('href', '').lower() or 'woff' in l.get('href', '').lower()]
         
         # Videos
-        videos = soup.find_all('video')
-        iframes = soup.find_all('iframe')
+        videos = doc.find_all('video')
+        iframes = doc.find_all('iframe')
         
         # ========== SIZE ANALYSIS ==========
         page_size_bytes = len(response_obj.content)
@@ -575,8 +575,8 @@ async def analyze_page_speed(url: str, response_obj: httpx.Response, soup: Beaut
         html_size_kb = round(len(response_obj.text.encode('utf-8')) / 1024, 2)
         
         # ========== PERFORMANCE METRICS ==========
-        # Time to First Byte (approximate from headers)
-        ttfb = round(total_load_time * 0.3, 3)  # Estimated
+        # Time to First Byte (measured on the original fetch)
+        ttfb = fetch_timings.get('ttfb_seconds')
         
         # Calculate estimated load times for different resources
         estimated_js_load = len(external_scripts) * 0.2  # ~200ms per script
@@ -603,7 +603,7 @@ async def analyze_page_speed(url: str, response_obj: httpx.Response, soup: Beaut
         
         # ========== RENDER-BLOCKING RESOURCES ==========
         # CSS in head (blocking)
-        css_in_head = len([link for link in soup.find('head').find_all('link', rel='stylesheet') if soup.find('head')])
+        css_in_head = len([link for link in stylesheets if link.in_head])
         
         # Scripts without async/defer
         blocking_scripts = []
@@ -696,6 +696,7 @@ async def analyze_page_speed(url: str, response_obj: httpx.Response, soup: Beaut
             # Timing Metrics
             "total_load_time_seconds": round(total_load_time, 3),
             "time_to_first_byte_seconds": ttfb,
+            "timing_breakdown": fetch_timings,
             "estimated_full_load_seconds": round(total_estimated_load, 2),
             "load_time_grade": "Fast" if total_load_time < 2 else ("Moderate" if total_load_time < 3 else "Slow"),
             
@@ -756,7 +757,145 @@ async def analyze_page_speed(url: str, response_obj: httpx.Response, soup: Beaut
         }
 
 
-def validate_schema_markup(soup, url):
+# Per-hop headers worth showing; the rest of a redirect's headers is noise
+HOP_HEADERS = ('location', 'cache-control', 'server', 'strict-transport-security', 'vary', 'content-type', 'server-timing')
+HSTS_MIN_MAX_AGE = 180 * 24 * 3600
+HSTS_PRELOAD_MAX_AGE = 365 * 24 * 3600
+
+
+def parse_server_timing(header: str) -> List[Dict[str, Any]]:
+    """Server-Timing entries ('db;dur=53.2;desc="Query"') as name / duration_ms / description"""
+    metrics = []
+    for entry in header.split(','):
+        parts = [part.strip() for part in entry.split(';')]
+        if not parts[0]:
+            continue
+        metric = {"name": parts[0], "duration_ms": None, "description": None}
+        for param in parts[1:]:
+            key, _, value = param.partition('=')
+            value = value.strip().strip('"')
+            if key.strip().lower() == 'dur':
+                try:
+                    metric["duration_ms"] = float(value)
+                except ValueError:
+                    pass
+            elif key.strip().lower() == 'desc':
+                metric["description"] = value
+        metrics.append(metric)
+    return metrics
+
+
+def analyze_http_response(response_obj: httpx.Response, fetch_timings: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Redirect chain and response headers (HSTS, Vary, Content-Type, Server-Timing) of the page fetch"""
+    fetch_timings = fetch_timings or {}
+    responses = [*response_obj.history, response_obj]
+    hop_timings = fetch_timings.get('hops') or [{} for _ in responses]
+
+    issues = []
+    recommendations = []
+
+    # ========== REDIRECT CHAIN ==========
+    chain = []
+    for hop_response, timing in zip(responses, hop_timings):
+        chain.append({
+            "url": str(hop_response.url),
+            "status_code": hop_response.status_code,
+            "http_version": hop_response.http_version,
+            "elapsed_seconds": timing.get('elapsed_seconds', round(hop_response.elapsed.total_seconds(), 4)),
+            "server_wait_seconds": timing.get('server_wait_seconds'),
+            "headers": {name: hop_response.headers[name] for name in HOP_HEADERS if name in hop_response.headers},
+        })
+
+    redirects = chain[:-1]
+    redirect_seconds = round(sum(hop['elapsed_seconds'] or 0 for hop in redirects), 4)
+
+    if len(redirects) > 1:
+        issues.append(f"❌ Redirect chain of {len(redirects)} hops adds {redirect_seconds}s before the page loads")
+        recommendations.append("Link and redirect straight to the final URL in a single hop")
+    elif redirects:
+        issues.append(f"⚠️ Requested URL redirects once ({redirect_seconds}s)")
+
+    temporary = [hop for hop in redirects if hop['status_code'] in (302, 303, 307)]
+    if temporary:
+        issues.append(f"⚠️ {len(temporary)} temporary redirect(s) - Search engines may keep the old URL indexed")
+        recommendations.append("Use 301/308 for permanent moves")
+
+    if any(hop['url'].startswith('https://') for hop in redirects) and str(response_obj.url).startswith('http://'):
+        issues.append("❌ Redirect chain downgrades from HTTPS to HTTP")
+
+    # ========== HSTS ==========
+    hsts_header = response_obj.headers.get('strict-transport-security')
+    hsts = {"present": bool(hsts_header), "header": hsts_header, "max_age": None,
+            "include_subdomains": False, "preload": False, "preload_eligible": False}
+    if hsts_header:
+        directives = [directive.strip().lower() for directive in hsts_header.split(';')]
+        for directive in directives:
+            if directive.startswith('max-age='):
+                try:
+                    hsts["max_age"] = int(directive.split('=', 1)[1].strip('"'))
+                except ValueError:
+                    pass
+        hsts["include_subdomains"] = 'includesubdomains' in directives
+        hsts["preload"] = 'preload' in directives
+        hsts["preload_eligible"] = (
+            hsts["include_subdomains"] and hsts["preload"] and (hsts["max_age"] or 0) >= HSTS_PRELOAD_MAX_AGE
+        )
+        if (hsts["max_age"] or 0) < HSTS_MIN_MAX_AGE:
+            issues.append(f"⚠️ HSTS max-age is {hsts['max_age']} - Use at least 6 months (15552000)")
+    elif response_obj.url.scheme == 'https':
+        issues.append("⚠️ No Strict-Transport-Security header")
+        recommendations.append("Add 'Strict-Transport-Security: max-age=31536000; includeSubDomains'")
+
+    # ========== VARY ==========
+    vary_header = response_obj.headers.get('vary', '')
+    vary = sorted({value.strip().lower() for value in vary_header.split(',') if value.strip()})
+    if '*' in vary:
+        issues.append("❌ 'Vary: *' makes the page uncacheable by shared caches")
+    elif 'user-agent' in vary:
+        issues.append("⚠️ 'Vary: User-Agent' fragments CDN caches - Prefer responsive design or client hints")
+    if 'cookie' in vary:
+        issues.append("⚠️ 'Vary: Cookie' prevents caching for visitors with cookies")
+
+    # ========== CONTENT-TYPE ==========
+    content_type_header = response_obj.headers.get('content-type', '')
+    mime_type, _, params = content_type_header.partition(';')
+    charset = None
+    for param in params.split(';'):
+        key, _, value = param.partition('=')
+        if key.strip().lower() == 'charset':
+            charset = value.strip().strip('"').lower()
+    if not content_type_header:
+        issues.append("❌ No Content-Type header")
+    elif mime_type.strip().lower() not in ('text/html', 'application/xhtml+xml'):
+        issues.append(f"❌ Page served as '{mime_type.strip()}' instead of text/html")
+    if content_type_header and not charset:
+        issues.append("⚠️ Content-Type has no charset - Add '; charset=utf-8'")
+
+    # ========== SERVER-TIMING ==========
+    server_timing = parse_server_timing(response_obj.headers.get('server-timing', ''))
+
+    return {
+        "final_url": str(response_obj.url),
+        "status_code": response_obj.status_code,
+        "http_version": response_obj.http_version,
+        "redirect_count": len(redirects),
+        "redirect_seconds": redirect_seconds,
+        "redirect_chain": chain,
+        "hsts": hsts,
+        "vary": vary,
+        "content_type": {
+            "header": content_type_header or None,
+            "mime_type": mime_type.strip().lower() or None,
+            "charset": charset,
+        },
+        "server_timing": server_timing,
+        "server_timing_total_ms": round(sum(metric['duration_ms'] or 0 for metric in server_timing), 2),
+        "issues": issues,
+        "recommendations": recommendations,
+    }
+
+
+def validate_schema_markup(doc: DocumentIndex, url):
     """Validate and analyze structured data (JSON-LD, Microdata, RDFa)"""
     
     schema_data = {
@@ -769,7 +908,7 @@ def validate_schema_markup(soup, url):
     }
     
     # ========== JSON-LD Detection ==========
-    json_ld_scripts = soup.find_all('script', type='application/ld+json')
+    json_ld_scripts = doc.json_ld_scripts
     
     if json_ld_scripts:
         schema_data["has_schema"] = True
@@ -778,7 +917,7 @@ def validate_schema_markup(soup, url):
         for idx, script in enumerate(json_ld_scripts):
             try:
                 # Parse JSON-LD
-                json_content = json.loads(script.string)
+                json_content = json.loads(script.text)
                 
                 # Extract @type
                 schema_type = None
@@ -808,7 +947,7 @@ def validate_schema_markup(soup, url):
                 })
     
     # ========== MICRODATA Detection ==========
-    microdata_items = soup.find_all(attrs={"itemtype": True})
+    microdata_items = doc.microdata_items
     if microdata_items:
         schema_data["has_schema"] = True
         schema_data["schema_count"] += len(microdata_items)
@@ -824,7 +963,7 @@ def validate_schema_markup(soup, url):
         )
     
     # Check for common schema types based on page content
-    page_text = soup.get_text().lower()
+    page_text = doc.text.lower()
     
     if not schema_data["schema_types"]:
         # Suggest schema based on content
@@ -846,10 +985,8 @@ def validate_schema_markup(soup, url):
     return schema_data
 
 
-def analyze_internal_links(soup, base_url):
-    """Analyze internal linking structure"""
-    ...
-
+def classify_links(doc: DocumentIndex, base_url) -> Dict[str, List[Dict[str, Any]]]:
+    """Every crawlable anchor of the page as absolute URLs, split into internal and external"""
     from urllib.parse import urlparse, urljoin
     
     parsed_base = urlparse(base_url)
@@ -857,9 +994,8 @@ def analyze_internal_links(soup, base_url):
     
     internal_links = []
     external_links = []
-    broken_links = []
     
-    all_links = soup.find_all('a', href=True)
+    all_links = doc.anchors
     
     for link in all_links:
         href = link.get('href', '').strip()
@@ -873,8 +1009,8 @@ def analyze_internal_links(soup, base_url):
         
         link_info = {
             "url": absolute_url,
-            "anchor_text": link.get_text().strip()[:100],  # First 100 chars
-            "has_nofollow": 'nofollow' in link.get('rel', []),
+            "anchor_text": link.text.strip()[:100],  # First 100 chars
+            "has_nofollow": 'nofollow' in link.rel,
             "opens_new_tab": link.get('target') == '_blank'
         }
         
@@ -884,8 +1020,46 @@ def analyze_internal_links(soup, base_url):
         else:
             external_links.append(link_info)
     
+    return {"internal": internal_links, "external": external_links}
+
+
+def analyze_internal_links(doc: DocumentIndex, base_url, links: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+                           link_check: Optional[Dict[str, Any]] = None):
+    """Analyze internal linking structure (`link_check` is a check_links result for the page's links)"""
+    links = links or classify_links(doc, base_url)
+    internal_links = links["internal"]
+    external_links = links["external"]
+    statuses = (link_check or {}).get("results", {})
+    
+    broken_links = []
+    redirected_links = []
+    unchecked_links = []
+    for internal, group in ((True, internal_links), (False, external_links)):
+        for link in group:
+            status = statuses.get(link['url'])
+            if status is None:
+                continue
+            if status.get('unchecked'):
+                # The page's check budget ran out first; not evidence of a broken link
+                unchecked_links.append({"url": link['url'], "anchor_text": link['anchor_text'], "internal": internal})
+            elif not status.get('ok'):
+                broken_links.append({
+                    "url": link['url'],
+                    "anchor_text": link['anchor_text'],
+                    "internal": internal,
+                    "status_code": status.get('status_code'),
+                    "error": status.get('error'),
+                })
+            elif status.get('redirect_chain'):
+                redirected_links.append({
+                    "url": link['url'],
+                    "final_url": status.get('final_url'),
+                    "internal": internal,
+                    "redirect_chain": status['redirect_chain'],
+                })
+    
     # Calculate statistics
-    total_links = len(all_links)
+    total_links = len(doc.anchors)
     internal_count = len(internal_links)
     external_count = len(external_links)
     
@@ -912,6 +1086,16 @@ def analyze_internal_links(soup, base_url):
     if empty_anchors > 0:
         recommendations.append(f"❌ {empty_anchors} links have empty anchor text - Add descriptive anchor text")
     
+    if broken_links:
+        recommendations.append(f"❌ {len(broken_links)} broken links (4xx/5xx or unreachable) - Fix or remove them")
+    
+    if unchecked_links:
+        recommendations.append(f"⚠️ {len(unchecked_links)} links could not be checked (time budget or rate limiting) - Re-run the analysis to check them")
+    
+    internal_redirects = sum(1 for link in redirected_links if link['internal'])
+    if internal_redirects > 0:
+        recommendations.append(f"⚠️ {internal_redirects} internal links redirect - Point them at the final URL")
+    
     return {
         "total_links": total_links,
         "internal_count": internal_count,
@@ -922,10 +1106,16 @@ def analyze_internal_links(soup, base_url):
         "nofollow_internal_count": nofollow_count,
         "empty_anchor_count": empty_anchors,
         "empty_anchor_links": empty_anchor_links,
+        "broken_count": len(broken_links),
+        "broken_links": broken_links[:50],
+        "unchecked_count": len(unchecked_links),
+        "unchecked_links": unchecked_links[:50],
+        "redirected_links": redirected_links[:20],
+        "link_check": {key: value for key, value in (link_check or {}).items() if key != "results"},
         "recommendations": recommendations
     }
     # ========== NEW: BACKLINK ANALYZER ==========
-async def analyze_backlinks(url: str, soup: BeautifulSoup) -> Dict[str, Any]:
+async def analyze_backlinks(url: str, doc: DocumentIndex) -> Dict[str, Any]:
     """Analyze backlinks, external links, and referrer potential"""
     from urllib.parse import urlparse, urljoin
     
@@ -943,7 +1133,7 @@ async def analyze_backlinks(url: str, soup: BeautifulSoup) -> Dict[str, Any]:
         "external_link_details": []
     }
     
-    all_links = soup.find_all('a', href=True)
+    all_links = doc.anchors
     external_links = []
     domain_count = {}
     
@@ -958,12 +1148,12 @@ async def analyze_backlinks(url: str, soup: BeautifulSoup) -> Dict[str, Any]:
         
         # Only external links
         if parsed_link.netloc and parsed_link.netloc != base_domain:
-            is_nofollow = 'nofollow' in link.get('rel', [])
+            is_nofollow = 'nofollow' in link.rel
             
             link_info = {
                 "url": absolute_url,
                 "domain": parsed_link.netloc,
-                "anchor_text": link.get_text().strip()[:100],
+                "anchor_text": link.text.strip()[:100],
                 "is_dofollow": not is_nofollow,
                 "is_nofollow": is_nofollow,
                 "opens_new_tab": link.get('target') == '_blank'
@@ -1040,479 +1230,438 @@ def estimate_domain_authority(domain: str) -> str:
 
 
 # Web Scraping Function
-async def scrape_website(url: str) -> Dict[str, Any]:
-    """Scrape website and extract SEO-relevant data"""
-    try:
-        async with httpx.AsyncClient(follow_redirects=True, timeout=30.0) as client:
-            response = await client.get(str(url), headers={
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            })
-            response.raise_for_status()
-            
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # ✅ FIX: Convert response.url to string
-        final_url = str(response.url)
-        
-        technical_seo = check_technical_seo(soup, final_url)
-        onpage_seo = check_onpage_seo(soup)
-        performance = check_performance(response)
-        schema_analysis = validate_schema_markup(soup, str(url))
-        linking_analysis = analyze_internal_links(soup, str(url))
-        backlink_analysis = await analyze_backlinks(str(url), soup)  # NEW!
-
-        # Extract title
-        title = soup.find('title')
-        title_text = title.get_text().strip() if title else None
-        
-        # ... rest of the code
+async def _ignore_event(*args, **kwargs):
+    pass
 
-        
-        # Extract meta description
-        meta_desc = soup.find('meta', attrs={'name': 'description'})
-        meta_description = meta_desc.get('content', '').strip() if meta_desc else None
-        
-        # Extract headings
-        h1_tags = [h1.get_text().strip() for h1 in soup.find_all('h1')]
-        h2_tags = [h2.get_text().strip() for h2 in soup.find_all('h2')]
-        h3_tags = [h3.get_text().strip() for h3 in soup.find_all('h3')]
-        h4_tags = [h4.get_text().strip() for h4 in soup.find_all('h4')]
-        h5_tags = [h5.get_text().strip() for h5 in soup.find_all('h5')]
-        h6_tags = [h6.get_text().strip() for h6 in soup.find_all('h6')]
-        
-        # Extract images and count missing alt attributes
-        images = soup.find_all('img')
-        total_images = len(images)
-        images_without_alt = len([img for img in images if not img.get('alt') or not img.get('alt').strip()])
-        
-        # Extract all text content for word count
-        text_content = soup.get_text()
-        words = re.findall(r'\w+', text_content)
-        word_count = len(words)
-        
-        readability_data = calculate_readability(text_content)
-        keyword_analysis = analyze_keyword_density(text_content, title=title_text, meta_desc=meta_description)
-        page_speed_data = await analyze_page_speed(str(url), response, soup)
+
+# Stages whose results are report sections (emitted to streaming clients as each finishes)
+SCRAPE_SECTIONS = (
+    'technical_seo', 'onpage', 'schema_analysis', 'linking_analysis', 'backlink_analysis',
+    'readability_analysis', 'keyword_density_analysis', 'page_speed_analysis', 'http_response_analysis',
+    'responsive_preview',
+)
+STAGE_PROGRESS = {'fetch': 'fetched', 'parse': 'parsed', 'responsive_preview': 'screenshots'}
+# Stages that depend only on the page HTML, so an unchanged page (same HTML hash) reuses them.
+# Probes, link checks, timings, response headers and screenshots can change while the
+# HTML doesn't, so they run every time (prose is reused per section by its own cache).
+HTML_STAGES = (
+    'onpage', 'schema_analysis', 'links', 'backlink_analysis', 'content',
+    'readability_analysis', 'keyword_density_analysis',
+)
+# Computed by seo_rules before the model is called
+RULE_SECTIONS = ('seo_score', 'analysis_summary', 'seo_issues')
+# Prose written by the model
+AI_SECTIONS = ('keyword_strategy', 'competitor_analysis', 'content_recommendations', 'action_plan_30_days')
+# Shape each model section must have; a reply that doesn't validate fails only its own section
+AI_SECTION_TYPES = {
+    'examples': TypeAdapter(Dict[str, Any]),
+    'keyword_strategy': TypeAdapter(KeywordStrategy),
+    'competitor_analysis': TypeAdapter(Dict[str, Any]),
+    'content_recommendations': TypeAdapter(List[ContentRecommendation]),
+    'action_plan_30_days': TypeAdapter(List[Dict[str, str]]),
+}
+
+
+def extract_page_content(doc: DocumentIndex) -> Dict[str, Any]:
+    """Title, meta tags, headings, images and text of a parsed page"""
+    # Extract title
+    title_text = doc.title
+    
+    # Extract meta description
+    meta_description = doc.meta_content(name='description')
+    meta_description = meta_description.strip() if meta_description is not None else None
+    
+    # Extract images and count missing alt attributes
+    images = doc.images
+    
+    # Extract all text content for word count
+    text_content = doc.text
+    
+    # Extract structured data (JSON-LD)
+    structured_data = []
+    for script in doc.json_ld_scripts:
+        try:
+            structured_data.append(json.loads(script.text))
+        except:
+            pass
     
+    return {
+        'title': title_text,
+        'meta_description': meta_description,
+        **{f'h{level}_tags': [h.text.strip() for h in doc.find_all(f'h{level}')] for level in range(1, 7)},
+        'total_images': len(images),
+        'images_without_alt': len([img for img in images if not img.get('alt') or not img.get('alt').strip()]),
+        'text_content': text_content,
+        'word_count': len(re.findall(r'\w+', text_content)),
         # Extract meta keywords if present
-        meta_keywords = soup.find('meta', attrs={'name': 'keywords'})
-        keywords = meta_keywords.get('content', '') if meta_keywords else ''
-        
+        'meta_keywords': doc.meta_content(name='keywords') or '',
         # Check for Open Graph tags
-        og_title = soup.find('meta', property='og:title')
-        og_description = soup.find('meta', property='og:description')
-        
+        'og_title': doc.meta_content(prop='og:title'),
+        'og_description': doc.meta_content(prop='og:description'),
         # Check for canonical URL
-        canonical = soup.find('link', rel='canonical')
-        canonical_url = canonical.get('href') if canonical else None
-        
-        # Extract structured data (JSON-LD)
-        structured_data = []
-        for script in soup.find_all('script', type='application/ld+json'):
-            try:
-                structured_data.append(json.loads(script.string))
-            except:
-                pass
-        responsive_screenshots = await capture_responsive_screenshots(str(url))
-        return {
-            'title': title_text,
-            'meta_description': meta_description,
-            'h1_tags': h1_tags,
-            'h2_tags': h2_tags,
-            'h3_tags': h3_tags,
-            'h4_tags': h4_tags,
-            'h5_tags': h5_tags,
-            'h6_tags': h6_tags,
-            
-            'word_count': word_count,
-            'total_images': total_images,
-            'images_without_alt': images_without_alt,
-            'meta_keywords': keywords,
-            'og_title': og_title.get('content') if og_title else None,
-            'og_description': og_description.get('content') if og_description else None,
-            'canonical_url': canonical_url,
-            'has_structured_data': len(structured_data) > 0,
-            'full_html': response.text[:10000],  # First 10k chars for AI analysis
-            'status_code': response.status_code,
-            'technical_seo': technical_seo,  # Complete technical SEO object
-            'canonical_issues': technical_seo['canonical_issues'],
-            'robots_txt_found': technical_seo['robots_txt_found'],
-            'sitemap_found': technical_seo['sitemap_found'],
-            'schema_analysis': schema_analysis,
-            'has_schema': schema_analysis['has_schema'],
-            'schema_types': schema_analysis['schema_types'],
-            'linking_analysis': linking_analysis,
-            'total_links': linking_analysis['total_links'],
-            'internal_links_count': linking_analysis['internal_count'],
-             'backlink_analysis': backlink_analysis, 
-             'external_links_count': backlink_analysis['total_external_links'],
-             'link_quality_score': backlink_analysis['link_quality_score'],
-             'readability_analysis': readability_data,
-             'keyword_density_analysis': keyword_analysis,
-             'page_speed_analysis': page_speed_data,
-             'responsive_preview': responsive_screenshots,
-        }
-        
+        'canonical_url': doc.canonical_links[0].get('href') if doc.canonical_links else None,
+        'has_structured_data': len(structured_data) > 0,
+    }
+
+
+async def fetch_for_analysis(url: str):
+    """Timed fetch - analyze_page_speed reuses these timings instead of re-downloading"""
+    response, fetch_timings = await fetch_page(url)
+    response.raise_for_status()
+    return response, fetch_timings
+
+
+async def parse_fetched_page(url: str, response: httpx.Response) -> DocumentIndex:
+    """Parse a fetched page, reusing the stored document when the fetch was answered with a 304"""
+    if response.extensions.get('not_modified'):
+        doc = stored_document(url)
+        if doc is not None:
+            return doc
+    doc = await run_cpu('parse', parse_document, response.text)
+    remember_document(url, doc, len(response.content))
+    return doc
+
+
+def build_scrape_stages(url: str, fetched, min_interval: Optional[float] = None,
+                        lane: str = 'interactive', reused: Optional[Dict[str, Any]] = None) -> List[Stage]:
+    """The audit pipeline as a dependency graph over an earlier fetch_for_analysis result;
+    independent stages run concurrently. Only the stages that request the site itself
+    hold one of its host slots; stages named in `reused` return that earlier result instead of running."""
+    
+    async def fetch():
+        # run_analysis fetches before the graph so it can look up reusable stages by HTML hash
+        return fetched
+    
+    async def parse(fetch):
+        # Single parse shared by every analyzer below
+        return await parse_fetched_page(url, fetch[0])
+    
+    async def technical_seo(fetch, parse):
+        # ✅ FIX: Convert response.url to string
+        async with host_slot(fetch[0].url, min_interval, lane):  # robots.txt / sitemap / llm.txt probes
+            return await check_technical_seo(parse, str(fetch[0].url))
+    
+    async def onpage(parse):
+        return check_onpage_seo(parse)
+    
+    async def schema_analysis(parse):
+        return validate_schema_markup(parse, url)
+    
+    async def links(parse):
+        return classify_links(parse, url)
+    
+    async def link_check(links):
+        # Internal links first so they are checked even if the page has more links than the cap
+        return await check_links([link['url'] for link in links['internal'] + links['external']],
+                                 min_interval=min_interval)
+    
+    async def linking_analysis(parse, links, link_check):
+        return analyze_internal_links(parse, url, links, link_check)
+    
+    async def backlink_analysis(parse):
+        return await analyze_backlinks(url, parse)
+    
+    async def content(parse):
+        return extract_page_content(parse)
+    
+    async def readability_analysis(content):
+        return await run_cpu('readability', calculate_readability, content['text_content'])
+    
+    async def keyword_density_analysis(content):
+        return await run_cpu('keyword_density', analyze_keyword_density, content['text_content'],
+                             title=content['title'], meta_desc=content['meta_description'])
+    
+    async def page_speed_analysis(fetch, parse):
+        response, fetch_timings = fetch
+        return await analyze_page_speed(url, response, parse, fetch_timings)
+    
+    async def http_response_analysis(fetch):
+        response, fetch_timings = fetch
+        return analyze_http_response(response, fetch_timings)
+    
+    async def responsive_preview():
+        # Only needs the URL, so the browser loads the page while the analyzers run
+        return await capture_responsive_screenshots(url, mode=BATCH_SCREENSHOT_MODE if lane == 'batch' else None)
+    
+    stages = [
+        Stage('fetch', fetch, required=True),
+        Stage('parse', parse, ('fetch',), required=True),
+        Stage('technical_seo', technical_seo, ('fetch', 'parse'), timeout=20),
+        Stage('onpage', onpage, ('parse',)),
+        Stage('schema_analysis', schema_analysis, ('parse',)),
+        Stage('links', links, ('parse',), required=True),
+        Stage('link_check', link_check, ('links',), timeout=LINK_CHECK_BUDGET_SECONDS + 5),
+        Stage('linking_analysis', linking_analysis, ('parse', 'links', 'link_check')),
+        Stage('backlink_analysis', backlink_analysis, ('parse',)),
+        Stage('content', content, ('parse',), required=True),
+        Stage('readability_analysis', readability_analysis, ('content',)),
+        Stage('keyword_density_analysis', keyword_density_analysis, ('content',),
+              fallback=lambda error: {"error": error, "total_words": 0, "top_keywords": [], "top_phrases": []}),
+        Stage('page_speed_analysis', page_speed_analysis, ('fetch', 'parse')),
+        Stage('http_response_analysis', http_response_analysis, ('fetch',)),
+        Stage('responsive_preview', responsive_preview, timeout=60, fallback=lambda error: {'skipped': error}),
+    ]
+    
+    def reuse(result):
+        async def run():
+            return result
+        return run
+    
+    reused = reused or {}
+    return [Stage(stage.name, reuse(reused[stage.name])) if stage.name in reused else stage for stage in stages]
+
+
+async def scrape_website(url: str, fetched, progress=_ignore_event, emit=_ignore_event,
+                         min_interval: Optional[float] = None, lane: str = 'interactive',
+                         reused: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Scrape website and extract SEO-relevant data (`fetched` is the fetch_for_analysis result;
+    `min_interval` spaces requests to the site and the link checker's requests to each host;
+    `lane` picks the host limiter; `reused` holds earlier HTML_STAGES results for this HTML)"""
+    url = str(url)
+    analyzers_left = set(SCRAPE_SECTIONS) - {'responsive_preview'}
+    
+    async def on_done(stage: str, result: Any):
+        if stage in SCRAPE_SECTIONS:
+            await emit(stage, result)
+        if stage in STAGE_PROGRESS:
+            await progress(STAGE_PROGRESS[stage])
+        if stage in analyzers_left:
+            analyzers_left.discard(stage)
+            if not analyzers_left:
+                await progress('analyzed')
+    
+    try:
+        results, stage_timings = await run_stage_graph(build_scrape_stages(url, fetched, min_interval, lane, reused), on_done)
     except Exception as e:
         logger.error(f"Error scraping website {url}: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Failed to scrape website: {str(e)}")
+    
+    logger.info(f"Scrape stages for {url}: " + ", ".join(f"{name}={timing['seconds']}s" for name, timing in stage_timings.items()))
+    
+    response, _ = results['fetch']
+    content = results['content']
+    technical_seo = results['technical_seo']
+    schema_analysis = results['schema_analysis']
+    linking_analysis = results['linking_analysis']
+    backlink_analysis = results['backlink_analysis']
+    
+    return {
+        **{key: value for key, value in content.items() if key != 'text_content'},
+        'full_html': response.text[:10000],  # First 10k chars for AI analysis
+        'status_code': response.status_code,
+        'technical_seo': technical_seo,  # Complete technical SEO object
+        'canonical_issues': technical_seo.get('canonical_issues', []),
+        'robots_txt_found': technical_seo.get('robots_txt_found', False),
+        'sitemap_found': technical_seo.get('sitemap_found', False),
+        'schema_analysis': schema_analysis,
+        'has_schema': schema_analysis.get('has_schema', False),
+        'schema_types': schema_analysis.get('schema_types', []),
+        'linking_analysis': linking_analysis,
+        'total_links': linking_analysis.get('total_links', 0),
+        'internal_links_count': linking_analysis.get('internal_count', 0),
+        'backlink_analysis': backlink_analysis,
+        'external_links_count': backlink_analysis.get('total_external_links', 0),
+        'link_quality_score': backlink_analysis.get('link_quality_score', 0),
+        'readability_analysis': results['readability_analysis'],
+        'keyword_density_analysis': results['keyword_density_analysis'],
+        'page_speed_analysis': results['page_speed_analysis'],
+        'http_response_analysis': results['http_response_analysis'],
+        'onpage': results['onpage'],  # Measurements for the SEO rules, not a report section
+        'responsive_preview': results['responsive_preview'],
+        'all_links': results['links'],  # Untruncated, for the site link graph
+        'stage_timings': stage_timings,
+        # For the content-hash cache; a stage that fell back after an error is retried next time
+        'html_stages': {name: results[name] for name in HTML_STAGES if not stage_timings[name]['error']},
+    }
 
 
 # AI SEO Analysis Function
-async def analyze_with_ai(url: str, scraped_data: Dict[str, Any]) -> SEOReport:
-    """Use OpenAI to analyze scraped data and generate comprehensive SEO report"""
-    
-    api_key = os.environ.get('OPENAI_API_KEY')
-    if not api_key:
-        raise HTTPException(status_code=500, detail="OPENAI_API_KEY not configured")
-    
-    # Calculate exact character counts
-    title_length = len(scraped_data.get('title', '')) if scraped_data.get('title') else 0
-    meta_length = len(scraped_data.get('meta_description', '')) if scraped_data.get('meta_description') else 0
+async def analyze_with_ai(url: str, scraped_data: Dict[str, Any], emit=None, priority: str = 'interactive') -> SEOReport:
+    """Build the SEO report: rule-based issues and score, with examples and prose from OpenAI
+
+    Issues, priorities, score and summary come from seo_rules and are emitted before
+    the model is called. Each prose section is then a separate, concurrent request; with
+    `emit`, each is streamed and the section (and each item of list sections) is passed
+    to `emit(name, data, index)` as soon as it is complete. `priority` picks the LLM
+    gateway lane ('interactive' or 'batch'). Sections that fail are left empty and named
+    in `ai_error`; the rule-based sections and the other prose are kept.
+    """
     
     # Extract nested data safely
     technical_seo = scraped_data.get('technical_seo', {})
     schema_analysis = scraped_data.get('schema_analysis', {})
     linking_analysis = scraped_data.get('linking_analysis', {})
     backlink_analysis = scraped_data.get('backlink_analysis', {})
-    h1_count = len(scraped_data.get('h1_tags', []))
-    h2_count = len(scraped_data.get('h2_tags', []))
-    h3_count = len(scraped_data.get('h3_tags', []))
-    h4_count = len(scraped_data.get('h4_tags', []))
-    h5_count = len(scraped_data.get('h5_tags', []))
-    h6_count = len(scraped_data.get('h6_tags', []))
-    
-    images_without_alt = scraped_data.get('images_without_alt', 0)
-    total_images = scraped_data.get('total_images', 0)
-    word_count = scraped_data.get('word_count', 0)
-
-
-    
-    # Create enhanced analysis prompt with ALL metrics
-      # Create enhanced analysis prompt with VERIFIED DATA
-    analysis_prompt = f"""You are a senior SEO consultant analyzing a website. Provide a comprehensive, data-driven SEO audit with SPECIFIC METRICS and ACTIONABLE recommendations.
-
-Website URL: {url}
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-⚠️ CRITICAL: USE ONLY THE VERIFIED DATA BELOW - DO NOT RECALCULATE!
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-📊 VERIFIED TITLE TAG DATA:
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Current Title: "{scraped_data.get('title', 'NOT SET')}"
-Current Length: {title_length} characters (EXACT - DO NOT RECALCULATE)
-VERIFIED STATUS: {"✅ OPTIMAL - Do NOT add to seo_issues" if 50 <= title_length <= 60 else ("⚠️ MEDIUM PRIORITY - MUST add to seo_issues as 'Title Tag'" if 45 <= title_length < 50 or 61 <= title_length <= 70 else "🔴 HIGH PRIORITY - MUST add to seo_issues as 'Title Tag'")}
-
-📝 VERIFIED META DESCRIPTION DATA:
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Current Meta: "{scraped_data.get('meta_description', 'NOT SET')}"
-Current Length: {meta_length} characters (EXACT - DO NOT RECALCULATE)
-VERIFIED STATUS: {"✅ OPTIMAL - Do NOT add to seo_issues" if 150 <= meta_length <= 160 else ("⚠️ MEDIUM PRIORITY - MUST add to seo_issues as 'Meta Description'" if 120 <= meta_length < 150 or 161 <= meta_length <= 180 else "🔴 HIGH PRIORITY - MUST add to seo_issues as 'Meta Description'")}
-
-🏷️ VERIFIED HEADING STRUCTURE DATA:
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-H1 Count: {h1_count} (EXACT - MUST be exactly 1)
-H2 Count: {h2_count} (EXACT - Recommended: 3-6)
-H3 Count: {h3_count}
-H4 Count: {h4_count}
-H5 Count: {h5_count}
-H6 Count: {h6_count}
-H1 Content: {', '.join(scraped_data.get('h1_tags', [])) or 'MISSING ❌'}
-H2 Samples: {', '.join(scraped_data.get('h2_tags', [])[:3]) or 'MISSING ❌'}
-VERIFIED STATUS: {"✅ OPTIMAL - Do NOT add to seo_issues" if h1_count == 1 and 3 <= h2_count <= 6 else ("⚠️ MEDIUM PRIORITY - MUST add to seo_issues as 'Headings'" if h1_count == 1 and (h2_count < 3 or h2_count > 6) else "🔴 HIGH PRIORITY - MUST add to seo_issues as 'Headings'")}
-
-🖼️ VERIFIED IMAGE ALT TEXT DATA:
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Total Images: {total_images} (EXACT)
-Missing Alt Text: {images_without_alt} images (EXACT - DO NOT RECALCULATE)
-VERIFIED STATUS: {"✅ PERFECT - Do NOT add to seo_issues (all images have alt)" if images_without_alt == 0 else ("⚠️ MEDIUM PRIORITY - MUST add to seo_issues as 'Images'" if 1 <= images_without_alt <= 3 else "🔴 HIGH PRIORITY - MUST add to seo_issues as 'Images'")}
-
-📄 VERIFIED CONTENT LENGTH DATA:
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Current Word Count: {word_count} words (EXACT - DO NOT RECALCULATE)
-VERIFIED STATUS: {"✅ OPTIMAL - Do NOT add to seo_issues" if 1000 <= word_count <= 2500 else ("⚠️ MEDIUM PRIORITY - MUST add to seo_issues as 'Content'" if 500 <= word_count < 1000 or 2501 <= word_count <= 3000 else "🔴 HIGH PRIORITY - MUST add to seo_issues as 'Content'")}
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-🚨 MANDATORY INSTRUCTION:
-You MUST use the EXACT numbers above in your analysis.
-If VERIFIED STATUS says:
-- "✅ OPTIMAL" or "✅ PERFECT" → Do NOT create issue
-- "⚠️ MEDIUM" or "🔴 HIGH" → MUST add to seo_issues with EXACT numbers
-
-NEVER recalculate or use different character counts, word counts, or image counts!
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-🔧 TECHNICAL SEO (ENHANCED!)
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-🔗 Canonical Tag Analysis:
-- Status: {technical_seo.get('canonical_status', 'Not Checked')}
-- URL: {technical_seo.get('canonical_url', 'Not set')}
-- Issues Found: {len(technical_seo.get('canonical_issues', []))} issues
-- Details: {'; '.join(technical_seo.get('canonical_issues', [])) or 'No issues'}
-
-🤖 Crawlability:
-- Robots.txt: {'✓ Found' if technical_seo.get('robots_txt_found') else '✗ Missing'}
-- Sitemap.xml: {'✓ Found' if technical_seo.get('sitemap_found') else '✗ Missing'}
-- Meta Robots: {technical_seo.get('robots_directive', 'Not set')}
-- Noindex Status: {'⚠️ YES (Page is noindexed!)' if technical_seo.get('noindex') else '✓ No'}
-- LLM.txt: {'✓ Found' if technical_seo.get('llm_txt_found') else '✗ Missing'} 
-
-🔒 Security:
-- SSL/HTTPS: {'✓ Enabled' if technical_seo.get('ssl_enabled') else '❌ DISABLED (Critical!)'}
-
-📋 STRUCTURED DATA:
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-- Schema Markup Present: {'✓ YES' if schema_analysis.get('has_schema') else '✗ NO'}
-- Schema Types Found: {', '.join(schema_analysis.get('schema_types', [])) or 'None'}
-- Total Schema Items: {schema_analysis.get('schema_count', 0)}
-- Validation Issues: {len(schema_analysis.get('validation_issues', []))} errors
-- Error Details: {'; '.join(schema_analysis.get('validation_issues', [])) or 'No errors'}
-- Recommendations: {'; '.join(schema_analysis.get('recommendations', [])) or 'None'}
-
-🔗 INTERNAL LINKING:
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-- Total Links: {linking_analysis.get('total_links', 0)}
-- Internal Links: {linking_analysis.get('internal_count', 0)}
-- External Links: {linking_analysis.get('external_count', 0)}
-- Internal Link Ratio: {linking_analysis.get('internal_ratio', 0)}% (Target: 70-80%)
-- Nofollow Internal Links: {linking_analysis.get('nofollow_internal_count', 0)} (Should be 0)
-- Empty Anchor Text: {linking_analysis.get('empty_anchor_count', 0)} links (Should be 0)
-- Issues: {'; '.join(linking_analysis.get('recommendations', [])) or 'No issues'}
-
-📱 SOCIAL & RICH SNIPPETS:
-- Open Graph Tags: {'✓ Present' if scraped_data.get('og_title') else '✗ Missing'}
-- OG Title: {scraped_data.get('og_title', 'Not set')}
-- OG Description: {scraped_data.get('og_description', 'Not set')}
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-📖 VERIFIED READABILITY DATA:
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Flesch Reading Ease: {scraped_data.get('readability_analysis', {}).get('flesch_reading_ease', 'N/A')} (EXACT)
-Grade Level: {scraped_data.get('readability_analysis', {}).get('readability_grade', 'N/A')}
-Reading Time: {scraped_data.get('readability_analysis', {}).get('reading_time_minutes', 'N/A')} minutes
-Difficulty: {scraped_data.get('readability_analysis', {}).get('difficulty_level', 'N/A')}
-TARGET: 60-70 (Standard readability for general audience)
-STATUS: {"✅ OPTIMAL" if 60 <= scraped_data.get('readability_analysis', {}).get('flesch_reading_ease', 0) <= 70 else "⚠️ NEEDS IMPROVEMENT"}
-
-📊 VERIFIED KEYWORD ANALYSIS:
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Total Words: {scraped_data.get('keyword_density_analysis', {}).get('total_words', 0)}
-Unique Words: {scraped_data.get('keyword_density_analysis', {}).get('unique_words', 0)}
-Lexical Diversity: {scraped_data.get('keyword_density_analysis', {}).get('lexical_diversity', 0)} ({scraped_data.get('keyword_density_analysis', {}).get('lexical_diversity_grade', 'N/A')})
-Keyword Stuffing Risk: {"⚠️ YES" if scraped_data.get('keyword_density_analysis', {}).get('keyword_stuffing_risk') else "✅ NO"}
-
-Top Keywords (with density %):
-{chr(10).join([f"  - {kw.get('keyword', '')}: {kw.get('density_percent', 0)}% ({kw.get('count', 0)} times) - {'✅ In Title' if kw.get('in_title') else '❌ Not in Title'}" for kw in scraped_data.get('keyword_density_analysis', {}).get('top_keywords', [])[:5]])}
-
-Top 2-Word Phrases:
-{chr(10).join([f"  - '{phrase.get('phrase', '')}': {phrase.get('count', 0)} times" for phrase in scraped_data.get('keyword_density_analysis', {}).get('top_phrases', [])[:5]])}
-
-⚡ VERIFIED PAGE SPEED & PERFORMANCE:
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-🕐 TIMING METRICS:
-- Total Load Time: {scraped_data.get('page_speed_analysis', {}).get('total_load_time_seconds', 0)}s (EXACT)
-- Time to First Byte: {scraped_data.get('page_speed_analysis', {}).get('time_to_first_byte_seconds', 0)}s
-- Load Time Grade: {scraped_data.get('page_speed_analysis', {}).get('load_time_grade', 'N/A')}
-- TARGET: <2s (Fast), <3s (Acceptable)
-- STATUS: {scraped_data.get('page_speed_analysis', {}).get('comparison', {}).get('vs_2_seconds', 'N/A')}
-
-📦 SIZE METRICS:
-- Page Size: {scraped_data.get('page_speed_analysis', {}).get('page_size_mb', 0)}MB (EXACT)
-- HTML Size: {scraped_data.get('page_speed_analysis', {}).get('html_size_kb', 0)}KB
-- Size Grade: {scraped_data.get('page_speed_analysis', {}).get('size_grade', 'N/A')}
-- TARGET: <1MB (Ideal), <3MB (Acceptable)
-
-🔧 RESOURCES:
-- Total Resources: {scraped_data.get('page_speed_analysis', {}).get('total_resources', 0)} (Target: <50)
-- JavaScript Files: {scraped_data.get('page_speed_analysis', {}).get('external_scripts_count', 0)}
-- CSS Files: {scraped_data.get('page_speed_analysis', {}).get('external_css_count', 0)}
-- Images: {scraped_data.get('page_speed_analysis', {}).get('images_count', 0)}
-- Render-Blocking Scripts: {scraped_data.get('page_speed_analysis', {}).get('render_blocking_scripts', 0)}
-
-⚙️ OPTIMIZATION STATUS:
-- Text Compression: {'✅ Enabled' if scraped_data.get('page_speed_analysis', {}).get('compression_enabled') else '❌ Disabled'} ({scraped_data.get('page_speed_analysis', {}).get('compression_type', 'None')})
-- Browser Caching: {'✅ Configured' if scraped_data.get('page_speed_analysis', {}).get('caching_enabled') else '❌ Not Set'}
-
-📊 PERFORMANCE SCORE: {scraped_data.get('page_speed_analysis', {}).get('performance_score', 0)}/100 ({scraped_data.get('page_speed_analysis', {}).get('performance_grade', 'N/A')})
-
-⚠️ ISSUES FOUND:
-{chr(10).join([f"  - {issue}" for issue in scraped_data.get('page_speed_analysis', {}).get('issues', [])])}
-
-CRITICAL INSTRUCTIONS:
-You MUST provide DETAILED, SPECIFIC recommendations following this format.
-
-For each recommendation, include:
-1. ❌ Current State: [exact VERIFIED value with numbers from above]
-2. ✅ Target State: [specific target with numbers]
-3. 📋 Example: '[ready-to-use example that can be directly implemented]'
-4. 📈 Impact: [measurable expected improvement like "+15-20% CTR" or "+50 monthly visitors"]
-
-Pay special attention to:
-- Use EXACT VERIFIED numbers (title_length={title_length}, meta_length={meta_length}, images_without_alt={images_without_alt}, word_count={word_count})
-- Canonical tag issues (if any are present)
-- Missing or invalid structured data
-- Internal linking problems (low ratio, nofollow on internal links, empty anchors)
-- SSL/HTTPS issues (critical for rankings)
-- Noindex pages (critical - page won't be indexed!)
-
-Provide analysis in this EXACT JSON format:
-
-{{
-  "seo_score": <number 0-100>,
-  "analysis_summary": "<2-3 sentence executive summary mentioning 2-3 key metrics that need immediate attention>",
-  "seo_issues": [
-    {{
-      "priority": "High|Medium|Low",
-      "category": "Title Tag|Meta Description|Headings|Images|Content|Technical SEO|Structured Data|Internal Linking|Canonical|Security",
-      "issue": "<specific issue with current metric using EXACT VERIFIED numbers>",
-      "recommendation": "CURRENT: [exact VERIFIED state with numbers]\\\\\\\\\\\\\\\\nTARGET: [specific target with numbers]\\\\\\\\\\\\\\\\nEXAMPLE: '[ready-to-use optimized text]'\\\\\\\\\\\\\\\\nIMPACT: [measurable improvement estimate]"
-    }}
-  ],
-  "keyword_strategy": {{
-    "primary_keyword": "<best primary keyword based on page content>",
-    "long_tail_keywords": ["<specific keyword 1>", "<specific keyword 2>", "<specific keyword 3>"],
-    "keyword_intent": {{
-      "<keyword>": "informational|commercial|transactional|navigational"
-    }}
-  }},
-  "competitor_analysis": {{
-    "assumed_competitors": ["<competitor1.com>", "<competitor2.com>", "<competitor3.com>"],
-    "content_gaps": ["<specific gap: e.g., 'Missing comparison tables with specs'>", "<gap 2>"],
-    "opportunities": ["<specific opportunity with numbers: e.g., 'Target long-tail keywords with 500+ monthly searches'>", "<opportunity 2>"]
-  }},
-  "content_recommendations": [
-    {{
-      "page_type": "Blog Post|Landing Page|Product Page|Service Page|Homepage",
-      "topic": "<specific topic with target word count: e.g., 'Complete Guide to X (1500 words)'>",
-      "target_keywords": ["<primary keyword>", "<secondary keyword>", "<LSI keyword>"],
-      "structure": {{
-        "h1": ["<exact ready-to-use H1 example>"],
-        "h2": ["<exact H2 example 1>", "<exact H2 example 2>", "<exact H2 example 3>"],
-        "h3": ["<exact H3 example 1>", "<exact H3 example 2>"]
-      }}
-    }}
-  ],
-  "action_plan_30_days": [
-    {{
-      "week": "Week 1",
-      "priority": "High",
-      "action": "<specific action with exact steps: e.g., 'Fix canonical tag: Change from HTTP to HTTPS version'>",
-      "expected_impact": "<measurable impact: e.g., '+15-20% CTR improvement, estimated +100 clicks/month'>"
-    }},
-    {{
-      "week": "Week 2",
-      "priority": "High|Medium",
-      "action": "<specific action: e.g., 'Add Schema.org Article markup with author, datePublished, and headline'>",
-      "expected_impact": "<measurable impact: e.g., 'Rich snippets in search results, +10-15% CTR'>"
-    }},
-    {{
-      "week": "Week 3",
-      "priority": "Medium",
-      "action": "<specific action: e.g., 'Increase internal linking from 45% to 75% by adding 8-10 contextual links'>",
-      "expected_impact": "<measurable impact: e.g., 'Better crawlability, improved PageRank distribution'>"
-    }},
-    {{
-      "week": "Week 4",
-      "priority": "Medium|Low",
-      "action": "<specific action>",
-      "expected_impact": "<measurable impact>"
-    }}
-  ]
-}}
-
-REMEMBER - EVERY recommendation must include:
-✓ Exact VERIFIED numbers from data above (never recalculate!)
-✓ Specific target numbers  
-✓ Ready-to-use examples
-✓ Measurable impact estimates
-
-⚠️ FINAL WARNING: Use ONLY the VERIFIED DATA. Title={title_length} chars, Meta={meta_length} chars, Images missing={images_without_alt}, Words={word_count}. Any different numbers = hallucination!
-
-Be professional, specific, and client-ready. Focus on high-impact optimizations, especially the new technical SEO findings (canonical, schema, internal links)."""
-
-
-    try:
-        openai_client = AsyncOpenAI(api_key=api_key)
-        
-        response = await openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system", 
-                    "content": "You are an expert SEO consultant providing professional, data-driven SEO audits with specific metrics, exact numbers, and actionable examples. Always respond with valid JSON only. EVERY recommendation MUST include: current state with numbers, target state with numbers, ready-to-use examples, and measurable impact estimates. Never give generic advice. Pay special attention to technical SEO issues like canonical tags, structured data, and internal linking."
-                },
-                {"role": "user", "content": analysis_prompt}
-            ],
-            temperature=0.7,
-            response_format={"type": "json_object"}
-        )
-        
-        response_text = response.choices[0].message.content
-        ai_analysis = json.loads(response_text)
-        
-        
-        seo_issues_list = []
-        for issue in ai_analysis.get('seo_issues', []):
-            if 'priority' not in issue or not issue['priority']:
-                issue['priority'] = 'Medium'
-            if 'category' not in issue or not issue['category']:
-                issue['category'] = 'Technical SEO'
-            if 'issue' not in issue or not issue['issue']:
-                issue['issue'] = 'SEO optimization needed'
-            if 'recommendation' not in issue or not issue['recommendation']:
-                issue['recommendation'] = 'Review and optimize this element'
-            
+    
+    rule_issues = evaluate_rules(url, scraped_data)
+    seo_score = compute_score(rule_issues)
+    analysis_summary = summarize(seo_score, rule_issues)
+    
+    def issue_models(examples: Dict[str, Any]) -> List[SEOIssue]:
+        return [
+            SEOIssue(
+                id=issue['id'],
+                priority=issue['priority'],
+                category=issue['category'],
+                issue=issue['issue'],
+                recommendation=format_recommendation(issue, str(examples[issue['id']]) if examples.get(issue['id']) else None),
+            )
+            for issue in rule_issues
+        ]
+    
+    if emit is not None:
+        await emit('seo_score', seo_score)
+        await emit('analysis_summary', analysis_summary)
+        await emit('seo_issues', [issue.model_dump() for issue in issue_models({})])
+    
+    # One request per prose section, all in flight at once: the slowest section sets the
+    # wall-clock time and a failed section leaves the others (and the rule sections) intact
+    payload = build_payload(url, scraped_data, rule_issues)
+    results = await asyncio.gather(
+        *(run_ai_section(url, section, payload, emit, priority) for section in PROMPT_SECTIONS),
+        return_exceptions=True,
+    )
+    
+    prose: Dict[str, Any] = {}
+    examples: Dict[str, Any] = {}
+    errors = []
+    for section, result in zip(PROMPT_SECTIONS, results):
+        if isinstance(result, BaseException):
+            errors.append(f"{section}: {str(result) or type(result).__name__}")
+        elif section == 'examples':
+            examples = result
+        else:
+            prose[section] = result
+    ai_error = '; '.join(errors) or None
+    if ai_error:
+        logger.error(f"Error in AI analysis for {url}: {ai_error}")
+    
+    seo_issues_list = issue_models(examples)
+    if emit is not None and examples:
+        await emit('seo_issues', [issue.model_dump() for issue in seo_issues_list])
+    
+    # Build SEO report
+    return SEOReport(
+        url=url,
+        title=scraped_data.get('title'),
+        meta_description=scraped_data.get('meta_description'),
+        h1_tags=scraped_data.get('h1_tags', []),
+        h2_tags=scraped_data.get('h2_tags', []),
+        h3_tags=scraped_data.get('h3_tags', []),
+        h4_tags=scraped_data.get('h4_tags', []),
+        h5_tags=scraped_data.get('h5_tags', []),
+        h6_tags=scraped_data.get('h6_tags', []),
+        word_count=scraped_data.get('word_count', 0),
+        total_images=scraped_data.get('total_images', 0),
+        images_without_alt=scraped_data.get('images_without_alt', 0),
+        canonical_url=technical_seo.get('canonical_url'),
+        canonical_issues=technical_seo.get('canonical_issues', []),
+        robots_txt_found=technical_seo.get('robots_txt_found', False),
+        sitemap_found=technical_seo.get('sitemap_found', False),
+        ssl_enabled=technical_seo.get('ssl_enabled', False),
+        
+        technical_seo=technical_seo,
+        schema_analysis=schema_analysis,
+        linking_analysis=linking_analysis,
+        backlink_analysis=backlink_analysis,
+        readability_analysis=scraped_data.get('readability_analysis', {}),
+        keyword_density_analysis=scraped_data.get('keyword_density_analysis', {}),
+        page_speed_analysis=scraped_data.get('page_speed_analysis', {}),
+        http_response_analysis=scraped_data.get('http_response_analysis', {}),
+        responsive_preview=scraped_data.get('responsive_preview', {}),  
+        seo_score=seo_score,
+        analysis_summary=analysis_summary,
+        seo_issues=seo_issues_list,
+        ai_error=ai_error,
+        **prose,
+    )
+
+
+async def run_ai_section(url: str, section: str, payload: Dict[str, Any], emit=None, priority: str = 'interactive') -> Any:
+    """One prose section, validated: reused from the section cache when its prompt is unchanged,
+    adapted from a near-duplicate page's reply when one is similar enough, else asked for"""
+    messages, prompt_tokens = build_section_messages(section, payload)
+    completion_args = dict(
+        model=AI_MODEL,
+        messages=messages,
+        temperature=0.7,
+        response_format={"type": "json_object"}
+    )
+    section_type = AI_SECTION_TYPES[section]
+    cache_key = section_cache_key(section, completion_args)
+    
+    cached = await ai_section_cache.get(cache_key)
+    if cached is not None:
+        logger.info(f"AI section {section} for {url}: prompt unchanged, reusing cached reply")
+        if emit is not None and section in AI_SECTIONS:
+            await emit(section, cached['value'])
+        return section_type.validate_python(cached['value'])
+    
+    # Templated pages: a reply to a near-identical slice is reused with the differing names and numbers swapped
+    data_slice = slice_payload(payload, PROMPT_SECTIONS[section][0])
+    namespace = section_namespace(section, completion_args, data_slice)
+    if SEMANTIC_CACHE_ENABLED:
+        similar = await semantic_ai_cache.lookup(namespace, data_slice)
+        if similar is not None:
+            adapted, match = similar
             try:
-                seo_issues_list.append(SEOIssue(**issue))
-            except Exception as e:
-                logger.warning(f"Skipping invalid issue: {str(e)}")
+                value = section_type.validate_python(adapted)
+            except ValidationError as e:
+                logger.warning(f"AI section {section} for {url}: adapted reply rejected: {str(e)}")
+            else:
+                logger.info(f"AI section {section} for {url}: adapted a near-duplicate reply {match}")
+                if emit is not None and section in AI_SECTIONS:
+                    await emit(section, section_type.dump_python(value, mode="json"))
+                await ai_section_cache.set(cache_key, {"value": section_type.dump_python(value, mode="json")})
+                return value
+    
+    if not os.environ.get('OPENAI_API_KEY'):
+        raise RuntimeError("OPENAI_API_KEY not configured")
+    
+    # Announced before the call, so concurrent near-duplicates (a batch over one template) wait for this reply
+    entry_id = semantic_ai_cache.begin(namespace, data_slice) if SEMANTIC_CACHE_ENABLED else None
+    stored = None
+    try:
+        started = time.perf_counter()
+        if emit is None or section not in AI_SECTIONS:
+            response = await get_llm_gateway().complete(completion_args, priority)
+            response_text = response.choices[0].message.content
+        else:
+            async def emit_section(name: str, data: Any, index: Optional[int] = None):
+                if name == section:
+                    await emit(name, data, index)
+            response_text = await stream_ai_sections(completion_args, emit_section, priority)
+        
+        reply = json.loads(response_text)
+        if section not in reply:
+            raise ValueError(f"reply lacks '{section}'")
+        value = section_type.validate_python(reply[section])
+        stored = section_type.dump_python(value, mode="json")
+        logger.info(f"AI section {section} for {url}: {prompt_tokens['total_tokens']} prompt tokens, "
+                    f"{time.perf_counter() - started:.2f}s")
+    finally:
+        if entry_id is not None:
+            semantic_ai_cache.finish(entry_id, stored)
+    
+    await ai_section_cache.set(cache_key, {"value": stored})
+    return value
+
+
+async def stream_ai_sections(completion_args: Dict[str, Any], emit, priority: str = 'interactive') -> str:
+    """Stream a JSON-mode completion, emitting sections as they close; returns the full text"""
+    sections = JSONSectionStream()
+    parts = []
+    
+    async with aclosing(get_llm_gateway().stream(completion_args, priority)) as stream:
+        async for chunk in stream:
+            if not chunk.choices or not chunk.choices[0].delta.content:
                 continue
-        # Build SEO report
-        report = SEOReport(
-            url=url,
-            title=scraped_data.get('title'),
-            meta_description=scraped_data.get('meta_description'),
-            h1_tags=scraped_data.get('h1_tags', []),
-            h2_tags=scraped_data.get('h2_tags', []),
-            h3_tags=scraped_data.get('h3_tags', []),
-            h4_tags=scraped_data.get('h4_tags', []),
-            h5_tags=scraped_data.get('h5_tags', []),
-            h6_tags=scraped_data.get('h6_tags', []),
-            word_count=scraped_data.get('word_count', 0),
-            total_images=scraped_data.get('total_images', 0),
-            images_without_alt=scraped_data.get('images_without_alt', 0),
-            canonical_url=technical_seo.get('canonical_url'),
-            canonical_issues=technical_seo.get('canonical_issues', []),
-            robots_txt_found=technical_seo.get('robots_txt_found', False),
-            sitemap_found=technical_seo.get('sitemap_found', False),
-            ssl_enabled=technical_seo.get('ssl_enabled', False),
-            
-            technical_seo=technical_seo,
-            schema_analysis=schema_analysis,
-            linking_analysis=linking_analysis,
-            backlink_analysis=backlink_analysis,
-            readability_analysis=scraped_data.get('readability_analysis', {}),
-            keyword_density_analysis=scraped_data.get('keyword_density_analysis', {}),
-            page_speed_analysis=scraped_data.get('page_speed_analysis', {}),
-            responsive_preview=scraped_data.get('responsive_preview', {}),  
-            seo_score=ai_analysis.get('seo_score'),
-            analysis_summary=ai_analysis.get('analysis_summary'),
-            seo_issues=seo_issues_list,
-
-            keyword_strategy=KeywordStrategy(**ai_analysis.get('keyword_strategy', {})) if ai_analysis.get('keyword_strategy') else None,
-            competitor_analysis=ai_analysis.get('competitor_analysis', {}),
-            content_recommendations=[ContentRecommendation(**rec) for rec in ai_analysis.get('content_recommendations', [])],
-            action_plan_30_days=ai_analysis.get('action_plan_30_days', [])
-        )
-        
-        
-        return report
-      
-    except Exception as e:
-        logger.error(f"Error in AI analysis: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"AI analysis failed: {str(e)}")
-
+            delta = chunk.choices[0].delta.content
+            parts.append(delta)
+            for name, index, data in sections.feed(delta):
+                await emit(name, data, index)
+    
+    return ''.join(parts)
 
 
 # API Routes
@@ -1552,31 +1701,430 @@ async def analyze_seo(request: SEOAnalysisRequestWithUser):  # ✅ CHANGE 1: SEO
     
     logger.info(f"Starting SEO analysis for: {url} | User: {user_details.name} ({user_details.email})")  # ✅ CHANGE 3: Updated log
     
+    return await run_analysis(url, user_details, force_refresh=request.force_refresh)
+
+
+@api_router.post("/seo/analyze/stream")
+async def analyze_seo_stream(request: SEOAnalysisRequestWithUser):
+    """Analyze a website, streaming each report section as a server-sent event as soon as it is ready"""
+    url = str(request.url)
+    logger.info(f"Starting streamed SEO analysis for: {url} | User: {request.user_details.name} ({request.user_details.email})")
+    
+    events: asyncio.Queue = asyncio.Queue()
+    
+    async def progress(stage: str):
+        await events.put(("stage", {"stage": stage}))
+    
+    async def emit(name: str, data: Any, index: Optional[int] = None):
+        if index is None:
+            await events.put(("section", {"name": name, "data": data}))
+        else:
+            await events.put(("item", {"section": name, "index": index, "data": data}))
+    
+    async def run():
+        try:
+            report = await run_analysis(url, request.user_details, progress, emit, request.force_refresh)
+            await events.put(("report", report.model_dump(mode="json")))
+        except HTTPException as e:
+            await events.put(("error", {"status_code": e.status_code, "detail": e.detail}))
+        except Exception as e:
+            logger.error(f"Streamed analysis failed for {url}: {str(e)}")
+            await events.put(("error", {"status_code": 500, "detail": str(e)}))
+        finally:
+            await events.put(None)
+    
+    async def stream():
+        task = asyncio.create_task(run())
+        try:
+            while (event := await events.get()) is not None:
+                name, payload = event
+                yield f"event: {name}\ndata: {json.dumps(payload, default=str)}\n\n"
+        finally:
+            # Client went away: stop the analysis instead of finishing it for nobody
+            task.cancel()
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def run_analysis(url: str, user_details: UserDetails, progress=_ignore_event, emit=None,
+                       force_refresh: bool = False, batch_id: Optional[str] = None,
+                       min_interval: Optional[float] = None) -> SEOReport:
+    """Scrape, analyze and store one report, reporting each finished stage to `progress`"""
+    # Requests to the site hold a host slot (batch and interactive runs in separate lanes);
+    # screenshots, link checks and the AI call do not
+    lane = 'batch' if batch_id else 'interactive'
+    # Fetch first: an unchanged page (same HTML hash) reuses the HTML-derived stages
+    try:
+        async with host_slot(url, min_interval, lane):
+            fetched = await fetch_for_analysis(url)
+    except Exception as e:
+        logger.error(f"Error scraping website {url}: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Failed to scrape website: {str(e)}")
+    
+    cache_key = content_cache_key(url, fetched[0].content)
+    cached = None if force_refresh else await result_cache.get(cache_key)
+    reused = (cached or {}).get('stages')
+    if reused:
+        logger.info(f"Page unchanged, reusing {len(reused)} HTML-derived stages for: {url}")
+        await progress('cached')
+    
     # Scrape website
-    scraped_data = await scrape_website(url)
+    scraped_data = await scrape_website(url, fetched, progress, emit or _ignore_event, min_interval, lane, reused)
+    if not reused:
+        await result_cache.set(cache_key, {'stages': scraped_data['html_stages']})
     
-    # AI analysis
-    report = await analyze_with_ai(url, scraped_data)
+    # One-off analyses would add partial graphs that skew orphan and PageRank metrics,
+    # so only batch and crawl runs (which cover a site's pages together) record links
+    if batch_id:
+        await record_link_graph(url, scraped_data['all_links'])
+    
+    # AI analysis (sections whose prompt is unchanged come from the section cache)
+    report = await analyze_with_ai(url, scraped_data, emit, priority=lane)
+    await progress('ai')
     
     # ✅ CHANGE 4: Add user details to report (ADD THESE 3 LINES)
     report.user_name = user_details.name
     report.user_email = user_details.email
     report.user_phone = user_details.phone
+    report.batch_id = batch_id
     
     # Save to database
     doc = report.model_dump()
     doc['analyzed_at'] = doc['analyzed_at'].isoformat()
     
     await db.seo_reports.insert_one(doc)
+    await progress('saved')
     
     logger.info(f"SEO analysis completed for: {url}")
     return report
 
 
+async def record_link_graph(url: str, links: Dict[str, List[Dict[str, Any]]]):
+    """Add the page's followed internal links to its site's link graph (best effort)"""
+    try:
+        await link_graph.record_page(url, [
+            (link['url'], link['anchor_text']) for link in links['internal'] if not link['has_nofollow']
+        ])
+    except Exception as e:
+        logger.warning(f"Link graph update failed for {url}: {str(e)}")
+
+
+# ========== BACKGROUND ANALYSIS JOBS ==========
+async def run_analysis_job(job: Dict[str, Any], progress) -> Dict[str, Any]:
+    report = await run_analysis(job['url'], UserDetails(**job['user_details']), progress,
+                                force_refresh=job.get('force_refresh', False), batch_id=job.get('batch_id'),
+                                min_interval=job.get('min_interval_seconds'))
+    return {"report_id": report.id}
+
+
+analysis_jobs = JobQueue(
+    db.analysis_jobs,
+    run_analysis_job,
+    workers=int(os.environ.get('ANALYSIS_WORKERS', 4)),
+    max_pending=int(os.environ.get('ANALYSIS_QUEUE_MAX', 100)),
+)
+
+
+@api_router.post("/seo/jobs", response_model=AnalysisJobResponse, status_code=202)
+async def submit_analysis_job(request: SEOAnalysisRequestWithUser):
+    """Queue an analysis and return its job id immediately"""
+    try:
+        job = await analysis_jobs.submit({
+            "url": str(request.url),
+            "user_details": request.user_details.model_dump(),
+            "force_refresh": request.force_refresh,
+        })
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=f"Analysis queue is full: {str(e)}")
+    
+    logger.info(f"Queued SEO analysis job {job['id']} for: {job['url']}")
+    return job
+
+
+@api_router.get("/seo/jobs/{job_id}", response_model=AnalysisJobResponse)
+async def get_analysis_job(job_id: str):
+    """Poll the status and stage of an analysis job"""
+    job = await analysis_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@api_router.get("/seo/jobs/{job_id}/events")
+async def stream_analysis_job(job_id: str):
+    """Server-sent events with the job state on every stage change"""
+    job = await analysis_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def events():
+        current = job
+        last_update = None
+        while current:
+            if current['updated_at'] != last_update:
+                last_update = current['updated_at']
+                yield f"data: {json.dumps(current)}\n\n"
+            if current['status'] in TERMINAL_STATUSES:
+                break
+            # Wakes on updates from this process; the timeout re-reads jobs run elsewhere
+            await analysis_jobs.wait_for_change(job_id, 15)
+            current = await analysis_jobs.get(job_id)
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+# ========== BATCH ANALYSIS ==========
+BATCH_MAX_URLS = int(os.environ.get('BATCH_MAX_URLS', 1000))
+
+# Batches get their own queue so a 500-URL batch never starves single jobs
+batch_jobs = JobQueue(
+    db.batch_jobs,
+    run_analysis_job,
+    workers=int(os.environ.get('BATCH_WORKERS', 8)),
+    max_pending=int(os.environ.get('BATCH_QUEUE_MAX', 5000)),
+)
+
+_http_url = TypeAdapter(HttpUrl)
+
+
+# A cell meant as a URL: has a scheme, or is a bare host like example.com/page
+_URL_LIKE_CELL = re.compile(r'^(\S*://\S+|[\w-]+(\.[\w-]+)*\.[a-z]{2,}(/\S*)?)$', re.IGNORECASE)
+
+
+def parse_url_csv(text: str) -> List[str]:
+    """Every URL-like cell of a CSV (header rows and other columns are ignored).
+
+    Cells without an http(s) scheme are kept so `create_batch` reports them as rejected.
+    """
+    return [
+        cell.strip()
+        for row in csv.reader(io.StringIO(text))
+        for cell in row
+        if _URL_LIKE_CELL.match(cell.strip())
+    ]
+
+
+async def insert_batch(user_details: UserDetails, **fields) -> Dict[str, Any]:
+    now = datetime.now(timezone.utc).isoformat()
+    batch = {
+        "id": str(uuid.uuid4()),
+        "total": 0,
+        **fields,
+        "user_details": user_details.model_dump(),
+        "created_at": now,
+        "updated_at": now,
+    }
+    await db.analysis_batches.insert_one(dict(batch))
+    return batch
+
+
+def batch_job_payloads(batch: Dict[str, Any], urls: List[str], force_refresh: bool,
+                       min_interval: Optional[float] = None) -> List[Dict[str, Any]]:
+    payload = {"user_details": batch["user_details"], "force_refresh": force_refresh, "batch_id": batch["id"]}
+    if min_interval:
+        payload["min_interval_seconds"] = min_interval  # A crawl's rate applies to its own jobs only
+    return [{"url": url, **payload} for url in urls]
+
+
+async def create_batch(urls: List[str], user_details: UserDetails, force_refresh: bool = False, source: str = "list") -> Dict[str, Any]:
+    """Validate and dedupe URLs, then queue one batch job per unique page"""
+    unique, rejected, seen = [], [], set()
+    duplicates = 0
+    for raw in urls:
+        raw = raw.strip()
+        if not raw:
+            continue
+        try:
+            url = str(_http_url.validate_python(raw))
+        except ValidationError:
+            rejected.append(raw)
+            continue
+        key = normalize_url(url)
+        if key in seen:
+            duplicates += 1
+            continue
+        seen.add(key)
+        unique.append(url)
+    
+    if not unique:
+        raise HTTPException(status_code=400, detail="No valid URLs in batch")
+    if len(unique) > BATCH_MAX_URLS:
+        raise HTTPException(status_code=400, detail=f"Batch has {len(unique)} URLs, the limit is {BATCH_MAX_URLS}")
+    
+    batch = await insert_batch(
+        user_details,
+        source=source,
+        total=len(unique),
+        duplicates=duplicates,
+        rejected_urls=rejected,
+    )
+    
+    try:
+        await batch_jobs.submit_many(batch_job_payloads(batch, unique, force_refresh))
+    except JobQueueFull as e:
+        await db.analysis_batches.delete_one({"id": batch["id"]})
+        raise HTTPException(status_code=503, detail=f"Batch queue is full: {str(e)}")
+    
+    logger.info(f"Queued batch {batch['id']} with {len(unique)} URLs")
+    return await get_batch_progress(batch["id"])
+
+
+async def get_batch_progress(batch_id: str) -> Optional[Dict[str, Any]]:
+    """Batch document with per-status URL counts and aggregate report stats"""
+    batch = await db.analysis_batches.find_one({"id": batch_id}, {"_id": 0, "user_details": 0})
+    if not batch:
+        return None
+    
+    counts = {"queued": 0, "running": 0, "completed": 0, "failed": 0}
+    async for row in db.batch_jobs.aggregate([
+        {"$match": {"batch_id": batch_id}},
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+    ]):
+        counts[row["_id"]] = row["count"]
+    
+    stats = {}
+    async for row in db.seo_reports.aggregate([
+        {"$match": {"batch_id": batch_id}},
+        {"$group": {
+            "_id": None,
+            "reports": {"$sum": 1},
+            "avg_seo_score": {"$avg": "$seo_score"},
+            "min_seo_score": {"$min": "$seo_score"},
+            "max_seo_score": {"$max": "$seo_score"},
+            "avg_load_time_seconds": {"$avg": "$page_speed_analysis.total_load_time_seconds"},
+            "total_issues": {"$sum": {"$size": {"$ifNull": ["$seo_issues", []]}}},
+        }},
+    ]):
+        stats = {key: round(value, 2) if isinstance(value, float) else value for key, value in row.items() if key != "_id"}
+    
+    async for row in db.seo_reports.aggregate([
+        {"$match": {"batch_id": batch_id}},
+        {"$unwind": "$seo_issues"},
+        {"$group": {"_id": "$seo_issues.priority", "count": {"$sum": 1}}},
+    ]):
+        stats.setdefault("issues_by_priority", {})[row["_id"]] = row["count"]
+    
+    batch["counts"] = counts
+    batch["stats"] = stats
+    discovering = batch.get("crawl_status") == "discovering"
+    batch["status"] = "running" if counts["queued"] or counts["running"] or discovering else "completed"
+    return batch
+
+
+# ========== SITEMAP CRAWLS ==========
+CRAWL_ENQUEUE_CHUNK = 100
+_crawl_tasks = set()
+
+
+async def run_crawl(batch: Dict[str, Any], crawler: SitemapCrawler, force_refresh: bool):
+    """Feed pages from the sitemap frontier into the batch queue, pausing while it is full"""
+    chunk: List[str] = []
+    
+    async def flush():
+        while True:
+            try:
+                await batch_jobs.submit_many(batch_job_payloads(batch, chunk, force_refresh, crawler.interval_seconds))
+                break
+            except JobQueueFull:
+                await asyncio.sleep(5)
+        await db.analysis_batches.update_one({"id": batch["id"]}, {
+            "$inc": {"total": len(chunk)},
+            "$set": {"sitemap_url": crawler.sitemap_url, "crawl_stats": crawler.stats,
+                     "updated_at": datetime.now(timezone.utc).isoformat()},
+        })
+        chunk.clear()
+    
+    update = {"crawl_status": "completed"}
+    try:
+        async for page in crawler.pages():
+            chunk.append(page)
+            if len(chunk) >= CRAWL_ENQUEUE_CHUNK:
+                await flush()
+        if chunk:
+            await flush()
+    except asyncio.CancelledError:
+        update = {"crawl_status": "interrupted"}
+        raise
+    except Exception as e:
+        logger.error(f"Sitemap crawl {batch['id']} failed: {str(e)}")
+        update = {"crawl_status": "failed", "crawl_error": str(e)}
+    finally:
+        await db.analysis_batches.update_one({"id": batch["id"]}, {"$set": {
+            **update,
+            "sitemap_url": crawler.sitemap_url,
+            "crawl_stats": crawler.stats,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }})
+        logger.info(f"Sitemap crawl {batch['id']} {update['crawl_status']}: {crawler.stats}")
+
+
+@api_router.post("/seo/crawls", response_model=AnalysisBatchResponse, status_code=202)
+async def submit_crawl(request: SEOCrawlRequest):
+    """Audit a whole site: stream its sitemaps and queue every crawlable page as a batch"""
+    crawler = SitemapCrawler(
+        str(request.url),
+        sitemap_url=str(request.sitemap_url) if request.sitemap_url else None,
+        max_pages=request.max_pages,
+        max_depth=request.max_depth,
+        min_interval_seconds=request.min_interval_seconds,
+    )
+    batch = await insert_batch(request.user_details, source="sitemap", crawl_status="discovering",
+                               sitemap_url=crawler.sitemap_url)
+    
+    task = asyncio.create_task(run_crawl(batch, crawler, request.force_refresh))
+    _crawl_tasks.add(task)
+    task.add_done_callback(_crawl_tasks.discard)
+    
+    logger.info(f"Started sitemap crawl {batch['id']} for: {request.url}")
+    return await get_batch_progress(batch["id"])
+
+
+@api_router.post("/seo/batches", response_model=AnalysisBatchResponse, status_code=202)
+async def submit_batch(request: SEOBatchRequest):
+    """Queue an analysis for every unique URL in the list"""
+    return await create_batch(request.urls, request.user_details, request.force_refresh)
+
+
+@api_router.post("/seo/batches/csv", response_model=AnalysisBatchResponse, status_code=202)
+async def submit_batch_csv(
+    file: UploadFile = File(...),
+    name: str = Form(...),
+    email: str = Form(...),
+    phone: str = Form(...),
+    force_refresh: bool = Form(False),
+):
+    """Queue an analysis for every unique URL found in an uploaded CSV"""
+    text = (await file.read()).decode('utf-8-sig', errors='replace')
+    return await create_batch(parse_url_csv(text), UserDetails(name=name, email=email, phone=phone), force_refresh, source="csv")
+
+
+@api_router.get("/seo/batches/{batch_id}", response_model=AnalysisBatchResponse)
+async def get_batch(batch_id: str):
+    """Progress and aggregate stats of a batch"""
+    batch = await get_batch_progress(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch
+
+
+@api_router.get("/seo/batches/{batch_id}/jobs", response_model=List[AnalysisJobResponse])
+async def get_batch_jobs(batch_id: str, status: Optional[str] = None, limit: int = 1000):
+    """Per-URL job state of a batch, optionally filtered by status"""
+    query = {"batch_id": batch_id}
+    if status:
+        query["status"] = status
+    return await db.batch_jobs.find(query, {"_id": 0}).sort("created_at", 1).to_list(min(limit, BATCH_MAX_URLS))
+
+
 @api_router.get("/seo/reports", response_model=List[SEOReportResponse])
-async def get_seo_reports():
-    """Get all SEO reports"""
-    reports = await db.seo_reports.find({}, {"_id": 0}).sort("analyzed_at", -1).to_list(100)
+async def get_seo_reports(batch_id: Optional[str] = None):
+    """Get all SEO reports (or those of one batch)"""
+    query = {"batch_id": batch_id} if batch_id else {}
+    reports = await db.seo_reports.find(query, {"_id": 0}).sort("analyzed_at", -1).to_list(BATCH_MAX_URLS if batch_id else 100)
     
     for report in reports:
         if isinstance(report['analyzed_at'], str):
@@ -1615,14 +2163,11 @@ async def analyze_backlinks_endpoint(request: SEOAnalysisRequest):
     logger.info(f"Starting backlink analysis for: {url}")
     
     try:
-        async with httpx.AsyncClient(follow_redirects=True, timeout=30.0) as client:
-            response = await client.get(url, headers={
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            })
-            response.raise_for_status()
+        response, _ = await fetch_page(url)
+        response.raise_for_status()
         
-        soup = BeautifulSoup(response.text, 'html.parser')
-        backlink_data = await analyze_backlinks(url, soup)
+        doc = await parse_fetched_page(url, response)
+        backlink_data = await analyze_backlinks(url, doc)
         
         return {
             "url": url,
@@ -1633,6 +2178,122 @@ async def analyze_backlinks_endpoint(request: SEOAnalysisRequest):
         raise HTTPException(status_code=400, detail=f"Failed: {str(e)}")
 
 
+@api_router.get("/seo/link-graph/{site}")
+async def get_link_graph(site: str, limit: int = 50):
+    """Orphan pages, click depth, PageRank and anchor text across a site's pages analyzed by batches and crawls"""
+    metrics = await link_graph.metrics(site.lower())
+    if not metrics["pages_analyzed"]:
+        raise HTTPException(status_code=404, detail="No analyzed pages for this site")
+    
+    top_urls = [entry["url"] for entry in metrics["top_pagerank"]]
+    return {
+        **{key: value for key, value in metrics.items() if not key.endswith("_by_url")},
+        "orphan_pages": metrics["orphan_pages"][:limit],
+        "top_inbound_anchors": {url: metrics["inbound_anchors_by_url"].get(url, []) for url in top_urls},
+    }
+
+
+@api_router.get("/seo/link-graph/{site}/page")
+async def get_link_graph_page(site: str, url: str):
+    """Link metrics of one page within its site's graph"""
+    metrics = await link_graph.metrics(site.lower())
+    key = normalize_url(url)
+    if key not in metrics["inbound_links_by_url"]:
+        raise HTTPException(status_code=404, detail="Page not in link graph")
+    
+    return {
+        "url": key,
+        "click_depth": metrics["depth_by_url"][key],
+        "pagerank": metrics["pagerank_by_url"][key],
+        "inbound_links": metrics["inbound_links_by_url"][key],
+        "inbound_anchors": metrics["inbound_anchors_by_url"].get(key, []),
+        "is_orphan": key in metrics["orphan_pages"],
+    }
+
+
+@api_router.get("/screenshots/{image_id}")
+async def get_screenshot(image_id: str, request: Request):
+    """Stream a stored screenshot by its content hash"""
+    if not is_valid_digest(image_id):
+        raise HTTPException(status_code=404, detail="Screenshot not found")
+    
+    # Content-addressed blobs never change, so they can be cached forever
+    headers = {
+        "ETag": f'"{image_id}"',
+        "Cache-Control": "public, max-age=31536000, immutable",
+    }
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    
+    chunks = await open_screenshot(image_id)
+    if chunks is None:
+        raise HTTPException(status_code=404, detail="Screenshot not found")
+    
+    return StreamingResponse(chunks, media_type="image/png", headers=headers)
+
+
+SCREENSHOT_SWEEP_INTERVAL_SECONDS = int(os.environ.get('SCREENSHOT_SWEEP_INTERVAL_SECONDS', 6 * 3600))
+_screenshot_sweep_task: Optional[asyncio.Task] = None
+
+
+async def referenced_screenshot_ids() -> Set[str]:
+    """Every screenshot blob a stored report points to"""
+    referenced = set()
+    async for report in db.seo_reports.find({"responsive_preview": {"$ne": {}}}, {"_id": 0, "responsive_preview": 1}):
+        for shot in (report.get("responsive_preview") or {}).values():
+            if isinstance(shot, dict) and shot.get("image_id"):
+                referenced.add(shot["image_id"])
+    return referenced
+
+
+async def sweep_screenshot_blobs():
+    """Periodically delete screenshot blobs left behind by deleted reports"""
+    while True:
+        try:
+            deleted = await sweep_screenshots(await referenced_screenshot_ids())
+            if deleted:
+                logger.info(f"Deleted {deleted} unreferenced screenshot blobs")
+        except Exception as e:
+            logger.error(f"Screenshot sweep failed: {str(e)}")
+        await asyncio.sleep(SCREENSHOT_SWEEP_INTERVAL_SECONDS)
+
+
+@api_router.get("/system/http-pool")
+async def http_pool_metrics():
+    """Per-host connection pool metrics of the shared HTTP client"""
+    return get_http_pool_metrics()
+
+
+@api_router.get("/system/browser-pool")
+async def browser_pool_health():
+    """Health and load of the warm screenshot browser pool"""
+    return get_browser_pool_health()
+
+
+@api_router.get("/system/stages")
+async def stage_timings():
+    """Run and queue time of CPU-bound stages on the worker pool"""
+    return get_stage_timings()
+
+
+@api_router.get("/system/jobs")
+async def analysis_job_stats():
+    """Worker count and backlog of the analysis job queue"""
+    return {"analysis": analysis_jobs.stats(), "batch": batch_jobs.stats()}
+
+
+@api_router.get("/system/result-cache")
+async def result_cache_stats():
+    """Hit/miss counters and size of the analysis result, AI section and semantic AI caches"""
+    return {**result_cache.stats(), "ai_sections": ai_section_cache.stats(), "ai_semantic": semantic_ai_cache.stats()}
+
+
+@api_router.get("/system/llm")
+async def llm_gateway_stats():
+    """Queue depth per priority lane, rate-limit budgets and retry counters of the LLM gateway"""
+    return {**get_llm_metrics(), "prompts": get_prompt_metrics()}
+
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -1644,9 +2305,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def startup_http_client():
+    start_http_client()
+    start_cpu_executor()
+    await start_browser_pool()
+    await result_cache.start()
+    await ai_section_cache.start()
+    await link_graph.start()
+    await db.batch_jobs.create_index("batch_id")
+    await db.seo_reports.create_index("batch_id")
+    await analysis_jobs.start()
+    await batch_jobs.start()
+    global _screenshot_sweep_task
+    _screenshot_sweep_task = asyncio.create_task(sweep_screenshot_blobs())
+
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in list(_crawl_tasks):
+        task.cancel()
+    await asyncio.gather(*_crawl_tasks, return_exceptions=True)
+    await analysis_jobs.stop()
+    await batch_jobs.stop()
+    if _screenshot_sweep_task is not None:
+        _screenshot_sweep_task.cancel()
     client.close()
+    await close_http_client()
+    await close_llm_gateway()
+    await close_browser_pool()
+    shutdown_cpu_executor()
 # ========== NEW FEATURES: Add these helper functions ==========
 
 
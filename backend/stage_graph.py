@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+STAGE_TIMEOUT_SECONDS = float(os.environ.get('STAGE_TIMEOUT_SECONDS', 30))
+
+
+class StageGraphError(Exception):
+    """Raised when a required stage fails or the graph cannot make progress"""
+
+
+@dataclass
+class Stage:
+    """One node of the audit pipeline.
+
+    `run` is awaited with the results of `inputs` as keyword arguments. A stage that
+    fails or times out yields `fallback(error)` instead, unless it is `required`.
+    """
+    name: str
+    run: Callable[..., Awaitable[Any]]
+    inputs: Tuple[str, ...] = ()
+    timeout: Optional[float] = None
+    required: bool = False
+    fallback: Callable[[str], Any] = field(default=lambda error: {"error": error})
+
+
+async def _run_stage(stage: Stage, kwargs: Dict[str, Any]) -> Tuple[Any, Optional[str], float]:
+    started = time.perf_counter()
+    timeout = stage.timeout or STAGE_TIMEOUT_SECONDS
+    try:
+        result = await asyncio.wait_for(stage.run(**kwargs), timeout=timeout)
+        error = None
+    except asyncio.TimeoutError:
+        error = f"{stage.name} timed out after {timeout}s"
+    except Exception as e:
+        error = getattr(e, 'detail', None) or str(e)
+    elapsed = round(time.perf_counter() - started, 4)
+
+    if error is not None:
+        if stage.required:
+            raise StageGraphError(error)
+        logger.warning(f"Stage {stage.name} failed: {error}")
+        result = stage.fallback(error)
+    return result, error, elapsed
+
+
+async def run_stage_graph(
+    stages: List[Stage],
+    on_done: Optional[Callable[[str, Any], Awaitable[None]]] = None,
+) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+    """Run every stage as soon as its inputs are ready; returns (results, per-stage timings)"""
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        unknown = [name for name in stage.inputs if name not in by_name]
+        if unknown:
+            raise StageGraphError(f"Stage {stage.name} depends on unknown stages: {unknown}")
+
+    results: Dict[str, Any] = {}
+    timings: Dict[str, Dict[str, Any]] = {}
+    pending = dict(by_name)
+    running: Dict[asyncio.Task, Stage] = {}
+
+    try:
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if all(dep in results for dep in stage.inputs):
+                    kwargs = {dep: results[dep] for dep in stage.inputs}
+                    running[asyncio.create_task(_run_stage(stage, kwargs))] = stage
+                    del pending[name]
+
+            if not running:
+                raise StageGraphError(f"Dependency cycle between stages: {sorted(pending)}")
+
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                stage = running.pop(task)
+                result, error, elapsed = task.result()
+                results[stage.name] = result
+                timings[stage.name] = {"seconds": elapsed, "error": error}
+                if on_done is not None:
+                    await on_done(stage.name, result)
+    finally:
+        # A required stage failed (or we were cancelled): don't leave siblings running
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+
+    return results, timings
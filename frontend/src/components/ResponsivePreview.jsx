@@ -1,13 +1,20 @@
 import React, { useState } from 'react';
 import { Monitor, Tablet, Smartphone } from 'lucide-react';
 
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+
+// Newer reports reference stored blobs; older ones carry the image inline as base64
+const screenshotSrc = (shot) =>
+  shot.image_url ? `${BACKEND_URL}${shot.image_url}` : `data:image/png;base64,${shot.image}`;
+
 const ResponsivePreview = ({ screenshots }) => {
   const [selectedDevice, setSelectedDevice] = useState('mobile');
 
-  if (!screenshots || Object.keys(screenshots).length === 0) {
+  if (!screenshots || screenshots.skipped || Object.keys(screenshots).length === 0) {
     return (
       <div className="bg-yellow-50 border-l-4 border-yellow-500 p-4 rounded-r-lg">
         <p className="text-sm text-yellow-800">⚠️ Screenshots could not be captured</p>
+        {screenshots && screenshots.skipped && <p className="text-xs text-yellow-700 mt-1">{screenshots.skipped}</p>}
       </div>
     );
   }
@@ -68,7 +75,7 @@ const ResponsivePreview = ({ screenshots }) => {
           <>
             <div className={`shadow-2xl overflow-hidden ${getMockupStyle(selectedDevice)}`}>
               <img
-                src={`data:image/png;base64,${screenshots[selectedDevice].image}`}
+                src={screenshotSrc(screenshots[selectedDevice])}
                 alt={`${selectedDevice} preview`}
                 className="w-full h-full object-cover object-top"
               />
@@ -0,0 +1,54 @@
+"""In-process stand-in for the OpenAI chat completions API (an httpx.MockTransport)"""
+import asyncio
+import json
+import time
+from typing import List, Optional
+
+import httpx
+
+
+def completion(content: str, total_tokens: int = 30) -> dict:
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": "gpt-4o-mini",
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": total_tokens - 10, "completion_tokens": 10, "total_tokens": total_tokens},
+    }
+
+
+class OpenAIStub:
+    """Answers each request with the next queued response, recording what was asked.
+
+    A queued item is an httpx.Response, or a string to return as the completion
+    content. With `hold`, every request waits for `release()` before answering.
+    """
+
+    def __init__(self, responses: Optional[List] = None, hold: bool = False):
+        self.responses = list(responses or [])
+        self.requests: List[dict] = []
+        self._gate = asyncio.Event()
+        if not hold:
+            self._gate.set()
+
+    def release(self):
+        self._gate.set()
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        self.requests.append(body)
+        await self._gate.wait()
+        item = self.responses.pop(0) if self.responses else body["messages"][-1]["content"]
+        if isinstance(item, httpx.Response):
+            return item
+        return httpx.Response(200, json=completion(item))
+
+    def client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(self.handle))
+
+
+def rate_limited(retry_after_ms: int = 10) -> httpx.Response:
+    return httpx.Response(429, headers={"retry-after-ms": str(retry_after_ms)},
+                          json={"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}})
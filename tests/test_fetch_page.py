@@ -0,0 +1,59 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import fetch_service
+
+BODY = b'<html><head><title>Cached</title></head><body>Hello</body></html>'
+
+
+class ETagHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.headers.get('If-None-Match') == '"v1"':
+            self.send_response(304)
+            self.send_header('ETag', '"v1"')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', '"v1"')
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ETagHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/page"
+    server.shutdown()
+    server.server_close()
+
+
+def test_fresh_fetch_and_304_replay(server_url):
+    async def run():
+        try:
+            return await fetch_service.fetch_page(server_url), await fetch_service.fetch_page(server_url)
+        finally:
+            await fetch_service.close_http_client()
+
+    (first, first_timings), (second, second_timings) = asyncio.run(run())
+    assert first.status_code == 200
+    assert first_timings["not_modified"] is False
+    assert first.extensions.get('not_modified') is None
+    # A new connection: its connect phase (lookup + handshake) is within time-to-first-byte
+    assert first_timings["connection_reused"] is False
+    assert "dns_seconds" not in first_timings
+    assert first_timings["connect_seconds"] <= first_timings["ttfb_seconds"]
+    assert first_timings["ttfb_seconds"] <= first_timings["total_seconds"]
+
+    assert second.status_code == 200
+    assert second.content == BODY
+    assert second_timings["not_modified"] is True
+    assert second.extensions.get('not_modified') is True
@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+from fetch_service import HostLimiter
+
+
+async def start_gaps(limiter, intervals):
+    """Seconds between consecutive slot starts for one host"""
+    starts = []
+    for interval in intervals:
+        async with limiter.slot('a.test', interval):
+            starts.append(time.monotonic())
+    return [later - earlier for earlier, later in zip(starts, starts[1:])]
+
+
+def test_interval_applies_only_after_the_start_that_asked_for_it():
+    limiter = HostLimiter(max_concurrency=1, min_interval=0.0)
+    gaps = asyncio.run(start_gaps(limiter, [0.2, None, None]))
+    assert gaps[0] >= 0.18
+    assert gaps[1] < 0.05
+
+
+def test_hosts_are_spaced_independently():
+    limiter = HostLimiter(max_concurrency=1, min_interval=0.0)
+
+    async def run():
+        async with limiter.slot('a.test', 5):
+            pass
+        started = time.monotonic()
+        async with limiter.slot('b.test'):
+            return time.monotonic() - started
+
+    assert asyncio.run(run()) < 0.05
+
+
+def test_idle_hosts_are_forgotten():
+    limiter = HostLimiter(max_concurrency=2, min_interval=0.0)
+
+    async def run():
+        await asyncio.gather(*(start_gaps(limiter, [None]) for _ in range(3)))
+        for index in range(100):
+            async with limiter.slot(f"host{index}.test"):
+                pass
+
+    asyncio.run(run())
+    assert not limiter._semaphores and not limiter._locks and not limiter._next_start
+    assert limiter.active() == {}
+
+
+def test_batch_lane_does_not_hold_up_interactive_slots():
+    import fetch_service
+
+    async def run():
+        held = asyncio.Event()
+        release = asyncio.Event()
+
+        async def batch():
+            async with fetch_service.host_slot('https://a.test/', lane='batch'):
+                held.set()
+                await release.wait()
+
+        tasks = [asyncio.create_task(batch()) for _ in range(fetch_service.HOST_MAX_CONCURRENCY)]
+        await held.wait()
+        start = time.monotonic()
+        async with fetch_service.host_slot('https://a.test/other'):
+            waited = time.monotonic() - start
+        release.set()
+        await asyncio.gather(*tasks)
+        return waited
+
+    assert asyncio.run(run()) < 0.05
@@ -0,0 +1,140 @@
+import asyncio
+import copy
+
+from pymongo import ReturnDocument
+
+from job_service import JobQueue
+
+
+def _matches(doc, query):
+    for key, condition in query.items():
+        value = doc.get(key)
+        if isinstance(condition, dict):
+            for op, operand in condition.items():
+                if op == '$gte' and not (value is not None and value >= operand):
+                    return False
+                if op == '$not' and _matches(doc, {key: operand}):
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self._docs = docs
+
+    def sort(self, key, direction):
+        self._docs.sort(key=lambda doc: doc.get(key), reverse=direction < 0)
+        return self
+
+    def __aiter__(self):
+        self._iter = iter(self._docs)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class FakeCollection:
+    """Just enough of a motor collection for JobQueue"""
+
+    def __init__(self):
+        self.docs = []
+
+    def _apply(self, doc, update):
+        doc.update(update.get("$set", {}))
+        for key, amount in update.get("$inc", {}).items():
+            doc[key] = doc.get(key, 0) + amount
+        for key, item in update.get("$push", {}).items():
+            doc.setdefault(key, []).append(item)
+
+    async def insert_many(self, docs):
+        self.docs += [copy.deepcopy(doc) for doc in docs]
+
+    def find(self, query, projection=None):
+        return FakeCursor([copy.deepcopy(doc) for doc in self.docs if _matches(doc, query)])
+
+    async def find_one(self, query, projection=None):
+        return next((copy.deepcopy(doc) for doc in self.docs if _matches(doc, query)), None)
+
+    async def find_one_and_update(self, query, update, projection=None, return_document=ReturnDocument.BEFORE):
+        for doc in self.docs:
+            if _matches(doc, query):
+                before = copy.deepcopy(doc)
+                self._apply(doc, update)
+                return copy.deepcopy(doc) if return_document == ReturnDocument.AFTER else before
+        return None
+
+    async def update_one(self, query, update):
+        for doc in self.docs:
+            if _matches(doc, query):
+                self._apply(doc, update)
+                return
+
+
+def test_running_job_of_a_dead_worker_is_reclaimed_after_its_lease():
+    ran = []
+
+    async def runner(job, progress):
+        ran.append(job["id"])
+        return {"ok": True}
+
+    async def run():
+        collection = FakeCollection()
+        # Left "running" a moment ago by a process that was killed
+        await collection.insert_many([{"id": "lost", "status": "running", "attempts": 1, "lease_owner": "dead",
+                                       "lease_until": "2000-01-01T00:00:00+00:00", "created_at": "1"}])
+        queue = JobQueue(collection, runner, workers=1, lease_seconds=0.2)
+        await queue.start()
+        for _ in range(50):
+            if (await queue.get("lost"))["status"] == "completed":
+                break
+            await asyncio.sleep(0.02)
+        await queue.stop()
+        return await queue.get("lost")
+
+    job = asyncio.run(run())
+    assert ran == ["lost"]
+    assert job["status"] == "completed" and job["attempts"] == 2
+
+
+def test_heartbeat_keeps_a_long_job_from_being_reclaimed():
+    runs = []
+
+    async def runner(job, progress):
+        runs.append(job["id"])
+        await asyncio.sleep(0.5)
+        return {"ok": True}
+
+    async def run():
+        queue = JobQueue(FakeCollection(), runner, workers=2, lease_seconds=0.15)
+        await queue.start()
+        job = await queue.submit({"url": "https://a.test/"})
+        await asyncio.sleep(0.7)
+        await queue.stop()
+        return await queue.get(job["id"])
+
+    job = asyncio.run(run())
+    assert len(runs) == 1
+    assert job["status"] == "completed"
+
+
+def test_jobs_out_of_attempts_fail_instead_of_looping():
+    async def runner(job, progress):
+        raise AssertionError("must not run")
+
+    async def run():
+        collection = FakeCollection()
+        await collection.insert_many([{"id": "crashy", "status": "running", "attempts": 3, "lease_owner": "dead",
+                                       "lease_until": "2000-01-01T00:00:00+00:00", "created_at": "1"}])
+        queue = JobQueue(collection, runner, workers=1, max_attempts=3)
+        await queue.start()
+        await queue.stop()
+        return await queue.get("crashy")
+
+    job = asyncio.run(run())
+    assert job["status"] == "failed"
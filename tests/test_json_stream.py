@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from json_stream import JSONSectionStream
+
+REPLY = {
+    "analysis_summary": 'Title says "Best {cheap} shoes" \\ fix [now]',
+    "seo_issues": [
+        {"id": "title_length", "issue": 'Title is 72 characters "too long" }'},
+        {"id": "image_alt", "fix": "Add alt text to [3] images"},
+    ],
+    "seo_score": 64,
+}
+
+
+def stream(text, size):
+    scanner = JSONSectionStream()
+    events = []
+    for start in range(0, len(text), size):
+        events += scanner.feed(text[start:start + size])
+    return events
+
+
+@pytest.mark.parametrize('size', [1, 2, 5, 64, 10000])
+def test_members_split_across_chunks(size):
+    events = stream(json.dumps(REPLY, indent=1), size)
+    assert [(key, index) for key, index, _ in events] == [
+        ("analysis_summary", None), ("seo_issues", 0), ("seo_issues", 1), ("seo_issues", None), ("seo_score", None),
+    ]
+    assert {key: value for key, index, value in events if index is None} == REPLY
+
+
+def test_escaped_quotes_and_braces_inside_strings():
+    events = stream(json.dumps({"a\"}": "x\\\"}]{[", "b": 1}), 3)
+    assert events == [("a\"}", None, "x\\\"}]{["), ("b", None, 1)]
+
+
+def test_seo_issue_items_arrive_before_the_list_closes():
+    text = json.dumps(REPLY)
+    cut = text.index('{"id": "image_alt"')
+    scanner = JSONSectionStream()
+    first = scanner.feed(text[:cut])
+    assert first[-1] == ("seo_issues", 0, REPLY["seo_issues"][0])
+    rest = scanner.feed(text[cut:])
+    assert rest[0] == ("seo_issues", 1, REPLY["seo_issues"][1])
+    assert rest[1] == ("seo_issues", None, REPLY["seo_issues"])
+
+
+def test_scalar_list_items_and_null_values():
+    events = stream('{"flags": [1, "two", null], "none": null}', 4)
+    assert events == [("flags", 0, 1), ("flags", 1, "two"), ("flags", 2, None),
+                      ("flags", None, [1, "two", None]), ("none", None, None)]
+
+
+def test_truncated_completion_emits_only_finished_members():
+    text = json.dumps(REPLY)
+    events = stream(text[:text.index('"image_alt"') + 5], 7)
+    assert events == [("analysis_summary", None, REPLY["analysis_summary"]),
+                      ("seo_issues", 0, REPLY["seo_issues"][0])]
+    # A trailing scalar isn't known to be complete until its delimiter arrives
+    assert stream('{"seo_score": 64', 3) == []
+
+
+def test_invalid_members_are_skipped():
+    events = stream('{"seo_score": tru, "ok": 1, "seo_issues": [{"id": }, {"id": "x"}]}', 5)
+    assert events == [("ok", None, 1), ("seo_issues", 1, {"id": "x"})]
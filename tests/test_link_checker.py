@@ -0,0 +1,138 @@
+import asyncio
+import time
+
+import link_checker
+from seo_rules import evaluate_rules
+
+
+def test_links_left_when_the_budget_runs_out_are_unchecked(monkeypatch):
+    async def fake_check(url, min_interval=None):
+        if 'slow' in url:
+            await asyncio.sleep(1)
+        status = 404 if 'missing' in url else 200
+        return {"url": url, "status_code": status, "ok": status < 400, "error": None}
+
+    monkeypatch.setattr(link_checker, '_check', fake_check)
+    monkeypatch.setattr(link_checker, '_results', link_checker.OrderedDict())
+    monkeypatch.setattr(link_checker, '_in_flight', {})
+
+    urls = ['https://a.test/ok', 'https://a.test/missing', 'https://a.test/slow']
+    summary = asyncio.run(link_checker.check_links(urls, budget=0.05))
+
+    assert summary["checked"] == 2
+    assert summary["unchecked"] == 1
+    assert summary["timeouts"] == 0
+    slow = summary["results"]['https://a.test/slow']
+    assert slow["unchecked"] is True and slow["ok"] is None
+    assert summary["results"]['https://a.test/missing']["ok"] is False
+
+
+def test_unchecked_links_raise_no_broken_link_issue():
+    data = {"linking_analysis": {"broken_count": 0, "unchecked_count": 12, "internal_count": 10,
+                                 "total_links": 10, "internal_ratio": 100}}
+    assert "broken_links" not in {issue["id"] for issue in evaluate_rules("https://a.test/", data)}
+
+
+def test_rate_limited_links_are_unchecked_and_cached_briefly(monkeypatch):
+    async def fake_follow(client, method, url):
+        return {"status_code": 429 if 'busy' in url else 200, "final_url": url, "redirect_chain": []}
+
+    monkeypatch.setattr(link_checker, '_follow', fake_follow)
+    monkeypatch.setattr(link_checker, 'get_http_client', lambda: None)
+    monkeypatch.setattr(link_checker, '_results', link_checker.OrderedDict())
+    monkeypatch.setattr(link_checker, '_in_flight', {})
+
+    summary = asyncio.run(link_checker.check_links(['https://a.test/busy', 'https://a.test/ok']))
+
+    busy = summary["results"]['https://a.test/busy']
+    assert busy["unchecked"] is True and busy["ok"] is None
+    assert summary["unchecked"] == 1 and summary["checked"] == 1
+    expires = {url: entry[0] for url, entry in link_checker._results.items()}
+    assert expires['https://a.test/busy'] < expires['https://a.test/ok'] - 600
+
+
+def test_rate_limited_head_is_not_confirmed_with_get(monkeypatch):
+    methods = []
+
+    async def fake_follow(client, method, url):
+        methods.append(method)
+        return {"status_code": 429, "final_url": url, "redirect_chain": [], "retry_after": None}
+
+    monkeypatch.setattr(link_checker, '_follow', fake_follow)
+    monkeypatch.setattr(link_checker, 'get_http_client', lambda: None)
+
+    result = asyncio.run(link_checker._check('https://busy.test/page'))
+    assert methods == ['HEAD']
+    assert result["unchecked"] is True and result["method"] == "HEAD"
+
+
+def test_host_backing_off_gets_no_more_probes_until_retry_after_passes(monkeypatch):
+    probed = []
+
+    async def fake_follow(client, method, url):
+        probed.append(url)
+        if 'first' in url:
+            return {"status_code": 503, "final_url": url, "redirect_chain": [], "retry_after": 0.2}
+        return {"status_code": 200, "final_url": url, "redirect_chain": []}
+
+    monkeypatch.setattr(link_checker, '_follow', fake_follow)
+    monkeypatch.setattr(link_checker, 'get_http_client', lambda: None)
+    monkeypatch.setattr(link_checker, '_host_limiter', link_checker.HostLimiter(max_concurrency=4, min_interval=0.0))
+    monkeypatch.setattr(link_checker, '_retry_until', {})
+
+    async def run():
+        await link_checker._check('https://busy.test/first')
+        during = await link_checker._check('https://busy.test/second')
+        await asyncio.sleep(0.25)
+        after = await link_checker._check('https://busy.test/third')
+        return during, after
+
+    during, after = asyncio.run(run())
+    assert during["unchecked"] is True and during["error"] == "retry later (host backing off)"
+    assert after["ok"] is True
+    assert probed == ['https://busy.test/first', 'https://busy.test/third']
+
+
+def test_rate_limited_host_does_not_starve_other_hosts(monkeypatch):
+    import httpx
+
+    async def handler(request):
+        if request.url.host == 'busy.test':
+            await asyncio.sleep(0.2)
+            return httpx.Response(429, headers={'retry-after': '3'})
+        return httpx.Response(200)
+
+    monkeypatch.setattr(link_checker, '_results', link_checker.OrderedDict())
+    monkeypatch.setattr(link_checker, '_in_flight', {})
+    monkeypatch.setattr(link_checker, '_retry_until', {})
+    monkeypatch.setattr(link_checker, '_host_limiter', link_checker.HostLimiter(max_concurrency=2, min_interval=0.0))
+
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        monkeypatch.setattr(link_checker, 'get_http_client', lambda: client)
+        monkeypatch.setattr(link_checker, '_global_slots', asyncio.Semaphore(4))
+        busy_page = asyncio.create_task(link_checker.check_links(
+            [f'https://busy.test/{index}' for index in range(80)], budget=1))
+        await asyncio.sleep(0.05)
+        healthy_page = await link_checker.check_links(['https://ok.test/'], budget=1)
+        busy = await busy_page
+        await client.aclose()
+        return busy, healthy_page
+
+    busy, healthy = asyncio.run(run())
+    assert healthy["checked"] == 1 and healthy["results"]['https://ok.test/']["ok"] is True
+    # Only the requests in flight when the first 429 arrived reached the busy host
+    assert busy["unchecked"] == 80
+    assert sum(1 for result in busy["results"].values() if result["status_code"] == 429) == 2
+
+
+def test_retry_after_accepts_seconds_and_dates():
+    import httpx
+
+    def response(status, value):
+        return httpx.Response(status, headers={'retry-after': value})
+
+    assert link_checker._retry_after(response(429, '7')) == 7
+    assert link_checker._retry_after(response(429, '99999')) == link_checker.LINK_CHECK_MAX_RETRY_AFTER_SECONDS
+    assert link_checker._retry_after(response(503, 'Wed, 21 Oct 2015 07:28:00 GMT')) == 0
+    assert link_checker._retry_after(response(404, '7')) is None
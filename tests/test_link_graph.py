@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+
+import link_graph
+from link_graph import LinkGraph, LinkGraphStore, compute_link_metrics
+
+HOME = "https://a.test/"
+ABOUT = "https://a.test/about"
+BLOG = "https://a.test/blog"
+POST = "https://a.test/blog/post"
+LOST = "https://a.test/lost"
+
+
+def site_graph():
+    graph = LinkGraph("a.test")
+    graph.set_page_links(HOME, [(ABOUT, "about"), (BLOG, "blog")])
+    graph.set_page_links(BLOG, [(POST, "read more"), (HOME, "home"), (BLOG, "self")])
+    graph.set_page_links(LOST, [(HOME, "home")])
+    return graph
+
+
+def test_csr_rows_hold_each_page_out_links():
+    graph = site_graph()
+    offsets, targets, anchors = graph.csr()
+    assert len(offsets) == len(graph.urls) + 1
+    row = {graph.urls[node]: [graph.urls[target] for target in targets[offsets[node]:offsets[node + 1]]]
+           for node in range(len(graph.urls))}
+    assert row == {HOME: [ABOUT, BLOG], ABOUT: [], BLOG: [POST, HOME], POST: [], LOST: [HOME]}
+    assert [graph.anchors[anchor] for anchor in anchors] == ["about", "blog", "read more", "home", "home"]
+
+
+def test_pagerank_sums_to_one_with_dangling_pages():
+    metrics = compute_link_metrics(site_graph().snapshot())
+    ranks = metrics["pagerank_by_url"]
+    assert sum(ranks.values()) == pytest.approx(1.0)
+    # About and the post have no out-links; their rank is spread, not lost
+    assert ranks[HOME] == max(ranks.values())
+    assert ranks[LOST] == min(ranks.values())
+
+
+def test_click_depth_is_breadth_first_from_the_homepage():
+    metrics = compute_link_metrics(site_graph().snapshot())
+    assert metrics["depth_by_url"] == {HOME: 0, ABOUT: 1, BLOG: 1, POST: 2, LOST: None}
+    assert metrics["click_depth"]["unreachable_analyzed_pages"] == 1
+
+
+def test_orphans_are_analyzed_pages_nothing_links_to():
+    metrics = compute_link_metrics(site_graph().snapshot())
+    # About and the post are never analyzed themselves; the homepage is never an orphan
+    assert metrics["orphan_pages"] == [LOST]
+
+
+def test_reanalyzed_page_replaces_its_edges():
+    graph = site_graph()
+    version = graph.version
+    graph.set_page_links(BLOG, [(ABOUT, "about us")])
+    metrics = compute_link_metrics(graph.snapshot())
+    assert graph.version == version + 1
+    assert metrics["edges"] == 4
+    assert metrics["inbound_links_by_url"][POST] == 0
+    assert metrics["depth_by_url"][POST] is None
+    assert metrics["inbound_anchors_by_url"][ABOUT] == [
+        {"anchor_text": "about", "count": 1}, {"anchor_text": "about us", "count": 1},
+    ]
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self._docs = iter(docs)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._docs)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class FakeCollection:
+    def __init__(self):
+        self.pages = {}
+
+    def find(self, query, projection=None):
+        return FakeCursor([{"url": url, "links": links} for (site, url), links in self.pages.items()
+                           if site == query["site"]])
+
+    async def update_one(self, query, update, upsert=False):
+        self.pages[(query["site"], query["url"])] = update["$set"]["links"]
+
+
+def test_store_applies_writes_and_forgets_idle_site_locks(monkeypatch):
+    monkeypatch.setattr(link_graph, 'LINK_GRAPH_RECOMPUTE_SECONDS', 0)
+
+    async def run():
+        store = LinkGraphStore(FakeCollection(), max_sites=1)
+        await store.record_page(HOME, [(ABOUT, " About "), ("https://other.test/", "elsewhere")])
+        first = await store.metrics("a.test")
+        await store.record_page(ABOUT, [(HOME, "home")])
+        second = await store.metrics("a.test")
+        await store.record_page("https://b.test/", [])
+        await store.metrics("b.test")
+        return store, first, second
+
+    store, first, second = asyncio.run(run())
+    assert first["edges"] == 1 and first["inbound_anchors_by_url"][ABOUT][0]["anchor_text"] == "about"
+    assert second["edges"] == 2 and second["orphan_pages"] == []
+    assert list(store._graphs) == ["b.test"]
+    assert store._locks == {}
+
+
+def test_metrics_are_recomputed_at_most_once_per_interval(monkeypatch):
+    computed = []
+    compute = link_graph.compute_link_metrics
+
+    def counting(snapshot, top_n=10):
+        computed.append(snapshot["version"])
+        return compute(snapshot, top_n)
+
+    monkeypatch.setattr(link_graph, 'compute_link_metrics', counting)
+
+    async def run():
+        store = LinkGraphStore(FakeCollection())
+        await store.record_page(HOME, [(ABOUT, "about")])
+        first = await store.metrics("a.test")
+        await store.record_page(ABOUT, [(HOME, "home")])
+        during_crawl = await asyncio.gather(store.metrics("a.test"), store.metrics("a.test"))
+        monkeypatch.setattr(link_graph, 'LINK_GRAPH_RECOMPUTE_SECONDS', 0)
+        after = await asyncio.gather(store.metrics("a.test"), store.metrics("a.test"))
+        return first, during_crawl, after
+
+    first, during_crawl, after = asyncio.run(run())
+    assert first["stale"] is False
+    assert all(metrics["stale"] and metrics["edges"] == 1 for metrics in during_crawl)
+    assert all(not metrics["stale"] and metrics["edges"] == 2 for metrics in after)
+    assert computed == [1, 2]  # Concurrent callers shared one recompute
@@ -0,0 +1,93 @@
+import asyncio
+
+from llm_gateway import LLMGateway, TokenBucket, estimate_tokens
+
+from .openai_stub import OpenAIStub, rate_limited
+
+
+def gateway(stub, **limits):
+    return LLMGateway(api_key="test", base_url="https://stub.test/v1", http_client=stub.client(), **limits)
+
+
+def ask(content):
+    return dict(model="gpt-4o-mini", messages=[{"role": "user", "content": content}], max_tokens=50)
+
+
+def test_retries_after_429_and_pauses_dispatch():
+    async def run():
+        stub = OpenAIStub([rate_limited(50), "done"])
+        llm = gateway(stub)
+        started = asyncio.get_running_loop().time()
+        response = await llm.complete(ask("hi"))
+        elapsed = asyncio.get_running_loop().time() - started
+        metrics = llm.metrics()
+        await llm.close()
+        return response, elapsed, metrics, stub
+
+    response, elapsed, metrics, stub = asyncio.run(run())
+    assert response.choices[0].message.content == "done"
+    assert len(stub.requests) == 2
+    assert elapsed >= 0.05  # Waited for retry-after-ms
+    assert metrics["retries"] == 1
+    assert metrics["rate_limited"] == 1
+    assert metrics["completions"] == 1
+
+
+def test_gives_up_after_max_retries():
+    async def run():
+        stub = OpenAIStub([rate_limited(1)] * 3)
+        llm = gateway(stub, max_retries=2)
+        try:
+            await llm.complete(ask("hi"))
+        except Exception as e:
+            error = e
+        await llm.close()
+        return error, llm.metrics(), stub
+
+    error, metrics, stub = asyncio.run(run())
+    assert type(error).__name__ == "RateLimitError"
+    assert len(stub.requests) == 3
+    assert metrics["failures"] == 1
+
+
+def test_interactive_lane_is_served_before_batch():
+    async def run():
+        stub = OpenAIStub(hold=True)
+        llm = gateway(stub, max_concurrency=1)
+        first = asyncio.create_task(llm.complete(ask("first"), 'batch'))
+        await asyncio.sleep(0.01)  # "first" holds the only slot
+        queued = [asyncio.create_task(llm.complete(ask(name), priority))
+                  for name, priority in (("batch-1", 'batch'), ("batch-2", 'batch'), ("interactive", 'interactive'))]
+        await asyncio.sleep(0.01)
+        lanes = llm.metrics()["lanes"]
+        stub.release()
+        await asyncio.gather(first, *queued)
+        await llm.close()
+        return lanes, [request["messages"][-1]["content"] for request in stub.requests]
+
+    lanes, order = asyncio.run(run())
+    assert lanes["batch"]["queued"] == 2 and lanes["interactive"]["queued"] == 1
+    assert order == ["first", "interactive", "batch-1", "batch-2"]
+
+
+def test_token_budget_is_settled_with_actual_usage():
+    async def run():
+        stub = OpenAIStub(["ok"])
+        llm = gateway(stub, tokens_per_minute=600)
+        await llm.complete(ask("hi"))
+        metrics = llm.metrics()
+        await llm.close()
+        return metrics
+
+    metrics = asyncio.run(run())
+    assert metrics["tokens_used"] == 30
+    # The estimate was charged up front and corrected to the 30 tokens used
+    assert 570 <= metrics["token_budget"] < 580
+
+
+def test_token_bucket_delay_and_debt():
+    bucket = TokenBucket(rate_per_minute=60)  # One per second
+    assert bucket.delay(10) == 0
+    bucket.take(70)  # More than the bucket holds: goes into debt
+    assert 10.9 < bucket.delay(1) <= 11
+    assert estimate_tokens(ask("x" * 40)) == 10 + 50
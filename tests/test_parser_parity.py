@@ -0,0 +1,56 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from html_document import PARSER_BACKENDS, parse_document
+
+FIXTURES = sorted((Path(__file__).parent / 'fixtures' / 'html').glob('*.html'))
+NATIVE_BACKENDS = [name for name in PARSER_BACKENDS if name != 'html.parser']
+
+
+def _text(value):
+    return ' '.join((value or '').split())
+
+
+def summary(doc):
+    """What the analyzers read from a document, normalised for comparison"""
+    return {
+        "title": _text(doc.title),
+        "headings": {f"h{level}": [_text(h.text) for h in doc.find_all(f"h{level}")] for level in range(1, 7)},
+        "links": [(a.get('href'), _text(a.text), a.rel) for a in doc.anchors],
+        "images": [(img.get('src'), img.get('alt')) for img in doc.images],
+        "meta_names": {name: meta.get('content') for name, meta in doc.meta_by_name.items()},
+        "meta_properties": {prop: meta.get('content') for prop, meta in doc.meta_by_property.items()},
+        "canonical": [link.get('href') for link in doc.canonical_links],
+        "head_links": [(link.get('href'), link.in_head) for link in doc.link_tags],
+        "json_ld": [json.loads(script.text) for script in doc.json_ld_scripts],
+        "microdata": [item.get('itemtype') for item in doc.microdata_items],
+        "external_scripts": [script.get('src') for script in doc.external_scripts],
+        "text": doc.text,
+    }
+
+
+@pytest.mark.parametrize('fixture', FIXTURES, ids=lambda path: path.stem)
+@pytest.mark.parametrize('backend', NATIVE_BACKENDS)
+def test_backend_matches_html_parser(backend, fixture):
+    pytest.importorskip({'lxml': 'lxml', 'selectolax': 'selectolax'}[backend])
+    html = fixture.read_text()
+    expected = summary(parse_document(html, 'html.parser'))
+    actual = summary(parse_document(html, backend))
+    for key in expected:
+        assert actual[key] == expected[key], f"{backend} differs on {key}"
+
+
+def test_fixtures_cover_the_analyzed_fields():
+    """Guard against parity passing on fixtures that have nothing to compare"""
+    docs = [summary(parse_document(path.read_text(), 'html.parser')) for path in FIXTURES]
+    assert len(docs) >= 3
+    for key in ('title', 'links', 'images', 'meta_names', 'json_ld'):
+        assert all(doc[key] for doc in docs), key
+
+
+@pytest.mark.parametrize('backend', list(PARSER_BACKENDS))
+def test_empty_document(backend):
+    doc = parse_document('   ', backend)
+    assert doc.title is None and doc.anchors == [] and doc.text == ''
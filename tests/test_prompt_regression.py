@@ -0,0 +1,34 @@
+import pytest
+
+import prompt_builder
+from prompt_regression import FIXTURES_DIR, check_offline, load_fixtures
+
+FIXTURES = load_fixtures(FIXTURES_DIR)
+
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    # tiktoken fetches its BPE file on first use; keep the offline checks off the network
+    monkeypatch.setattr(prompt_builder, '_encoders', {prompt_builder.AI_MODEL: None})
+
+
+@pytest.mark.parametrize('fixture', FIXTURES, ids=[fixture['name'] for fixture in FIXTURES])
+def test_rules_and_prompt_match_fixture(fixture):
+    assert check_offline(fixture) == []
+
+
+def test_fixtures_present():
+    assert len(FIXTURES) >= 3
+
+
+def test_encoder_failure_falls_back_to_estimate(monkeypatch):
+    tiktoken = pytest.importorskip('tiktoken')
+
+    def offline(*args, **kwargs):
+        raise ConnectionError("no network")
+
+    monkeypatch.setattr(prompt_builder, '_encoders', {})
+    monkeypatch.setattr(tiktoken, 'encoding_for_model', offline)
+    monkeypatch.setattr(tiktoken, 'get_encoding', offline)
+    assert prompt_builder.count_tokens('x' * 10) == 3
+    assert prompt_builder._encoders[prompt_builder.AI_MODEL] is None
@@ -0,0 +1,26 @@
+import asyncio
+
+import screenshot_service
+from screenshot_service import BrowserPool
+
+
+def busy_pool(monkeypatch):
+    pool = BrowserPool(size=1, contexts_per_browser=0, acquire_timeout=0.01)
+
+    async def start():
+        return pool
+
+    monkeypatch.setattr(screenshot_service, 'start_browser_pool', start)
+    return pool
+
+
+def test_busy_pool_marks_screenshots_skipped(monkeypatch):
+    pool = busy_pool(monkeypatch)
+
+    async def capture_all():
+        return [await screenshot_service.capture_responsive_screenshots('https://a.test/', mode=mode)
+                for mode in screenshot_service.CAPTURE_MODES]
+
+    for shots in asyncio.run(capture_all()):
+        assert set(shots) == {'skipped'}
+    assert pool.health()["rejected"] == 5  # Three devices in parallel, one context per other mode
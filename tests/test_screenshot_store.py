@@ -0,0 +1,40 @@
+import asyncio
+import os
+import time
+
+import screenshot_store
+
+
+def age(path, seconds):
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def save(data):
+    digest = asyncio.run(screenshot_store.save_screenshot(data))
+    return digest, screenshot_store._blob_path(digest)
+
+
+def test_sweep_deletes_only_old_unreferenced_blobs(tmp_path, monkeypatch):
+    monkeypatch.setattr(screenshot_store, 'SCREENSHOT_STORE_DIR', tmp_path)
+    kept_id, kept = save(b'referenced')
+    _, orphan = save(b'orphan')
+    _, fresh = save(b'still being analyzed')
+    age(kept, 7200)
+    age(orphan, 7200)
+
+    deleted = asyncio.run(screenshot_store.sweep_screenshots({kept_id}, grace_seconds=3600))
+
+    assert deleted == 1
+    assert kept.exists() and fresh.exists()
+    assert not orphan.exists()
+
+
+def test_saving_known_content_renews_it_for_the_sweep(tmp_path, monkeypatch):
+    monkeypatch.setattr(screenshot_store, 'SCREENSHOT_STORE_DIR', tmp_path)
+    digest, path = save(b'same png')
+    age(path, 7200)
+
+    assert save(b'same png')[0] == digest
+    assert asyncio.run(screenshot_store.sweep_screenshots(set(), grace_seconds=3600)) == 0
+    assert path.exists()
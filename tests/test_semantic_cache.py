@@ -0,0 +1,113 @@
+import asyncio
+
+from semantic_cache import SemanticCache, adapt, substitutions
+
+
+def page(name, size=120):
+    return {
+        "title": {"text": f"{name} Standing Desk | Example Shop"},
+        "meta_description": {"text": f"Solid {name.lower()} standing desk, {size} cm wide, free delivery."},
+        "keywords": {"top": [[name.lower(), 1.8, 4, True], ["desk", 2.5, 6, True]]},
+    }
+
+
+REPLY = {"primary_keyword": "walnut standing desk", "keyword_intent": {"walnut desk": "commercial"},
+         "note": "Walnut tops need oiling; 120 cm fits most rooms."}
+
+
+def stored(cache, namespace, data, value):
+    entry_id = cache.begin(namespace, data)
+    cache.finish(entry_id, value)
+
+
+def test_substitutions_map_names_and_numbers():
+    assert substitutions(page("Walnut"), page("Cherry", 140)) == {"walnut": "Cherry", "120": "140"}
+
+
+def test_substitutions_reject_differences_that_cannot_be_replaced():
+    one = {"title": {"text": "Oak Dining Table Model 1"}}
+    seven = {"title": {"text": "Oak Dining Table Model 7"}}
+    assert substitutions(one, seven) is None
+    assert substitutions({"title": {"text": "Oak Table"}}, {"title": {"text": "Oak Table Extending"}}) is None
+    assert substitutions(page("Walnut"), {"title": page("Walnut")["title"]}) is None
+
+
+def test_adapt_rewrites_values_and_keys_matching_case():
+    adapted = adapt(REPLY, {"walnut": "Cherry", "120": "140"}, page("Walnut"))
+    assert adapted == {"primary_keyword": "cherry standing desk", "keyword_intent": {"cherry desk": "commercial"},
+                       "note": "Cherry tops need oiling; 140 cm fits most rooms."}
+
+
+def test_adapt_leaves_numbers_the_source_text_does_not_anchor():
+    source = {"content": {"word_count": 160, "title": "Walnut Desk"}}
+    target = {"content": {"word_count": 185, "title": "Walnut Desk"}}
+    pairs = substitutions(source, target)
+    assert pairs == {"160": "185"}
+    # '160' here is the model's own advice, not the page's word count
+    assert adapt({"tip": "Keep the meta description to 150-160 characters."}, pairs, source) is None
+    assert adapt({"tip": "Add an FAQ section."}, pairs, source) == {"tip": "Add an FAQ section."}
+
+
+def test_lookup_adapts_near_duplicate():
+    async def run():
+        cache = SemanticCache()
+        stored(cache, "keywords", page("Walnut"), REPLY)
+        value, match = await cache.lookup("keywords", page("Cherry", 140))
+        assert value["primary_keyword"] == "cherry standing desk"
+        assert match["waited"] is False
+        assert await cache.lookup("other-section", page("Cherry")) is None
+        assert await cache.lookup("keywords", {"title": {"text": "Cheap flights to Rome"}}) is None
+    asyncio.run(run())
+
+
+def test_lookup_misses_when_only_short_numbers_differ():
+    async def run():
+        cache = SemanticCache()
+        one = {"title": {"text": "Oak Dining Table Model 1"}}
+        stored(cache, "keywords", one, {"primary_keyword": "oak dining table model 1"})
+        assert await cache.lookup("keywords", {"title": {"text": "Oak Dining Table Model 7"}}) is None
+    asyncio.run(run())
+
+
+def test_lookup_waits_for_pending_near_duplicate():
+    async def run():
+        cache = SemanticCache()
+        entry_id = cache.begin("keywords", page("Walnut"))
+        waiter = asyncio.create_task(cache.lookup("keywords", page("Cherry")))
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        cache.finish(entry_id, REPLY)
+        value, match = await waiter
+        assert value["primary_keyword"] == "cherry standing desk"
+        assert match["waited"] is True
+    asyncio.run(run())
+
+
+def test_failed_pending_entries_are_skipped_and_dropped():
+    async def run():
+        cache = SemanticCache()
+        first = cache.begin("keywords", page("Walnut"))
+        second = cache.begin("keywords", page("Walnut"))
+        waiter = asyncio.create_task(cache.lookup("keywords", page("Cherry")))
+        await asyncio.sleep(0)
+        # Both candidates fail while the lookup waits on the first
+        cache.finish(first)
+        cache.finish(second)
+        assert await waiter is None
+        assert cache.stats()["entries"] == 0
+    asyncio.run(run())
+
+
+def test_eviction_and_expiry():
+    async def run():
+        cache = SemanticCache(max_entries=2)
+        for name in ("Walnut", "Cherry", "Bamboo"):
+            stored(cache, name, page(name), REPLY)
+        assert cache.stats()["entries"] == 2
+        assert cache.stats()["evictions"] == 1
+        assert await cache.lookup("Walnut", page("Walnut")) is None
+
+        expired = SemanticCache(ttl_seconds=-1)
+        stored(expired, "keywords", page("Walnut"), REPLY)
+        assert await expired.lookup("keywords", page("Walnut")) is None
+    asyncio.run(run())
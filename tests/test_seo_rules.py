@@ -0,0 +1,18 @@
+from seo_rules import META_DESCRIPTION_OPTIMAL_LENGTH, evaluate_rules, meta_status
+
+
+def issue_ids(data):
+    return {issue["id"] for issue in evaluate_rules("https://a.test/", data)}
+
+
+def test_failed_readability_raises_no_readability_issue():
+    failed = {"error": "textstat failed", "flesch_reading_ease": 0, "readability_grade": "Unable to calculate"}
+    assert "readability" not in issue_ids({"readability_analysis": failed})
+    assert "readability" in issue_ids({"readability_analysis": {"flesch_reading_ease": 42.0}})
+
+
+def test_meta_issue_matches_the_optimal_band():
+    low, high = META_DESCRIPTION_OPTIMAL_LENGTH
+    for length, flagged in ((low - 1, True), (low, False), (high, False), (high + 1, True)):
+        assert (meta_status(length) != "ok") is flagged
+        assert ("meta_length" in issue_ids({"onpage": {"meta_length": length}})) is flagged
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from stage_graph import Stage, StageGraphError, run_stage_graph
+
+
+def test_dependent_stage_starts_after_its_inputs():
+    started = []
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        started.append('fetch')
+        return 'html'
+
+    async def parse(fetch):
+        started.append('parse')
+        return fetch.upper()
+
+    async def preview():
+        started.append('preview')
+        return 'png'
+
+    results, timings = asyncio.run(run_stage_graph([
+        Stage('parse', parse, ('fetch',)),
+        Stage('fetch', fetch),
+        Stage('preview', preview),
+    ]))
+    assert results == {'fetch': 'html', 'parse': 'HTML', 'preview': 'png'}
+    # Preview has no inputs so it doesn't wait for the fetch; parse does
+    assert started.index('preview') < started.index('fetch') < started.index('parse')
+    assert set(timings) == {'fetch', 'parse', 'preview'}
+
+
+def test_optional_stage_failure_or_timeout_falls_back_while_siblings_finish():
+    async def broken():
+        raise ValueError("no schema")
+
+    async def slow():
+        await asyncio.sleep(1)
+
+    async def fine():
+        await asyncio.sleep(0.05)
+        return 'ok'
+
+    done = []
+
+    async def on_done(name, result):
+        done.append(name)
+
+    results, timings = asyncio.run(run_stage_graph([
+        Stage('schema', broken),
+        Stage('speed', slow, timeout=0.05),
+        Stage('keywords', slow, timeout=0.05, fallback=lambda error: {"error": error, "top_keywords": []}),
+        Stage('content', fine),
+    ], on_done))
+    assert results['schema'] == {"error": "no schema"}
+    assert results['speed'] == {"error": "speed timed out after 0.05s"}
+    assert results['keywords']['top_keywords'] == []
+    assert results['content'] == 'ok'
+    assert timings['schema']['error'] == "no schema" and timings['content']['error'] is None
+    assert sorted(done) == ['content', 'keywords', 'schema', 'speed']
+
+
+def test_failed_required_stage_cancels_pending_stages_and_raises():
+    cancelled = []
+    ran = []
+
+    async def fetch():
+        await asyncio.sleep(0.02)
+        raise RuntimeError("connection refused")
+
+    async def screenshots():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append('screenshots')
+            raise
+
+    async def parse(fetch):
+        ran.append('parse')
+
+    with pytest.raises(StageGraphError, match="connection refused"):
+        asyncio.run(run_stage_graph([
+            Stage('fetch', fetch, required=True),
+            Stage('screenshots', screenshots),
+            Stage('parse', parse, ('fetch',)),
+        ]))
+    assert cancelled == ['screenshots']
+    assert ran == []
+
+
+def test_unknown_inputs_and_cycles_are_rejected():
+    async def noop(**inputs):
+        return None
+
+    with pytest.raises(StageGraphError, match="unknown"):
+        asyncio.run(run_stage_graph([Stage('parse', noop, ('fetch',))]))
+    with pytest.raises(StageGraphError, match="cycle"):
+        asyncio.run(run_stage_graph([Stage('a', noop, ('b',)), Stage('b', noop, ('a',))]))
@@ -0,0 +1,63 @@
+import httpx
+
+from fetch_service import PARSED_DOCUMENT_BYTES_PER_HTML_BYTE, VALIDATOR_CACHE_MAX_ENTRIES, ValidatorCache
+
+
+def ok(etag='"v1"'):
+    return httpx.Response(200, headers={'etag': etag})
+
+
+def test_bounded_by_bytes_not_just_entries():
+    cache = ValidatorCache(max_entries=100, max_bytes=1000)
+    for index in range(5):
+        cache.remember(f"https://a.test/{index}", ok(), {"page": index}, 240)
+    metrics = cache.metrics()
+    assert metrics["stored_urls"] == 4
+    assert metrics["stored_bytes"] == 960
+    assert cache.headers("https://a.test/0") == {}
+    assert cache.headers("https://a.test/4") == {'If-None-Match': '"v1"'}
+
+
+def test_attached_documents_count_towards_the_budget():
+    cache = ValidatorCache(max_entries=100, max_bytes=1000)
+    cache.remember("https://a.test/a", ok(), {}, 250)
+    cache.remember("https://a.test/b", ok(), {}, 150)
+    cache.attach("https://a.test/b", "document", object(), 100)
+    cache.remember("https://a.test/c", ok(), {}, 250)
+    cache.remember("https://a.test/d", ok(), {}, 250)
+    assert cache.metrics()["stored_bytes"] == 1000
+    cache.remember("https://a.test/e", ok(), {}, 100)
+    assert cache.headers("https://a.test/a") == {}
+    assert cache.attached("https://a.test/b", "document") is not None
+    assert cache.metrics()["stored_bytes"] == 850
+
+
+def test_oversized_payloads_are_not_kept():
+    cache = ValidatorCache(max_entries=100, max_bytes=1000)
+    cache.remember("https://a.test/small", ok(), {}, 100)
+    cache.remember("https://a.test/huge", ok(), {}, 600)
+    assert cache.headers("https://a.test/huge") == {}
+    assert cache.headers("https://a.test/small") != {}
+    assert cache.metrics()["too_large"] == 1
+
+
+def test_304_returns_the_stored_payload():
+    cache = ValidatorCache(max_entries=10, max_bytes=1000)
+    cache.remember("https://a.test/", ok(), {"body": 1}, 10)
+    assert cache.not_modified("https://a.test/", httpx.Response(304)) == {"body": 1}
+    assert cache.not_modified("https://a.test/", httpx.Response(200)) is None
+    cache.remember("https://a.test/", httpx.Response(200), {"body": 2}, 10)  # No validators any more
+    assert cache.metrics()["stored_urls"] == 0
+
+
+def test_multi_megabyte_page_is_kept_without_its_document():
+    cache = ValidatorCache(VALIDATOR_CACHE_MAX_ENTRIES, 64 * 1024 * 1024)
+    html_bytes = 5 * 1024 * 1024
+    cache.remember("https://a.test/big", ok(), {"content": b"x"}, html_bytes)
+    cache.attach("https://a.test/big", "document", object(), html_bytes * PARSED_DOCUMENT_BYTES_PER_HTML_BYTE)
+    assert cache.not_modified("https://a.test/big", httpx.Response(304)) == {"content": b"x"}
+    assert cache.attached("https://a.test/big", "document") is None
+    metrics = cache.metrics()
+    assert metrics["stored_bytes"] == html_bytes
+    assert metrics["too_large"] == 0
+    assert metrics["attachments_skipped"] == 1